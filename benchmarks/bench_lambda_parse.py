@@ -0,0 +1,62 @@
+"""Parsing throughput (MB/s) of the Lark and hand-written backends
+on large generated lambda_pure / lambda_typed programs.
+
+Usage: python benchmarks/bench_lambda_parse.py [megabytes]
+"""
+
+import random
+import sys
+import time
+
+from syntax import lambda_pure, lambda_typed
+
+
+def generate_program(size: int, typed: bool, seed: int = 0) -> str:
+    """A random program of about `size` characters: a mix of applications, lambdas,
+    lets and parentheses, combined into a balanced application tree."""
+    rng = random.Random(seed)
+    names = ["x", "y", "f", "g", "acc", "n"]
+    ann = " : int -> int" if typed else ""
+    parts = []
+    length = 0
+    while length < size:
+        match rng.randrange(4):
+            case 0:
+                part = f"(\\{rng.choice(names)}{ann}. {rng.choice(names)} {rng.randrange(1000)})"
+            case 1:
+                part = f"(let {rng.choice(names)} = {rng.choice(names)} {rng.choice(names)} in {rng.choice(names)})"
+            case 2:
+                part = (
+                    f"({rng.choice(names)} ({rng.choice(names)} {rng.choice(names)}))"
+                )
+            case _:
+                part = rng.choice(names)
+        parts.append(part)
+        length += len(part) + 3
+    while len(parts) > 1:
+        parts = [" ".join(parts[i : i + 2]) for i in range(0, len(parts), 2)]
+        parts = [f"({p})" for p in parts]
+    return parts[0]
+
+
+def throughput(parse, text: str, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - start)
+    return len(text) / best / 1e6
+
+
+def main() -> None:
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    for language in [lambda_pure, lambda_typed]:
+        text = generate_program(int(megabytes * 1e6), typed=language is lambda_typed)
+        assert language.parse(text, backend="fast") == language.parse(text)
+        for backend in ["lark", "fast"]:
+            rate = throughput(lambda t: language.parse(t, backend=backend), text)
+            print(f"{language.__name__:20} {backend:5} {rate:8.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
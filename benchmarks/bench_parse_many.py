@@ -0,0 +1,74 @@
+"""Throughput of parse_many() as the number of worker processes grows,
+and the cost of shipping ASTs between processes as _encode_dag() tables
+(which parse_many uses) versus pickling the nodes directly.
+
+Usage: python benchmarks/bench_parse_many.py [programs]
+"""
+
+import os
+import pickle
+import random
+import sys
+import time
+
+from syntax import while_lang
+from syntax.utils import _decode_dag, _encode_dag
+
+
+def generate_programs(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    names = ["x", "y", "i", "n", "acc"]
+
+    def stmt(depth: int) -> str:
+        match rng.randrange(4) if depth < 3 else 0:
+            case 0:
+                return (
+                    f"{rng.choice(names)} := {rng.choice(names)} + {rng.randrange(10)}"
+                )
+            case 1:
+                return f"if {rng.choice(names)} < {rng.randrange(10)} then {stmt(depth + 1)} else {stmt(depth + 1)}"
+            case 2:
+                return f"while {rng.choice(names)} > 0 do ({stmt(depth + 1)}; {stmt(depth + 1)})"
+            case _:
+                return f"({stmt(depth + 1)}; {stmt(depth + 1)})"
+
+    return ["; ".join(stmt(0) for _ in range(20)) for _ in range(count)]
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    texts = generate_programs(count)
+    megabytes = sum(map(len, texts)) / 1e6
+
+    start = time.perf_counter()
+    asts = [while_lang.parse(text) for text in texts]
+    baseline = time.perf_counter() - start
+    print(f"{count} programs, {megabytes:.2f} MB")
+    print(f"parse() loop:         {baseline:7.2f} s  {megabytes / baseline:6.2f} MB/s")
+
+    workers = 1
+    while workers <= 2 * (os.cpu_count() or 1):
+        start = time.perf_counter()
+        assert while_lang.parse_many(texts, workers=workers) == asts
+        elapsed = time.perf_counter() - start
+        print(
+            f"parse_many(workers={workers}): {elapsed:5.2f} s  {megabytes / elapsed:6.2f} MB/s"
+            f"  speedup x{baseline / elapsed:.2f}"
+        )
+        workers *= 2
+
+    for label, encode, decode in [
+        ("pickled nodes*", lambda a: a, lambda a: a),
+        ("_encode_dag tables", _encode_dag, _decode_dag),
+    ]:
+        start = time.perf_counter()
+        data = pickle.dumps([encode(a) for a in asts], protocol=pickle.HIGHEST_PROTOCOL)
+        decoded = [decode(a) for a in pickle.loads(data)]
+        elapsed = time.perf_counter() - start
+        print(f"round trip, {label:18}: {elapsed:6.3f} s  {len(data) / 1e6:6.2f} MB")
+    assert decoded == asts
+    print("* not interned on load, and pickle fails on very deep trees")
+
+
+if __name__ == "__main__":
+    main()
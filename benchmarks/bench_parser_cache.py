@@ -0,0 +1,61 @@
+"""Start-up latency of a fresh process parsing its first program,
+with the on-disk parser cache disabled, cold (empty) and warm.
+
+Usage: python benchmarks/bench_parser_cache.py [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+FIRST_PARSE = """
+import time
+from syntax import lambda_pure, lambda_typed, while_lang
+start = time.perf_counter()
+lambda_pure.parse(r"\\x. x")
+lambda_typed.parse(r"\\x: int. x")
+while_lang.parse("x := 1")
+print(time.perf_counter() - start)
+"""
+
+
+def run(cache_dir: str) -> tuple[float, float]:
+    """Returns (whole process, first parses) wall time in seconds."""
+    env = dict(os.environ, SYNTAX_CACHE_DIR=cache_dir)
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", FIRST_PARSE],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return time.perf_counter() - start, float(out)
+
+
+def report(label: str, samples: list[tuple[float, float]]) -> None:
+    process = statistics.median(s[0] for s in samples)
+    parse = statistics.median(s[1] for s in samples)
+    print(
+        f"{label:10} process {process * 1e3:8.1f} ms   first parse {parse * 1e3:8.1f} ms"
+    )
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    report("disabled", [run("") for _ in range(runs)])
+    cold = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(run(cache_dir))
+    report("cold", cold)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        run(cache_dir)
+        report("warm", [run(cache_dir) for _ in range(runs)])
+
+
+if __name__ == "__main__":
+    main()
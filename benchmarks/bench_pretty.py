@@ -0,0 +1,73 @@
+"""Time to pretty-print terms that are a million nodes deep,
+to a string and streamed to a file.
+
+Usage: python benchmarks/bench_pretty.py [depth]
+"""
+
+import os
+import sys
+import time
+
+from syntax import lambda_pure, lambda_typed, while_lang
+from syntax.utils import make_node
+
+
+def app_spine(depth: int) -> lambda_pure.LambdaExpr:
+    x, y = make_node(lambda_pure.Id, "x"), make_node(lambda_pure.Id, "y")
+    expr = x
+    for _ in range(depth):
+        expr = make_node(lambda_pure.App, expr, y)
+    return expr
+
+
+def nested_lambdas(depth: int) -> lambda_pure.LambdaExpr:
+    x = make_node(lambda_pure.Id, "x")
+    expr = x
+    for _ in range(depth):
+        expr = make_node(lambda_pure.Lambda, x, expr)
+    return expr
+
+
+def typed_let_chain(depth: int) -> lambda_typed.TypedExpr:
+    T = lambda_typed
+    x = T.TypedExpr(T.Id("x"), T.Primitive.INT)
+    decl = T.VarDecl(T.Id("x"), T.Primitive.INT)
+    expr = x
+    for _ in range(depth):
+        expr = T.TypedExpr(T.Let(decl, x, expr), T.Primitive.INT)
+    return expr
+
+
+def seq_chain(depth: int) -> while_lang.Stmt:
+    W = while_lang
+    stmt = make_node(W.Assign, make_node(W.Id, "x"), make_node(W.Int, 1))
+    program = stmt
+    for _ in range(depth):
+        program = make_node(W.Seq, stmt, program)
+    return program
+
+
+def main() -> None:
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for label, build, pretty in [
+        ("lambda_pure application spine", app_spine, lambda_pure.pretty),
+        ("lambda_pure nested lambdas", nested_lambdas, lambda_pure.pretty),
+        ("lambda_typed let chain", typed_let_chain, lambda_typed.pretty_typed),
+        ("while_lang Seq chain", seq_chain, while_lang.pretty),
+    ]:
+        term = build(depth)
+        start = time.perf_counter()
+        text = pretty(term)
+        to_string = time.perf_counter() - start
+        with open(os.devnull, "w") as out:
+            start = time.perf_counter()
+            pretty(term, out=out)
+            streamed = time.perf_counter() - start
+        print(
+            f"{label:30} {len(text) / 1e6:6.1f} MB  "
+            f"to string {to_string:6.2f} s  streamed {streamed:6.2f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""Output size and time of lambda_pure.pretty's sharing modes on a term whose DAG
+has n nodes but whose tree has 2^n.
+
+Usage: python benchmarks/bench_pretty_sharing.py [n]
+"""
+
+import sys
+import time
+
+from syntax import lambda_pure
+from syntax.utils import make_node
+
+
+def doubling(n: int) -> lambda_pure.LambdaExpr:
+    y = make_node(lambda_pure.Id, "y")
+    expr = make_node(lambda_pure.Lambda, y, y)
+    for _ in range(n):
+        expr = make_node(lambda_pure.App, expr, expr)
+    return expr
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 18
+    term = doubling(n)
+    for sharing in ["expand", "memo", "let"]:
+        start = time.perf_counter()
+        text = lambda_pure.pretty(term, sharing=sharing)
+        elapsed = time.perf_counter() - start
+        print(f"{sharing:6} {len(text):12,} chars  {elapsed:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
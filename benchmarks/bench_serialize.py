@@ -0,0 +1,59 @@
+"""Size and load time of corpora in the binary AST format (syntax.serialize),
+compared with storing the program text and parsing it again.
+
+Usage: python benchmarks/bench_serialize.py [programs]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from bench_lambda_parse import generate_program
+from bench_parse_many import generate_programs
+from syntax import lambda_pure, lambda_typed, while_lang
+from syntax.serialize import dump, load
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    corpora = [
+        ("while_lang", while_lang.parse, generate_programs(count)),
+        (
+            "lambda_pure",
+            lambda_pure.parse,
+            [generate_program(400, typed=False, seed=i) for i in range(count)],
+        ),
+        (
+            "lambda_typed",
+            lambda_typed.parse,
+            [generate_program(400, typed=True, seed=i) for i in range(count)],
+        ),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.ast")
+        for label, parse, texts in corpora:
+            text_size = sum(len(text.encode()) for text in texts)
+            start = time.perf_counter()
+            asts = [parse(text) for text in texts]
+            parsing = time.perf_counter() - start
+            with open(path, "wb") as f:
+                dump(asts, f)
+            start = time.perf_counter()
+            with load(path) as trees:
+                loaded = list(trees)
+            loading = time.perf_counter() - start
+            start = time.perf_counter()
+            with load(path) as trees:
+                trees[count // 2]
+            one = time.perf_counter() - start
+            assert loaded == asts
+            print(
+                f"{label:12} text {text_size / 1e6:6.2f} MB, parse {parsing:6.2f} s | "
+                f"binary {os.path.getsize(path) / 1e6:6.2f} MB, load {loading:6.2f} s, "
+                f"load one tree {one * 1e3:6.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
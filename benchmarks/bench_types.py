@@ -0,0 +1,75 @@
+"""Cost of comparing and hashing deeply nested arrow types: interned lambda_typed types
+versus plain structural dataclasses (how Arrow used to be defined).
+
+The workload mimics unification: every pair of corresponding subterms of two types is
+compared, and every subterm is looked up in a substitution dict.
+
+Usage: python benchmarks/bench_types.py [depth]
+"""
+
+from dataclasses import dataclass
+import sys
+import time
+
+from syntax import lambda_typed as T
+
+
+@dataclass(frozen=True, slots=True)
+class StructuralArrow:
+    arg: object
+    ret: object
+
+
+def nested(depth: int, arrow, leaf):
+    """((leaf -> leaf) -> (leaf -> leaf)) -> ..., a DAG of depth nodes but a tree of 2^depth"""
+    typ = leaf
+    for _ in range(depth):
+        typ = arrow(typ, typ)
+    return typ
+
+
+def spine(depth: int, arrow, leaf, last):
+    """leaf -> leaf -> ... -> last"""
+    typ = last
+    for _ in range(depth):
+        typ = arrow(leaf, typ)
+    return typ
+
+
+def unify_like(a, b, substitution: dict) -> None:
+    """Walks both types together, comparing and looking up every pair of subterms."""
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        substitution.get(a)
+        if a != b and hasattr(a, "arg") and hasattr(b, "arg"):
+            stack += (a.arg, b.arg), (a.ret, b.ret)
+
+
+def run(arrow, depth: int) -> float:
+    a, b = T.TypeName("a"), T.TypeName("b")
+    workloads = [
+        (nested(18, arrow, a), nested(18, arrow, a), nested(17, arrow, a)),
+        (
+            spine(depth, arrow, a, a),
+            spine(depth, arrow, a, a),
+            spine(depth, arrow, a, b),
+        ),
+    ]
+    start = time.perf_counter()
+    for x, x_again, y in workloads:
+        assert x == x_again and hash(x) == hash(x_again)
+        unify_like(x, y, {x: a})
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 250
+    structural = run(StructuralArrow, depth)
+    interned = run(lambda arg, ret: T.make_node(T.Arrow, arg, ret), depth)
+    print(f"structural: {structural:8.3f} s")
+    print(f"interned:   {interned:8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Memory and comparison cost of hash-consed While ASTs.
+
+Usage: python benchmarks/bench_while_lang.py [repetitions]
+"""
+
+import dataclasses
+import sys
+import timeit
+import tracemalloc
+
+from syntax.while_lang import parse
+
+
+def generate_program(repetitions: int) -> str:
+    block = "x := x + 1; if x < 10 then y := y * 2 else y := y - 1; while y > 0 do y := y - 1"
+    return "; ".join([block] * repetitions)
+
+
+def count_nodes(node, seen: set[int] | None = None) -> int:
+    """Counts tree nodes; with `seen`, counts distinct (shared) nodes only."""
+    total, stack = 0, [node]
+    while stack:
+        n = stack.pop()
+        if seen is not None:
+            if id(n) in seen:
+                continue
+            seen.add(id(n))
+        total += 1
+        stack.extend(
+            v
+            for f in dataclasses.fields(n)
+            if dataclasses.is_dataclass(v := getattr(n, f.name))
+        )
+    return total
+
+
+def structurally_equal(a, b) -> bool:
+    """What == used to do on non-interned ASTs."""
+    stack = [(a, b)]
+    while stack:
+        a, b = stack.pop()
+        if type(a) is not type(b):
+            return False
+        for f in dataclasses.fields(a):
+            x, y = getattr(a, f.name), getattr(b, f.name)
+            if dataclasses.is_dataclass(x):
+                stack.append((x, y))
+            elif x != y:
+                return False
+    return True
+
+
+def main() -> None:
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    text = generate_program(repetitions)
+
+    tracemalloc.start()
+    ast = parse(text)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    other = parse(text)
+    tree_nodes = count_nodes(ast)
+    dag_nodes = count_nodes(ast, seen=set())
+    print(f"program: {len(text)} chars, {tree_nodes} tree nodes, {dag_nodes} distinct")
+    print(f"retained after parse: {retained / 1024:.1f} KiB")
+    t_id = min(timeit.repeat(lambda: ast == other, number=1000, repeat=5)) / 1000
+    t_struct = min(
+        timeit.repeat(lambda: structurally_equal(ast, other), number=1, repeat=5)
+    )
+    print(f"== (identity):         {t_id * 1e6:10.3f} us")
+    print(f"structural comparison: {t_struct * 1e6:10.3f} us")
+
+
+if __name__ == "__main__":
+    main()
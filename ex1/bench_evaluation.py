@@ -0,0 +1,51 @@
+"""Programs compiled into closures by compile_expr(), versus evaluate(), which walks the
+tree, on recursive arithmetic over the builtins: factorial, Fibonacci, power and a sum
+of products through nested lets.
+
+Usage: python ex1/bench_evaluation.py [scale]
+"""
+
+import sys
+import time
+
+from syntax.lambda_typed import parse
+
+from evaluation import TYPES, compile_expr, evaluate
+from solution import infer_types
+
+FACT = r"fix (\fact. \n. if (eq n 0) (\u. 1) (\u. mul n (fact (sub n 1))))"
+FIB = r"fix (\fib. \n. if (lt n 2) (\u. n) (\u. add (fib (sub n 1)) (fib (sub n 2))))"
+POWER = r"fix2 (\pow. \b. \e. if (eq e 0) (\u. 1) (\u. mul b (pow b (sub e 1))))"
+SUM = (
+    r"fix2 (\sum. \acc. \n. if (eq n 0) (\u. acc) (\u. "
+    r"let a = mul n n in let b = add a n in let c = sub b 1 in "
+    r"sum (add acc c) (sub n 1)))"
+)
+
+
+def main() -> None:
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for label, program in [
+        (f"fact {500 * scale}", f"{FACT} {500 * scale}"),
+        (f"fib {16 + scale}", f"{FIB} {16 + scale}"),
+        (f"power 3 {1_000 * scale}", f"{POWER} 3 {1_000 * scale}"),
+        (f"sum {2_000 * scale}", f"{SUM} 0 {2_000 * scale}"),
+    ]:
+        expr = infer_types(parse(program), builtins=TYPES)
+        start = time.perf_counter()
+        expected = evaluate(expr)
+        walk_time = time.perf_counter() - start
+        start = time.perf_counter()
+        code = compile_expr(expr)
+        compile_time = time.perf_counter() - start
+        start = time.perf_counter()
+        assert code() == expected
+        run_time = time.perf_counter() - start
+        print(
+            f"{label:16} tree walk {walk_time:8.4f} s, closures {run_time:8.4f} s"
+            f" (+ {compile_time:.4f} s to compile)"
+        )
+
+
+if __name__ == "__main__":
+    main()
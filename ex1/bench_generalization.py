@@ -0,0 +1,69 @@
+"""Let-polymorphic infer_types() with level-based generalization, versus generalization
+that scans the environment for the type variables it must not quantify, on deeply nested
+lets: let x1 = \a. a in let x2 = \a. x1 a in ... in xn 1.
+Each scan visits every enclosing definition, so it is quadratic in the nesting depth.
+
+Usage: python ex1/bench_generalization.py [max depth]
+"""
+
+import sys
+import time
+
+from syntax.lambda_typed import LambdaType, parse
+
+import solution
+from solution import _Inference, infer_types
+from unification import TypeScheme
+
+
+class ScanningInference(_Inference):
+    def generalize(self, t: LambdaType) -> TypeScheme:
+        unifier = self.unifier
+        in_env = set()
+        for scheme in self.env.values():
+            in_env.update(
+                v
+                for v in unifier._free_vars(unifier.resolve(scheme.type))
+                if v not in scheme.vars
+            )
+        t = unifier.resolve(t)
+        quantified = [
+            unifier._named(v) for v in unifier._free_vars(t) if v not in in_env
+        ]
+        return TypeScheme(tuple(quantified), unifier.resolve(t))
+
+
+def nested_lets(depth: int) -> str:
+    return (
+        r"let x1 = \a. a in "
+        + "".join(rf"let x{i} = \a. x{i - 1} a in " for i in range(2, depth + 1))
+        + f"x{depth} 1"
+    )
+
+
+def timed(inference: type[_Inference], expr) -> float:
+    # infer_types() looks _Inference up when called
+    solution._Inference = inference
+    try:
+        start = time.perf_counter()
+        infer_types(expr, let_polymorphism=True)
+        return time.perf_counter() - start
+    finally:
+        solution._Inference = _Inference
+
+
+def main() -> None:
+    max_depth = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * max_depth))
+    depth = max_depth // 8
+    while depth <= max_depth:
+        expr = parse(nested_lets(depth))
+        print(
+            f"depth {depth:6,}: levels {timed(_Inference, expr):8.4f} s,"
+            f" scanning {timed(ScanningInference, expr):8.4f} s"
+        )
+        depth *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Unification with the union-find Unifier, versus a substitution dictionary that is
+composed after every binding, on the constraints of synthetic let-chains and deep curried
+applications; and infer_types() on the programs themselves.
+
+Usage: python ex1/bench_unification.py [type variables]
+"""
+
+import sys
+import time
+
+from syntax.lambda_typed import Arrow, LambdaType, Primitive, TypeVar, parse
+from syntax.utils import make_node
+
+from solution import infer_types
+from unification import TypeMismatchError, Unifier
+
+
+class SubstitutionUnifier:
+    """The naive approach: bindings are kept fully applied to each other."""
+
+    def __init__(self):
+        self.subst: dict[TypeVar, LambdaType] = {}
+
+    def resolve(self, t: LambdaType) -> LambdaType:
+        match t:
+            case TypeVar():
+                return self.subst.get(t, t)
+            case Arrow(arg, ret):
+                return make_node(Arrow, self.resolve(arg), self.resolve(ret))
+            case _:
+                return t
+
+    def unify(self, a: LambdaType, b: LambdaType) -> None:
+        a, b = self.resolve(a), self.resolve(b)
+        if a == b:
+            return
+        match a, b:
+            case TypeVar(), _:
+                self.bind(a, b)
+            case _, TypeVar():
+                self.bind(b, a)
+            case Arrow(), Arrow():
+                self.unify(a.arg, b.arg)
+                self.unify(a.ret, b.ret)
+            case _:
+                raise TypeMismatchError(f"Cannot unify {a} with {b}")
+
+    def bind(self, v: TypeVar, t: LambdaType) -> None:
+        single = SubstitutionUnifier()
+        single.subst[v] = t
+        self.subst = {u: single.resolve(s) for u, s in self.subst.items()}
+        self.subst[v] = t
+
+
+def let_chain(n: int) -> list[tuple]:
+    """let x1 = x0 in let x2 = x1 in ... : each variable is unified with the previous one,
+    and the first one with int at the end."""
+    constraints = [(TypeVar(-i), TypeVar(-i - 1)) for i in range(1, n)]
+    return constraints + [(TypeVar(-n), Primitive.INT)]
+
+
+def curried_application(n: int) -> list[tuple]:
+    """f a1 a2 ... an, where f : int -> int -> ... -> int, with each intermediate
+    application getting a type variable of its own."""
+    f = Primitive.INT
+    for _ in range(n):
+        f = make_node(Arrow, Primitive.INT, f)
+    constraints = [(TypeVar(-1), f)]
+    for i in range(1, n + 1):
+        # func : arg -> result, where the arg is an int literal
+        constraints.append(
+            (TypeVar(-i), make_node(Arrow, TypeVar(-n - i), TypeVar(-i - 1)))
+        )
+        constraints.append((TypeVar(-n - i), Primitive.INT))
+    return constraints
+
+
+def solve(unifier, constraints: list[tuple]) -> float:
+    start = time.perf_counter()
+    for a, b in constraints:
+        unifier.unify(a, b)
+    unifier.resolve(constraints[0][0])
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for label, generate in [
+        ("let chain", let_chain),
+        ("curried app", curried_application),
+    ]:
+        constraints = generate(n)
+        print(
+            f"{label:12} {n:9,} vars: union-find {solve(Unifier(), constraints):8.4f} s"
+        )
+        for small in [30, 60, 120]:
+            constraints = generate(small)
+            print(
+                f"{label:12} {small:9,} vars: union-find {solve(Unifier(), constraints):8.4f} s,"
+                f" substitution {solve(SubstitutionUnifier(), constraints):8.4f} s"
+            )
+
+    # infer_types() runs on explicit stacks, so its time grows linearly with the depth
+    for depth in [1_000, 10_000, 100_000]:
+        for label, program in [
+            (
+                "let chain",
+                "".join(f"let x{i + 1} = x{i} in " for i in range(depth)).replace(
+                    "x0", "0", 1
+                )
+                + f"x{depth}",
+            ),
+            ("curried app", r"(\f. f" + " 1" * depth + ") " + r"\x. " * depth + "0"),
+        ]:
+            expr = parse(program, backend="fast")
+            start = time.perf_counter()
+            infer_types(expr)
+            print(
+                f"infer_types, {label}, depth {depth:7,}: {time.perf_counter() - start:8.4f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
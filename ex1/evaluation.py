@@ -0,0 +1,250 @@
+"""
+Evaluation of lambda_typed programs, once infer_types() has checked them.
+
+Evaluation is call-by-value. Values are Python ints and bools, and functions of one
+argument, so that the free variables of a program can be bound to plain (curried) Python
+functions: see BUILTINS, and TYPES, which gives their types to infer_types().
+
+evaluate() walks the tree, looking variables up by name in a linked environment.
+compile_expr() translates it once into nested Python closures instead, with each variable
+resolved ahead of time to a slot of its closure's environment (a tuple holding the
+variables that the lambda captures, then its parameter, then those bound by lets in its
+body), or to its built-in value, which is then called directly. Well-typed programs
+cannot go wrong, so neither checks the values it applies or adds up.
+
+Both run on the Python stack, with the recursion limit raised to _RECURSION_LIMIT (see
+syntax.utils.deep_recursion()).
+"""
+
+import operator
+from typing import Any, Callable
+
+from syntax.lambda_typed import (
+    App,
+    Arrow,
+    Bool,
+    Id,
+    Int,
+    Lambda,
+    LambdaType,
+    Let,
+    Primitive,
+    TypedExpr,
+)
+from syntax.utils import deep_recursion, make_node
+
+# Evaluation nests Python calls (one or two per enclosing expression or function call)
+_RECURSION_LIMIT = 100_000
+
+type Value = Any  # int | bool | Callable[[Value], Value]
+type Code = Callable[[tuple], Value]
+
+
+def _fix(f: Callable) -> Callable:
+    """The fixed point of f, by value: fix f = \\x. f (fix f) x, for any number of
+    arguments."""
+
+    def fixed(x):
+        return f(fixed)(x)
+
+    return fixed
+
+
+BUILTINS: dict[str, Value] = {
+    "add": lambda m: lambda n: m + n,
+    "sub": lambda m: lambda n: m - n,
+    "mul": lambda m: lambda n: m * n,
+    "eq": lambda m: lambda n: m == n,
+    "lt": lambda m: lambda n: m < n,
+    # The branches are functions, applied to 0, since arguments are evaluated first
+    "if": lambda c: lambda t: lambda e: t(0) if c else e(0),
+    "fix": _fix,
+    "fix2": _fix,
+}
+
+
+def _arrow(*types: LambdaType) -> LambdaType:
+    """t1 -> t2 -> ... -> tn"""
+    result = types[-1]
+    for t in reversed(types[:-1]):
+        result = make_node(Arrow, t, result)
+    return result
+
+
+_INT, _BOOL = Primitive.INT, Primitive.BOOL
+_INT_FUNCTION = _arrow(_INT, _INT)
+_INT_FUNCTION2 = _arrow(_INT, _INT, _INT)
+
+# The types of the builtins, for infer_types(..., builtins=TYPES). They are monomorphic:
+# fix2 is fix, for functions of two arguments
+TYPES: dict[str, LambdaType] = {
+    "add": _INT_FUNCTION2,
+    "sub": _INT_FUNCTION2,
+    "mul": _INT_FUNCTION2,
+    "eq": _arrow(_INT, _INT, _BOOL),
+    "lt": _arrow(_INT, _INT, _BOOL),
+    "if": _arrow(_BOOL, _INT_FUNCTION, _INT_FUNCTION, _INT),
+    "fix": _arrow(_arrow(_INT_FUNCTION, _INT_FUNCTION), _INT_FUNCTION),
+    "fix2": _arrow(_arrow(_INT_FUNCTION2, _INT_FUNCTION2), _INT_FUNCTION2),
+}
+
+
+def evaluate(expr: TypedExpr, builtins: dict[str, Value] = BUILTINS) -> Value:
+    """The value of a well-typed expression, by walking it.
+    Free variables are looked up in builtins; a missing one raises ValueError."""
+    with deep_recursion(_RECURSION_LIMIT):
+        return _walk(expr, None, builtins)
+
+
+def _walk(expr: TypedExpr, env: tuple | None, builtins: dict[str, Value]) -> Value:
+    """env is a linked list (name, value, parent) | None."""
+    match expr.expr:
+        case Int(n):
+            return n
+        case Bool(b):
+            return b
+        case Id(name):
+            while env is not None:
+                if env[0] == name:
+                    return env[1]
+                env = env[2]
+            if name not in builtins:
+                raise ValueError(f"Unbound variable: {name}")
+            return builtins[name]
+        case Let(decl, defn, body):
+            value = _walk(defn, env, builtins)
+            return _walk(body, (decl.var.name, value, env), builtins)
+        case Lambda(decl, body):
+            name = decl.var.name
+            return lambda arg: _walk(body, (name, arg, env), builtins)
+        case App(func, arg):
+            return _walk(func, env, builtins)(_walk(arg, env, builtins))
+        case _:
+            raise ValueError(f"Unknown expression: {expr.expr!r}")
+
+
+def compile_expr(
+    expr: TypedExpr, builtins: dict[str, Value] = BUILTINS
+) -> Callable[[], Value]:
+    """Compiles a well-typed expression into a function computing its value (as evaluate()
+    does). Free variables are looked up in builtins now; a missing one raises ValueError.
+    The expression is walked with explicit stacks, so it may be arbitrarily deep."""
+    free = _free_vars(expr)
+    # Items are (expr, scope, size) to compile, or (None, build, ...) to build the code of
+    # a node from those of its children, which are on top of `done` by then. scope maps
+    # the variables in scope to their slots, in an environment of `size` slots
+    stack: list[tuple] = [(expr, {}, 0)]
+    done: list[Code] = []
+    while stack:
+        e, *args = stack.pop()
+        if e is None:
+            build, *args = args
+            done.append(build(done, *args))
+            continue
+        scope, size = args
+        match e.expr:
+            case Int(n) | Bool(n):
+                done.append(_constant(n))
+            case Id(name) if name in scope:
+                done.append(operator.itemgetter(scope[name]))
+            case Id(name):
+                if name not in builtins:
+                    raise ValueError(f"Unbound variable: {name}")
+                done.append(_constant(builtins[name]))
+            case Let(decl, defn, body):
+                stack += (
+                    (None, _build_let),
+                    (body, scope | {decl.var.name: size}, size + 1),
+                    (defn, scope, size),
+                )
+            case Lambda(decl, body):
+                captured = [v for v in sorted(free[id(e)]) if v in scope]
+                inner = {v: i for i, v in enumerate(captured)}
+                inner[decl.var.name] = len(captured)
+                slots = [scope[v] for v in captured]
+                stack += (None, _build_lambda, slots), (body, inner, len(inner))
+            case App(TypedExpr(Id(name)), arg) if (
+                name not in scope and name in builtins
+            ):
+                stack += (None, _build_call, builtins[name]), (arg, scope, size)
+            case App(func, arg):
+                stack += (None, _build_app), (arg, scope, size), (func, scope, size)
+            case _:
+                raise ValueError(f"Unknown expression: {e.expr!r}")
+    code = done.pop()
+
+    def run() -> Value:
+        with deep_recursion(_RECURSION_LIMIT):
+            return code(())
+
+    return run
+
+
+def _constant(value: Value) -> Code:
+    return lambda env: value
+
+
+def _build_let(done: list[Code]) -> Code:
+    body_code = done.pop()
+    defn_code = done.pop()
+    return lambda env: body_code(env + (defn_code(env),))
+
+
+def _build_lambda(done: list[Code], slots: list[int]) -> Code:
+    body_code = done.pop()
+    if not slots:
+
+        def function(arg):
+            return body_code((arg,))
+
+        return lambda env: function
+    if len(slots) == 1:
+        (i,) = slots
+        return lambda env: lambda arg, captured=env[i]: body_code((captured, arg))
+    capture = operator.itemgetter(*slots)
+    return lambda env: lambda arg, captured=capture(env): body_code(captured + (arg,))
+
+
+def _build_app(done: list[Code]) -> Code:
+    arg_code = done.pop()
+    func_code = done.pop()
+    return lambda env: func_code(env)(arg_code(env))
+
+
+def _build_call(done: list[Code], function: Callable) -> Code:
+    arg_code = done.pop()
+    return lambda env: function(arg_code(env))
+
+
+def _free_vars(expr: TypedExpr) -> dict[int, frozenset[str]]:
+    """The free variables of each subexpression that is a lambda, by id."""
+    # Items are (expr, expanded), as in infer_types(): an expanded node is on top of the
+    # free variables of its children in `done`
+    result: dict[int, frozenset[str]] = {}
+    stack: list[tuple[TypedExpr, bool]] = [(expr, False)]
+    done: list[frozenset[str]] = []
+    while stack:
+        e, expanded = stack.pop()
+        match e.expr:
+            case Int() | Bool():
+                done.append(frozenset())
+            case Id(name):
+                done.append(frozenset((name,)))
+            case Let(decl, defn, body) if not expanded:
+                stack += (e, True), (body, False), (defn, False)
+            case Let(decl):
+                body_vars = done.pop()
+                done.append(done.pop() | (body_vars - {decl.var.name}))
+            case Lambda(decl, body) if not expanded:
+                stack += (e, True), (body, False)
+            case Lambda(decl):
+                result[id(e)] = done.pop() - {decl.var.name}
+                done.append(result[id(e)])
+            case App(func, arg) if not expanded:
+                stack += (e, True), (arg, False), (func, False)
+            case App():
+                arg_vars = done.pop()
+                done.append(done.pop() | arg_vars)
+            case _:
+                raise ValueError(f"Unknown expression: {e.expr!r}")
+    return result
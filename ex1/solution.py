@@ -5,33 +5,216 @@ Your task:
 Implement type checking and type inference for simply-typed lambda calculus.
 """
 
-from syntax.lambda_typed import parse, TypedExpr, is_grounded_expr
+from typing import Mapping
 
+from syntax.lambda_typed import (
+    parse,
+    App,
+    Arrow,
+    Bool,
+    Id,
+    Int,
+    Lambda,
+    LambdaType,
+    Let,
+    Primitive,
+    TypedExpr,
+    VarDecl,
+    inference_context,
+    is_grounded_expr,
+    is_grounded_type,
+)
+from syntax.utils import make_node
 
-class TypeMismatchError(TypeError):
-    pass
+from unification import TypeMismatchError, TypeScheme, Unifier
 
 
 class InsufficientAnnotationsError(TypeError):
     pass
 
 
-def infer_types(expr: TypedExpr) -> TypedExpr:
+def infer_types(
+    expr: TypedExpr,
+    let_polymorphism: bool = False,
+    builtins: Mapping[str, LambdaType] | None = None,
+) -> TypedExpr:
     """
     Input: an expression with ungrounded types (containing TypeVar types).
     Output: An ast with all the types explicitly inferred.
      * If encountered a unification error, raise TypeMismatchError
      * If some types cannot be inferred, raise InsufficientAnnotationsError
+    With let_polymorphism=True, let-bound variables get polymorphic types (Hindley-Milner).
+    Type variables that remain, e.g. those generalized at a let, are shown in the annotations
+    as $0, $1, ..., as if the whole program were generalized too; a free variable that is
+    not in builtins raises InsufficientAnnotationsError.
+    builtins gives the types of free variables, e.g. evaluation.TYPES.
     """
     assert is_grounded_expr(expr, require_fully_annotated=False)
 
-    result: TypedExpr = ...
-    raise NotImplementedError
+    # Type variables made during inference are numbered from 0 in every call
+    with inference_context():
+        inference = _Inference(let_polymorphism, builtins or {})
+        inference.constrain(expr)
+        result = inference.annotate(expr)
 
-    assert is_grounded_expr(result, require_fully_annotated=True)
+    if not let_polymorphism:
+        assert is_grounded_expr(result, require_fully_annotated=True)
     return result
 
 
+class _Inference:
+    """The state of one infer_types() run."""
+
+    def __init__(self, let_polymorphism: bool, builtins: Mapping[str, LambdaType]):
+        self.unifier = Unifier()
+        self.let_polymorphism = let_polymorphism
+        # The types of the variables in scope
+        self.env: dict[str, TypeScheme] = {
+            name: TypeScheme((), t) for name, t in builtins.items()
+        }
+
+    def _bind(self, name: str, scheme: TypeScheme) -> TypeScheme | None:
+        """Adds name to the environment; returns the binding it shadows, for _unbind()."""
+        shadowed = self.env.get(name)
+        self.env[name] = scheme
+        return shadowed
+
+    def _unbind(self, name: str, shadowed: TypeScheme | None) -> None:
+        if shadowed is None:
+            del self.env[name]
+        else:
+            self.env[name] = shadowed
+
+    def generalize(self, t: LambdaType) -> TypeScheme:
+        return self.unifier.generalize(t)
+
+    def constrain(self, expr: TypedExpr) -> None:
+        """Unifies the types in expr according to the typing rules.
+        Runs on an explicit stack of (step, *args) items, where step(stack, *args) may push
+        more items, so arbitrarily deep expressions do not hit the recursion limit.
+        Subexpressions are constrained in the same order as a recursive traversal would.
+        """
+        stack = [(self._constrain, expr)]
+        while stack:
+            step, *args = stack.pop()
+            step(stack, *args)
+
+    def _constrain(self, stack: list, expr: TypedExpr) -> None:
+        unifier = self.unifier
+        match expr.expr:
+            case Int():
+                unifier.unify(expr.type, Primitive.INT)
+            case Bool():
+                unifier.unify(expr.type, Primitive.BOOL)
+            case Id(name):
+                if name in self.env:
+                    unifier.unify(expr.type, unifier.instantiate(self.env[name]))
+                elif self.let_polymorphism:
+                    # Its type would be left over as an ungeneralized variable
+                    raise InsufficientAnnotationsError(f"Unbound variable: {name}")
+            case Let(_, defn):
+                if self.let_polymorphism:
+                    unifier.level += 1
+                stack += (self._let_body, expr), (self._constrain, defn)
+            case Lambda(decl, body):
+                unifier.introduce(decl.type)
+                shadowed = self._bind(decl.var.name, TypeScheme((), decl.type))
+                stack += (self._lambda_done, expr, shadowed), (self._constrain, body)
+            case App(func, arg):
+                stack += (
+                    (self._app_done, expr),
+                    (self._constrain, arg),
+                    (self._constrain, func),
+                )
+            case _:
+                raise ValueError(f"Unknown expression: {expr.expr!r}")
+
+    def _let_body(self, stack: list, expr: TypedExpr) -> None:
+        """After the definition of a let: binds its variable for the body."""
+        unifier = self.unifier
+        decl, defn, body = expr.expr.decl, expr.expr.defn, expr.expr.body
+        unifier.unify(decl.type, defn.type)
+        if self.let_polymorphism:
+            unifier.level -= 1
+            scheme = self.generalize(decl.type)
+        else:
+            scheme = TypeScheme((), decl.type)
+        shadowed = self._bind(decl.var.name, scheme)
+        stack += (self._let_done, expr, shadowed), (self._constrain, body)
+
+    def _let_done(
+        self, stack: list, expr: TypedExpr, shadowed: TypeScheme | None
+    ) -> None:
+        let = expr.expr
+        self._unbind(let.decl.var.name, shadowed)
+        self.unifier.unify(expr.type, let.body.type)
+
+    def _lambda_done(
+        self, stack: list, expr: TypedExpr, shadowed: TypeScheme | None
+    ) -> None:
+        decl, body, ret = expr.expr.decl, expr.expr.body, expr.expr.ret
+        self._unbind(decl.var.name, shadowed)
+        self.unifier.unify(ret, body.type)
+        self.unifier.unify(expr.type, make_node(Arrow, decl.type, ret))
+
+    def _app_done(self, stack: list, expr: TypedExpr) -> None:
+        app = expr.expr
+        self.unifier.unify(app.func.type, make_node(Arrow, app.arg.type, expr.type))
+
+    def resolve(self, t: LambdaType) -> LambdaType:
+        if self.let_polymorphism:
+            return self.unifier.resolve_named(t)
+        t = self.unifier.resolve(t)
+        if not is_grounded_type(t, require_fully_annotated=True):
+            raise InsufficientAnnotationsError(f"Cannot infer a type in {t!r}")
+        return t
+
+    def annotate(self, expr: TypedExpr) -> TypedExpr:
+        """expr with all of its types resolved, in the order of a recursive traversal
+        (which is the order in which remaining type variables are named).
+        A node is pushed again (expanded, with its resolved declaration if any) under its
+        children, and builds its copy from theirs, which are on top of `done` by then.
+        """
+        stack: list[tuple[TypedExpr, bool, VarDecl | None]] = [(expr, False, None)]
+        done: list[TypedExpr] = []
+        while stack:
+            e, expanded, decl = stack.pop()
+            if not expanded:
+                match e.expr:
+                    case Let(decl, defn, body):
+                        decl = VarDecl(decl.var, self.resolve(decl.type))
+                        stack += (
+                            (e, True, decl),
+                            (body, False, None),
+                            (defn, False, None),
+                        )
+                        continue
+                    case Lambda(decl, body):
+                        decl = VarDecl(decl.var, self.resolve(decl.type))
+                        stack += (e, True, decl), (body, False, None)
+                        continue
+                    case App(func, arg):
+                        stack += (
+                            (e, True, None),
+                            (arg, False, None),
+                            (func, False, None),
+                        )
+                        continue
+            match e.expr:
+                case Let():
+                    body = done.pop()
+                    new = Let(decl, done.pop(), body)
+                case Lambda(ret=ret):
+                    new = Lambda(decl, done.pop(), self.resolve(ret))
+                case App():
+                    arg = done.pop()
+                    new = App(done.pop(), arg)
+                case new:
+                    pass
+            done.append(TypedExpr(new, self.resolve(e.type)))
+        return done.pop()
+
+
 def main() -> None:
     expr = parse(r"""\x: int. x""")
     print(f"{expr!r}")
@@ -0,0 +1,74 @@
+import pytest
+
+from syntax.lambda_typed import parse, Primitive
+
+from evaluation import TYPES, compile_expr, evaluate
+from solution import infer_types, InsufficientAnnotationsError, TypeMismatchError
+
+FACT = r"fix (\fact. \n. if (eq n 0) (\u. 1) (\u. mul n (fact (sub n 1))))"
+FIB = r"fix (\fib. \n. if (lt n 2) (\u. n) (\u. add (fib (sub n 1)) (fib (sub n 2))))"
+POWER = r"fix2 (\pow. \b. \e. if (eq e 0) (\u. 1) (\u. mul b (pow b (sub e 1))))"
+
+
+def typed(program: str):
+    return infer_types(parse(program), builtins=TYPES)
+
+
+@pytest.mark.parametrize(
+    "program, expected",
+    [
+        (r"1", 1),
+        (r"True", True),
+        (r"lt 2 1", False),
+        (r"(\x: int. \y: int. sub x y) 1 3", -2),
+        (r"let x = 3 in let f = \y. add x y in let x = 10 in f x", 13),
+        # Builtins can be shadowed
+        (r"(\add: int. add) 3", 3),
+        (r"let mul = add in mul 3 4", 7),
+        (rf"{FACT} 10", 3628800),
+        (rf"{FIB} 15", 610),
+        (rf"{POWER} 3 5", 243),
+    ],
+)
+def test_evaluate(program: str, expected: object) -> None:
+    expr = typed(program)
+    assert evaluate(expr) == expected
+    assert compile_expr(expr)() == expected
+
+
+def test_functions() -> None:
+    expr = typed(r"let k = 2 in \x. \y. add (mul k x) y")
+    assert expr.type == TYPES["add"]
+    for function in [evaluate(expr), compile_expr(expr)()]:
+        assert function(3)(4) == 10
+    assert compile_expr(typed(FACT))()(5) == 120
+
+
+def test_builtin_types() -> None:
+    assert typed(rf"{FACT} 3").type == Primitive.INT
+    with pytest.raises(TypeMismatchError):
+        typed(r"add 1 True")
+    with pytest.raises(TypeMismatchError):
+        typed(r"fix (\f. \n. f) 1")
+    with pytest.raises(InsufficientAnnotationsError):
+        infer_types(parse(rf"{FACT} 3"))
+
+
+def test_unbound() -> None:
+    expr = infer_types(parse(r"(\x: int. x) 1"))
+    assert compile_expr(expr, builtins={})() == 1
+    expr = typed(r"add 1 2")
+    with pytest.raises(ValueError):
+        evaluate(expr, builtins={})
+    with pytest.raises(ValueError):
+        compile_expr(expr, builtins={})
+
+
+def test_deep() -> None:
+    n = 5_000  # far beyond the recursion limit
+    chain = "".join(f"let x{i + 1} = add x{i} 1 in " for i in range(n))
+    program = chain.replace("x0", "0", 1) + f"x{n}"
+    expr = infer_types(parse(program, backend="fast"), builtins=TYPES)
+    assert evaluate(expr) == n
+    assert compile_expr(expr)() == n
+    assert compile_expr(typed(rf"{FACT} 2000"))() > 0
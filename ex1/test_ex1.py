@@ -1,6 +1,6 @@
 import pytest
 
-from syntax.lambda_typed import parse, parse_type, TypedExpr
+from syntax.lambda_typed import parse, parse_type, Primitive, TypedExpr
 
 from solution import infer_types, InsufficientAnnotationsError, TypeMismatchError
 
@@ -45,7 +45,56 @@ def test_insufficient_0() -> None:
         infer_types(expr)
 
 
+def test_insufficient_polymorphic() -> None:
+    for program in [r"x", r"let f = \y. y in f x", r"\y. let z = x in z y"]:
+        with pytest.raises(InsufficientAnnotationsError, match="Unbound variable: x"):
+            infer_types(parse(program), let_polymorphism=True)
+    check_polymorphic(r"\x. x", r"\(x : $0) : $0. (x : $0) : $0 -> $0")
+
+
 def test_type_mismatch_0() -> None:
     expr = parse(r"let x: bool = 1 in x")
     with pytest.raises(TypeMismatchError):
         infer_types(expr)
+
+
+@pytest.mark.parametrize("let_polymorphism", [False, True])
+def test_infinite_type(let_polymorphism: bool) -> None:
+    for program in [r"\x. x x", r"\f. (\x. f (x x)) (\x. f (x x))"]:
+        with pytest.raises(TypeMismatchError, match="Infinite type"):
+            infer_types(parse(program), let_polymorphism=let_polymorphism)
+
+
+def check_polymorphic(expr: str, expected: str) -> None:
+    type_expr = infer_types(parse(expr), let_polymorphism=True)
+    assert str(type_expr) == f"({expected})"
+
+
+def test_let_polymorphism() -> None:
+    check_polymorphic(
+        r"let id = \x. x in let a = id 1 in id True",
+        r"let id : $0 -> $0 = \(x : $0) : $0. (x : $0) : $0 -> $0 in (let a : int = (id : int -> int) (1 : int) : int in ((id : bool -> bool) (True : bool) : bool) : bool) : bool",
+    )
+    with pytest.raises(TypeMismatchError):
+        infer_types(parse(r"let id = \x. x in let a = id 1 in id True"))
+
+
+def test_let_polymorphism_lambda_bound() -> None:
+    # g is bound to a lambda parameter, so it is not generalized
+    with pytest.raises(TypeMismatchError):
+        infer_types(parse(r"\f. let g = f in g 1 (g True)"), let_polymorphism=True)
+    check_polymorphic(
+        r"let f = \x. let g = \y. x in g in f 1 True",
+        r"let f : $2 -> $1 -> $2 = \(x : $2) : $1 -> $2. (let g : $0 -> $2 = \(y : $0) : $2. (x : $2) : $0 -> $2 in (g : $1 -> $2) : $1 -> $2) : $2 -> $1 -> $2 in (((f : int -> bool -> int) (1 : int) : bool -> int) (True : bool) : int) : int",
+    )
+
+
+def test_deep() -> None:
+    n = 5_000  # far beyond the recursion limit
+    chain = "".join(f"let x{i + 1} = x{i} in " for i in range(n))
+    expr = infer_types(parse(chain.replace("x0", "1", 1) + f"x{n}", backend="fast"))
+    assert expr.type == Primitive.INT
+    spine = r"(\f. f" + " 1" * n + ") " + r"\x. " * n + "True"
+    assert infer_types(parse(spine, backend="fast")).type == Primitive.BOOL
+    with pytest.raises(TypeMismatchError):
+        infer_types(parse(chain.replace("x0", "1", 1) + f"x{n} 1", backend="fast"))
@@ -0,0 +1,73 @@
+import pytest
+
+from syntax.lambda_typed import Arrow, Primitive, TypeName, TypeVar, parse_type
+
+from unification import TypeMismatchError, Unifier
+
+
+def test_unify():
+    a, b, c = TypeVar(-1), TypeVar(-2), TypeVar(-3)
+    unifier = Unifier()
+    unifier.unify(Arrow(a, b), Arrow(c, a))
+    unifier.unify(c, parse_type("int -> T"))
+    int_to_t = parse_type("int -> T")
+    assert unifier.resolve(Arrow(a, b)) == Arrow(int_to_t, int_to_t)
+    assert unifier.find(a) == unifier.find(b) == unifier.find(c)
+
+
+def test_mismatch():
+    unifier = Unifier()
+    unifier.unify(TypeVar(-1), Primitive.INT)
+    with pytest.raises(TypeMismatchError):
+        unifier.unify(
+            Arrow(TypeVar(-1), TypeVar(-2)), Arrow(TypeName("T"), TypeVar(-2))
+        )
+
+
+def test_occurs_check():
+    a, b = TypeVar(-1), TypeVar(-2)
+    unifier = Unifier()
+    unifier.unify(a, Arrow(b, Primitive.INT))
+    with pytest.raises(TypeMismatchError):
+        unifier.unify(b, Arrow(Primitive.BOOL, a))
+
+
+def test_occurs_check_on_merged_classes():
+    v1, v2 = TypeVar(-1), TypeVar(-2)
+    unifier = Unifier()
+    with pytest.raises(TypeMismatchError, match="Infinite type"):
+        unifier.unify(Arrow(Arrow(v2, Arrow(v1, v2)), v1), v1)
+    unifier = Unifier()
+    unifier.unify(v1, Arrow(v2, Primitive.INT))
+    with pytest.raises(TypeMismatchError, match="Infinite type"):
+        unifier.unify(v1, v2)
+
+
+def test_long_chains():
+    n = 20_000
+    unifier = Unifier()
+    for i in range(1, n):
+        unifier.unify(TypeVar(-i), TypeVar(-i - 1))
+    typ = Primitive.INT
+    for i in range(n, 0, -1):
+        typ = Arrow(TypeVar(-i), typ)
+    unifier.unify(TypeVar(-n), Primitive.BOOL)
+    resolved = unifier.resolve(typ)
+    for _ in range(n):
+        assert resolved.arg == Primitive.BOOL
+        resolved = resolved.ret
+
+
+def test_generalize_and_instantiate():
+    a, b = TypeVar(-1), TypeVar(-2)
+    unifier = Unifier()
+    unifier.introduce(a)
+    unifier.level += 1
+    unifier.unify(b, Arrow(a, TypeVar(-3)))
+    unifier.level -= 1
+    scheme = unifier.generalize(b)
+    assert len(scheme.vars) == 1 and scheme.type == Arrow(a, scheme.vars[0])
+    first, second = unifier.instantiate(scheme), unifier.instantiate(scheme)
+    assert first.arg == second.arg == a and first.ret != second.ret
+    unifier.unify(first.ret, Primitive.INT)
+    unifier.unify(second.ret, Primitive.BOOL)
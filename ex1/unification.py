@@ -0,0 +1,363 @@
+"""
+Unification of lambda_typed types, for type inference.
+
+Type variables are kept in a union-find forest (path compression, union by rank).
+Each class of unified variables may be bound to one non-variable type.
+Bindings are never cyclic: unify() checks that a variable does not occur in the type it
+is bound to, and raises TypeMismatchError for an infinite type. The check only follows
+bindings for variables that occur in some binding, so binding a new variable is cheap.
+
+For let-polymorphism, every class also has a level: the number of enclosing let
+definitions when it was first seen. Binding a variable lowers the levels of the
+variables in its type, so after a definition, the variables with a level above the
+current one are exactly those that do not occur in the environment, and can be
+generalized without scanning it.
+"""
+
+from dataclasses import dataclass
+
+from syntax.lambda_typed import (
+    Arrow,
+    LambdaType,
+    TypeName,
+    TypeVar,
+    fresh_typevar,
+    is_grounded_type,
+)
+from syntax.utils import make_node
+
+
+class TypeMismatchError(TypeError):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class TypeScheme:
+    """forall vars. type"""
+
+    vars: tuple[TypeVar, ...]
+    type: LambdaType
+
+
+class Unifier:
+    """A mutable most-general unifier. unify() raises TypeMismatchError as soon as two types
+    have different constructors or a type would be infinite, and resolve() applies the
+    unifier to a type.
+    All operations are iterative, so deep types do not hit the recursion limit."""
+
+    def __init__(self):
+        # Keyed by TypeVar.id, which is cheaper to hash than the TypeVar
+        self._parent: dict[int, TypeVar] = {}
+        self._rank: dict[int, int] = {}
+        self._binding: dict[int, LambdaType] = {}  # of representatives only
+        self._levels: dict[int, int] = {}  # of representatives only
+        # Representatives of the classes with a variable in some binding. Only those can
+        # be reached by following bindings, which the occurs check then needs to do
+        self._mentioned: set[int] = set()
+        self.level = 0
+        # Memo of resolve(), valid until the next binding
+        self._resolved: dict[LambdaType, LambdaType] = {}
+
+    def find(self, v: TypeVar) -> TypeVar:
+        """The representative of v's class."""
+        parent = self._parent
+        root = v
+        while (p := parent.get(root.id)) is not None:
+            root = p
+        while v.id != root.id:
+            parent[v.id], v = root, parent[v.id]
+        return root
+
+    def _shallow(self, t: LambdaType) -> LambdaType:
+        """The type that t stands for, at the top level: a representative that is not bound,
+        or a non-variable type."""
+        if type(t) is TypeVar:
+            t = self.find(t)
+            return self._binding.get(t.id, t)
+        return t
+
+    def unify(self, a: LambdaType, b: LambdaType) -> None:
+        """Makes a and b equal, or raises TypeMismatchError if their constructors differ or
+        if a variable would occur in its own type, before binding it.
+        Two bound variables are made equal by unifying their bindings; pairs of types are
+        unified at most once per call, so shared subterms do not make this exponential.
+        """
+        binding = self._binding
+        unified = set()
+        stack = [(a, b)]
+        while stack:
+            a, b = stack.pop()
+            if type(a) is TypeVar:
+                a = self.find(a)
+            if type(b) is TypeVar:
+                b = self.find(b)
+            if a == b:
+                continue
+            if type(b) is TypeVar:
+                a, b = b, a
+            if type(a) is TypeVar:
+                bound = binding.get(a.id)
+                if type(b) is TypeVar and bound is None:
+                    other = binding.get(b.id)
+                    if other is not None:
+                        self._occurs_check(a, other)
+                    self._union(a, b)
+                elif type(b) is TypeVar and binding.get(b.id) is None:
+                    self._occurs_check(b, bound)
+                    self._union(a, b)
+                elif type(b) is TypeVar:
+                    if (a, b) not in unified:
+                        unified.add((a, b))
+                        stack.append((bound, binding[b.id]))
+                elif bound is None:
+                    self._occurs_check(a, b)
+                    self._bind(a, b)
+                else:
+                    stack.append((bound, b))
+            elif type(a) is Arrow and type(b) is Arrow:
+                if (a, b) not in unified:
+                    unified.add((a, b))
+                    stack += (a.ret, b.ret), (a.arg, b.arg)
+            else:
+                raise TypeMismatchError(
+                    f"Cannot unify {self._show(a)} with {self._show(b)}"
+                )
+
+    def _occurs_check(self, v: TypeVar, t: LambdaType) -> None:
+        """Raises TypeMismatchError if the representative v occurs in t under the current
+        bindings. Subterms that contain no type variables are skipped, and shared subterms
+        are visited once. If no binding mentions v's class, bindings are not followed, so
+        checking a new variable takes time in the size of t only."""
+        follow = v.id in self._mentioned
+        seen = set()
+        stack = [t]
+        while stack:
+            u = stack.pop()
+            if type(u) is TypeVar:
+                u = self.find(u)
+                if u.id == v.id:
+                    raise TypeMismatchError(
+                        f"Infinite type: {self._show_var(v)} occurs in {self._show(t)}"
+                    )
+                u = self._binding.get(u.id) if follow else None
+                if u is None:
+                    continue
+            if type(u) is Arrow and u not in seen:
+                if is_grounded_type(u, require_fully_annotated=True):
+                    continue
+                seen.add(u)
+                stack += u.arg, u.ret
+
+    def _level(self, rep: TypeVar) -> int:
+        """The level of a representative; a variable seen for the first time is at the
+        current level."""
+        return self._levels.setdefault(rep.id, self.level)
+
+    def introduce(self, t: LambdaType) -> None:
+        """Puts the new variables of t at the current level. Variables are otherwise put at
+        the level where unify() first sees them, which is too deep for, e.g., the type of
+        a lambda's parameter that is first used inside a let definition in its body."""
+        for v in self._free_vars(self.resolve(t)):
+            self._level(v)
+
+    def _union(self, a: TypeVar, b: TypeVar) -> None:
+        """Merges the classes of the distinct representatives a and b, by rank, at the lower
+        of their levels. The new representative keeps one of their bindings (the caller
+        unifies the other one with it)."""
+        if self._resolved:
+            self._resolved.clear()
+        level = min(self._level(a), self._level(b))
+        rank = self._rank
+        ra, rb = rank.get(a.id, 0), rank.get(b.id, 0)
+        if ra > rb:
+            a, b = b, a
+        elif ra == rb:
+            rank[b.id] = rb + 1
+        self._parent[a.id] = b
+        if a.id in self._mentioned:
+            self._mentioned.add(b.id)
+        bound = self._binding.pop(a.id, None)
+        if bound is not None:
+            self._binding.setdefault(b.id, bound)
+            self._lower(bound, level)
+        if b.id in self._binding:
+            self._lower(self._binding[b.id], level)
+        self._levels[b.id] = level
+
+    def _bind(self, v: TypeVar, t: LambdaType) -> None:
+        """Binds the unbound representative v to t, which is not a variable."""
+        if self._resolved:
+            self._resolved.clear()
+        self._lower(t, self._level(v))
+        self._binding[v.id] = t
+        seen = set()
+        stack = [t]
+        while stack:
+            u = stack.pop()
+            if type(u) is TypeVar:
+                self._mentioned.add(self.find(u).id)
+            elif type(u) is Arrow and u not in seen:
+                if not is_grounded_type(u, require_fully_annotated=True):
+                    seen.add(u)
+                    stack += u.arg, u.ret
+
+    def _lower(self, t: LambdaType, level: int) -> None:
+        """Lowers the levels of the variables in t (under the current bindings) to at most
+        `level`. The variables in a binding are never above the one it binds, so bindings
+        are only followed below variables that get lowered, and each variable is lowered
+        at most once per level. Subterms without type variables are skipped."""
+        levels = self._levels
+        seen = set()
+        stack = [t]
+        while stack:
+            u = stack.pop()
+            if type(u) is TypeVar:
+                u = self.find(u)
+                if self._level(u) <= level:
+                    continue
+                levels[u.id] = level
+                u = self._binding.get(u.id)
+                if u is None:
+                    continue
+            if type(u) is Arrow and u not in seen:
+                if is_grounded_type(u, require_fully_annotated=True):
+                    continue
+                seen.add(u)
+                stack += u.arg, u.ret
+
+    def _free_vars(self, t: LambdaType) -> list[TypeVar]:
+        """The unbound representatives in a resolved type, in order of appearance."""
+        found: dict[int, TypeVar] = {}
+        seen = set()
+        stack = [t]
+        while stack:
+            u = stack.pop()
+            if type(u) is TypeVar:
+                found.setdefault(u.id, u)
+            elif (
+                type(u) is Arrow
+                and u not in seen
+                and not is_grounded_type(u, require_fully_annotated=True)
+            ):
+                seen.add(u)
+                stack += u.ret, u.arg
+        return list(found.values())
+
+    def generalize(self, t: LambdaType) -> TypeScheme:
+        """Quantifies the variables of t that were first seen at a deeper level than the
+        current one, i.e. inside a let definition that has been left.
+        Internal variables are first renamed to fresh (printable) ones, so the definition's
+        annotations show them."""
+        t = self.resolve(t)
+        quantified = [v for v in self._free_vars(t) if self._level(v) > self.level]
+        if not quantified:
+            return TypeScheme((), t)
+        quantified = [self._named(v) for v in quantified]
+        return TypeScheme(tuple(quantified), self.resolve(t))
+
+    def _named(self, v: TypeVar) -> TypeVar:
+        """Unifies an internal unbound representative with a fresh non-internal variable,
+        which becomes the representative."""
+        if not v.is_internal():
+            return v
+        named = fresh_typevar()
+        self._parent[v.id] = named
+        if v.id in self._mentioned:
+            self._mentioned.add(named.id)
+        self._levels[named.id] = self._level(v)
+        self._resolved.clear()
+        return named
+
+    def resolve_named(self, t: LambdaType) -> LambdaType:
+        """Like resolve(), but the unbound internal variables in the result are first
+        renamed to fresh non-internal ones, so that they are printed."""
+        t = self.resolve(t)
+        if not is_grounded_type(t, require_fully_annotated=True):
+            for v in self._free_vars(t):
+                self._named(v)
+            t = self.resolve(t)
+        return t
+
+    def instantiate(self, scheme: TypeScheme) -> LambdaType:
+        """A copy of the scheme's type, with fresh variables (at the current level) for the
+        quantified ones."""
+        if not scheme.vars:
+            return scheme.type
+        fresh = {}
+        for v in scheme.vars:
+            fresh[v] = u = fresh_typevar()
+            self._levels[u.id] = self.level
+        return self._substitute(self.resolve(scheme.type), fresh)
+
+    @staticmethod
+    def _substitute(
+        t: LambdaType, substitution: dict[TypeVar, LambdaType]
+    ) -> LambdaType:
+        """Replaces the variables of a resolved type t that are in the substitution."""
+        if not substitution:
+            return t
+        memo: dict[LambdaType, LambdaType] = dict(substitution)
+        stack = [t]
+        while stack:
+            u = stack[-1]
+            if u in memo:
+                stack.pop()
+            elif type(u) is Arrow and not is_grounded_type(
+                u, require_fully_annotated=True
+            ):
+                arg, ret = u.arg, u.ret
+                if arg in memo and ret in memo:
+                    memo[u] = make_node(Arrow, memo[arg], memo[ret])
+                    stack.pop()
+                else:
+                    stack += arg, ret
+            else:
+                memo[u] = u
+                stack.pop()
+        return memo[t]
+
+    @staticmethod
+    def _show_var(v: TypeVar) -> str:
+        return f"?{-v.id}" if v.is_internal() else str(v)
+
+    def _show(self, t: LambdaType) -> str:
+        """Pretty-prints t for error messages, showing internal variables as ?1, ?2, ..."""
+        t = self.resolve(t)
+        names = {
+            v: TypeName(self._show_var(v))
+            for v in self._free_vars(t)
+            if v.is_internal()
+        }
+        return str(self._substitute(t, names))
+
+    def resolve(self, t: LambdaType) -> LambdaType:
+        """t with every bound type variable replaced by its binding, recursively.
+        Unbound variables are replaced by their representatives."""
+        memo = self._resolved
+        stack = [t]
+        while stack:
+            u = stack[-1]
+            if u in memo:
+                stack.pop()
+            elif type(u) is TypeVar:
+                rep = self.find(u)
+                bound = self._binding.get(rep.id)
+                if bound is None:
+                    memo[u] = rep
+                    stack.pop()
+                elif bound in memo:
+                    memo[u] = memo[bound]
+                    stack.pop()
+                else:
+                    stack.append(bound)
+            elif type(u) is Arrow:
+                arg, ret = u.arg, u.ret
+                if arg in memo and ret in memo:
+                    memo[u] = make_node(Arrow, memo[arg], memo[ret])
+                    stack.pop()
+                else:
+                    stack += arg, ret
+            else:
+                memo[u] = u
+                stack.pop()
+        return memo[t]
@@ -0,0 +1,62 @@
+"""Normal-order reduction by substitution on locally nameless terms (debruijn.py), versus
+named terms with capture-avoiding substitution (reduction.py), on Church-numeral
+arithmetic and on terms that force renaming; and alpha-equivalence tests on converted
+terms.
+
+Usage: python lab1/bench_debruijn.py [scale]
+"""
+
+import sys
+
+from syntax.lambda_pure import parse
+
+from bench_interpret import EXP, MULT, PLUS, church, timed
+import debruijn
+import reduction
+import solution
+
+
+def main() -> None:
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for label, program in [
+        (
+            f"{20 * scale} + {30 * scale}",
+            f"{PLUS} {church(20 * scale)} {church(30 * scale)}",
+        ),
+        (
+            f"{10 * scale} * {20 * scale}",
+            f"{MULT} {church(10 * scale)} {church(20 * scale)}",
+        ),
+        (f"2 ^ {6 + scale}", f"{EXP} {church(2)} {church(6 + scale)}"),
+        (
+            # Each step substitutes y under a binder called y
+            f"capture {200 * scale}",
+            r"(\f. \y. "
+            + "f (" * (200 * scale)
+            + "y"
+            + ")" * (200 * scale)
+            + r") (\x. \y. x y)",
+        ),
+    ]:
+        expr = parse(program, backend="fast")
+        named, named_time = timed(lambda e: reduction.normalize(e, fuel=10**9), expr)
+        term, conversion_time = timed(debruijn.to_debruijn, expr)
+        result, debruijn_time = timed(lambda t: debruijn.normalize(t, fuel=10**9), term)
+        assert debruijn.to_debruijn(named) is result
+        print(
+            f"{label:16} named {named_time:8.4f} s, locally nameless {debruijn_time:8.4f} s"
+            f" (+ {conversion_time:.4f} s to convert)"
+        )
+
+    n = 2_000 * scale
+    a = parse(r"\x. \y. " + "x (" * n + "y" + ")" * n, backend="fast")
+    b = parse(r"\f. \z. " + "f (" * n + "z" + ")" * n, backend="fast")
+    _, elapsed = timed(lambda e: solution.alpha_equivalent(*e), (a, b))
+    print(f"alpha-equivalence of church({n}) terms: {elapsed:8.4f} s")
+    a_term, b_term = debruijn.to_debruijn(a), debruijn.to_debruijn(b)
+    _, elapsed = timed(lambda e: e[0] is e[1], (a_term, b_term))
+    print(f"  once converted: {elapsed:.7f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""interpret() on the Krivine machine, versus normal-order reduction by substitution,
+on Church-numeral arithmetic; and call-by-name versus call-by-need on programs that use
+their arguments several times.
+
+Usage: python lab1/bench_interpret.py [scale]
+"""
+
+import sys
+import time
+
+from syntax.lambda_pure import parse
+
+from machine import KrivineMachine
+from reduction import normalize
+
+
+def church(n: int) -> str:
+    return r"(\f. \x. " + "f (" * n + "x" + ")" * n + ")"
+
+
+PLUS = r"(\m. \n. \f. \x. m f (n f x))"
+MULT = r"(\m. \n. \f. m (n f))"
+EXP = r"(\m. \n. n m)"
+
+
+def and_chain(n: int) -> str:
+    """b_n, where b_0 = True and b_i = b_(i-1) and b_(i-1), on Church booleans."""
+    lets = "".join(f"let b{i} = and b{i - 1} b{i - 1} in " for i in range(1, n + 1))
+    return rf"let and = \p. \q. p q p in let b0 = \t. \f. t in {lets}b{n}"
+
+
+def timed(normalize, expr) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = normalize(expr)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for label, program in [
+        (
+            f"{20 * scale} + {30 * scale}",
+            f"{PLUS} {church(20 * scale)} {church(30 * scale)}",
+        ),
+        (
+            f"{10 * scale} * {20 * scale}",
+            f"{MULT} {church(10 * scale)} {church(20 * scale)}",
+        ),
+        (f"2 ^ {6 + scale}", f"{EXP} {church(2)} {church(6 + scale)}"),
+        (
+            f"({scale} + 2) * 3 ^ 4",
+            f"{MULT} ({PLUS} {church(scale)} {church(2)}) ({EXP} {church(3)} {church(4)})",
+        ),
+    ]:
+        expr = parse(program, backend="fast")
+        machine = KrivineMachine(fuel=10**9)
+        result, machine_time = timed(machine.normalize, expr)
+        expected, substitution_time = timed(lambda e: normalize(e, fuel=10**9), expr)
+        assert result == expected
+        print(
+            f"{label:16} {machine.steps:8,} steps: machine {machine_time:8.4f} s,"
+            f" substitution {substitution_time:8.4f} s"
+        )
+
+    for label, program in [
+        (f"and chain {12 + scale}", and_chain(12 + scale)),
+        (
+            f"(\\x. x x) 3^{3 + scale}",
+            rf"(\x. x x) ({EXP} {church(3)} {church(3 + scale)} (\y. y) (\z. z))",
+        ),
+    ]:
+        expr = parse(program, backend="fast")
+        results = []
+        for strategy in ["name", "need"]:
+            machine = KrivineMachine(fuel=10**9, strategy=strategy)
+            result, elapsed = timed(machine.normalize, expr)
+            results.append(result)
+            print(
+                f"{label:16} by {strategy}: {machine.steps:10,} steps,"
+                f" {machine.forcings:6,} forced thunks, {elapsed:8.4f} s"
+            )
+        assert results[0] == results[1]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""interpret() by normalization by evaluation, versus the Krivine machine (by name and by
+need) and normal-order reduction by substitution, on Church-numeral arithmetic and on
+programs that use their arguments several times.
+
+Usage: python lab1/bench_nbe.py [scale]
+"""
+
+import sys
+
+from syntax.lambda_pure import parse
+
+from bench_interpret import EXP, MULT, PLUS, and_chain, church, timed
+from machine import KrivineMachine
+import nbe
+from reduction import normalize
+
+
+def main() -> None:
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for label, program in [
+        (
+            f"{20 * scale} + {30 * scale}",
+            f"{PLUS} {church(20 * scale)} {church(30 * scale)}",
+        ),
+        (
+            f"{10 * scale} * {20 * scale}",
+            f"{MULT} {church(10 * scale)} {church(20 * scale)}",
+        ),
+        (f"2 ^ {6 + scale}", f"{EXP} {church(2)} {church(6 + scale)}"),
+        (
+            f"parity {20 * scale}^2",
+            rf"{MULT} {church(20 * scale)} {church(20 * scale)}"
+            r" (\b. \t. \f. b f t) (\t. \f. t)",
+        ),
+        (f"and chain {12 + scale}", and_chain(12 + scale)),
+        (
+            f"(\\x. x x) 3^{3 + scale}",
+            rf"(\x. x x) ({EXP} {church(3)} {church(3 + scale)} (\y. y) (\z. z))",
+        ),
+    ]:
+        expr = parse(program, backend="fast")
+        result, nbe_time = timed(lambda e: nbe.normalize(e, fuel=10**9), expr)
+        times = []
+        for strategy in ["name", "need"]:
+            machine = KrivineMachine(fuel=10**9, strategy=strategy)
+            expected, elapsed = timed(machine.normalize, expr)
+            assert result is expected
+            times.append(f"by {strategy} {elapsed:8.4f} s")
+        if scale == 1:
+            expected, elapsed = timed(lambda e: normalize(e, fuel=10**9), expr)
+            assert result is expected
+            times.append(f"substitution {elapsed:8.4f} s")
+        print(f"{label:16} nbe {nbe_time:8.4f} s, machine " + ", ".join(times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Factorial with the primitive operators on Int literals (primitives.py), versus with
+Church numerals, on the Krivine machine (by name and by need) and by NbE: steps and time.
+
+Usage: python lab1/bench_primitives.py [scale]
+"""
+
+import sys
+
+from syntax.lambda_pure import parse
+
+from bench_interpret import MULT, church, timed
+from machine import KrivineMachine
+import nbe
+from primitives import church_to_int
+
+Y = r"(\f. (\x. f (x x)) (\x. f (x x)))"
+PRED = r"(\n. \f. \x. n (\g. \h. h (g f)) (\u. x) (\u. u))"
+IS_ZERO = r"(\n. n (\x. \t. \f. f) (\t. \f. t))"
+FACT = rf"({Y} (\fact. \n. ifz n 1 (mul n (fact (sub n 1)))))"
+CHURCH_FACT = (
+    rf"({Y} (\fact. \n. {IS_ZERO} n {church(1)} ({MULT} n (fact ({PRED} n)))))"
+)
+
+
+def main() -> None:
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for n in [3 + scale, 4 + scale]:
+        native = parse(f"{FACT} {n}", backend="fast")
+        encoded = parse(f"{CHURCH_FACT} {church(n)}", backend="fast")
+        for strategy in ["name", "need"]:
+            machine = KrivineMachine(fuel=10**9, strategy=strategy, primitives=True)
+            result, native_time = timed(machine.normalize, native)
+            native_steps = machine.steps
+            machine = KrivineMachine(fuel=10**9, strategy=strategy)
+            expected, church_time = timed(machine.normalize, encoded)
+            assert church_to_int(expected) is result
+            print(
+                f"{n}! by {strategy}: primitives {native_steps:9} steps {native_time:8.4f} s,"
+                f" Church numerals {machine.steps:9} steps {church_time:8.4f} s"
+            )
+        evaluator = nbe.Evaluator(fuel=10**9, primitives=True)
+        _, native_time = timed(
+            lambda e: evaluator.quote(evaluator.compile(e, [])(())), native
+        )
+        native_steps = evaluator.steps
+        evaluator = nbe.Evaluator(fuel=10**9)
+        _, church_time = timed(
+            lambda e: evaluator.quote(evaluator.compile(e, [])(())), encoded
+        )
+        print(
+            f"{n}! nbe:     primitives {native_steps:9} steps {native_time:8.4f} s,"
+            f" Church numerals {evaluator.steps:9} steps {church_time:8.4f} s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""
+A locally nameless form of lambda_pure terms: bound variables are de Bruijn indices
+(Bound(0) is the variable of the innermost enclosing binder), free variables keep their
+names (Id), and binders have no names. Nodes are interned through make_node(), so two
+terms are alpha-equivalent exactly when their locally nameless forms are the same object.
+
+Substitution never renames: the indices of a term that is moved under binders are shifted
+instead. Each node records how many enclosing binders its indices reach (`loose`), so the
+subterms that cannot refer to a substituted variable are kept as they are.
+All traversals use explicit stacks, so deep terms do not hit the recursion limit.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable
+
+from syntax.lambda_pure import App, Id, Int, Lambda, LambdaExpr, Let
+from syntax.utils import make_node
+
+from reduction import (
+    _MEMO_LIMIT,
+    DivergenceError,
+    OutOfFuelError,
+    _CycleDetector,
+    fresh_name,
+    free_vars,
+)
+
+type Term = Bound | Id | Int | Abs | Apply | LetIn
+
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+class Bound:
+    index: int
+    loose: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "loose", self.index + 1)
+
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+class Abs:
+    body: Term
+    loose: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "loose", max(_loose(self.body) - 1, 0))
+
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+class Apply:
+    func: Term
+    arg: Term
+    loose: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "loose", max(_loose(self.func), _loose(self.arg)))
+
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+class LetIn:
+    """let defn in body, where Bound(0) in body is the defined variable."""
+
+    defn: Term
+    body: Term
+    loose: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(
+            self, "loose", max(_loose(self.defn), _loose(self.body) - 1, 0)
+        )
+
+
+def _loose(t: Term) -> int:
+    """The number of enclosing binders that the indices of t refer to."""
+    return 0 if type(t) is Id or type(t) is Int else t.loose
+
+
+def to_debruijn(e: LambdaExpr) -> Term:
+    """The locally nameless form of e."""
+    levels: dict[str, list[int]] = {}  # name -> depths of the binders in scope
+    depth = 0
+    # A subterm converts to the same term wherever its free variables have the same indices
+    converted: dict[tuple, Term] = {}
+    # Items are (node,) to convert, (node, key) to build node from its converted children
+    # (on top of `done`) and leave its binder, or (None, name) to enter a Let's binder
+    stack: list[tuple] = [(e,)]
+    done: list[Term] = []
+    while stack:
+        node, *args = stack.pop()
+        if node is None:
+            levels.setdefault(args[0], []).append(depth)
+            depth += 1
+            continue
+        if args:
+            match node:
+                case Lambda(var):
+                    result = make_node(Abs, done.pop())
+                case App():
+                    arg = done.pop()
+                    result = make_node(Apply, done.pop(), arg)
+                case Let(var):
+                    body = done.pop()
+                    result = make_node(LetIn, done.pop(), body)
+            if type(node) is not App:
+                levels[var.name].pop()
+                depth -= 1
+            converted[args[0]] = result
+            done.append(result)
+            continue
+        match node:
+            case Id(name):
+                bound = levels.get(name)
+                done.append(make_node(Bound, depth - 1 - bound[-1]) if bound else node)
+                continue
+            case Int():
+                done.append(node)
+                continue
+        # free_vars() returns the set cached on the node, so the order is consistent
+        key = (id(node),) + tuple(
+            depth - 1 - levels[v][-1] if levels.get(v) else -1 for v in free_vars(node)
+        )
+        if key in converted:
+            done.append(converted[key])
+            continue
+        match node:
+            case Lambda(var, body):
+                levels.setdefault(var.name, []).append(depth)
+                depth += 1
+                stack += (node, key), (body,)
+            case App(func, arg):
+                stack += (node, key), (arg,), (func,)
+            case Let(var, defn, body):
+                stack += (node, key), (body,), (None, var.name), (defn,)
+            case _:
+                raise ValueError(f"Unknown expression: {node!r}")
+    return done.pop()
+
+
+def from_debruijn(t: Term, name: str = "x") -> LambdaExpr:
+    """A lambda_pure term whose locally nameless form is t (which has no loose indices).
+    Binders are called `name`, or name1, name2, ... where `name` would capture a variable
+    that is free in their body."""
+    free_memo: dict[int, tuple[Term, frozenset[str]]] = {}
+    names: list[str] = []  # of the binders in scope, innermost last
+    built: dict[tuple, LambdaExpr] = {}
+    # Items are (node,) to convert, (node, key) to build node from its converted children
+    # (on top of `done`) and leave its binder, or (None, body) to enter a LetIn's binder
+    stack: list[tuple] = [(t,)]
+    done: list[LambdaExpr] = []
+    while stack:
+        node, *args = stack.pop()
+        if node is None:
+            names.append(_binder_name(name, args[0], names, free_memo))
+            continue
+        if args:
+            match node:
+                case Abs():
+                    result = make_node(Lambda, make_node(Id, names.pop()), done.pop())
+                case Apply():
+                    arg = done.pop()
+                    result = make_node(App, done.pop(), arg)
+                case LetIn():
+                    body = done.pop()
+                    var = make_node(Id, names.pop())
+                    result = make_node(Let, var, done.pop(), body)
+            built[args[0]] = result
+            done.append(result)
+            continue
+        match node:
+            case Bound(index):
+                if index >= len(names):
+                    raise ValueError(f"Loose bound variable: {node!r}")
+                done.append(make_node(Id, names[-1 - index]))
+                continue
+            case Id() | Int():
+                done.append(node)
+                continue
+        # The names of the binders that the node's indices may refer to
+        key = (id(node), *names[len(names) - node.loose :]) if node.loose else id(node)
+        if key in built:
+            done.append(built[key])
+            continue
+        match node:
+            case Abs(body):
+                names.append(_binder_name(name, body, names, free_memo))
+                stack += (node, key), (body,)
+            case Apply(func, arg):
+                stack += (node, key), (arg,), (func,)
+            case LetIn(defn, body):
+                stack += (node, key), (body,), (None, body), (defn,)
+            case _:
+                raise ValueError(f"Unknown term: {node!r}")
+    return done.pop()
+
+
+def _binder_name(name: str, body: Term, names: list[str], free_memo: dict) -> str:
+    """A name for a binder of body, under binders called `names`, that does not capture a
+    free variable of body or hide an enclosing binder that body may refer to."""
+    outer = _loose(body) - 1
+    taken = _free_names(body, free_memo).union(
+        names[len(names) - outer :] if outer > 0 else ()
+    )
+    return name if name not in taken else fresh_name(name, taken)
+
+
+def _free_names(
+    t: Term, memo: dict[int, tuple[Term, frozenset[str]]]
+) -> frozenset[str]:
+    """The names of the free variables (Id) of t."""
+    stack = [t]
+    while stack:
+        node = stack[-1]
+        if id(node) in memo:
+            stack.pop()
+            continue
+        children = _subterms(node)
+        pending = [child for child in children if id(child) not in memo]
+        if pending:
+            stack += pending
+            continue
+        stack.pop()
+        if type(node) is Id:
+            names = frozenset((node.name,))
+        else:
+            names = frozenset().union(*(memo[id(child)][1] for child in children))
+        memo[id(node)] = (node, names)
+    return memo[id(t)][1]
+
+
+def _subterms(t: Term) -> tuple[Term, ...]:
+    match t:
+        case Abs(body):
+            return (body,)
+        case Apply(func, arg):
+            return func, arg
+        case LetIn(defn, body):
+            return defn, body
+        case _:
+            return ()
+
+
+def _replace_loose(t: Term, replace: Callable[[int, int], Term]) -> Term:
+    """t with each Bound(i) under `depth` binders of t, where i >= depth (i.e. that refers
+    to a binder enclosing t), replaced by replace(i, depth). Subterms whose indices all
+    refer to binders inside t are kept as they are."""
+    memo: dict[tuple[int, int], Term] = {}
+    # Items are (node, depth) to replace in, or (None, node, depth) to build node from the
+    # results for its children, which are then on top of `done`
+    stack: list[tuple] = [(t, 0)]
+    done: list[Term] = []
+    while stack:
+        node, *args = stack.pop()
+        if node is None:
+            node, depth = args
+            match node:
+                case Abs():
+                    result = make_node(Abs, done.pop())
+                case Apply():
+                    arg = done.pop()
+                    result = make_node(Apply, done.pop(), arg)
+                case LetIn():
+                    body = done.pop()
+                    result = make_node(LetIn, done.pop(), body)
+            memo[id(node), depth] = result
+            done.append(result)
+            continue
+        (depth,) = args
+        if _loose(node) <= depth:
+            done.append(node)
+            continue
+        if (id(node), depth) in memo:
+            done.append(memo[id(node), depth])
+            continue
+        match node:
+            case Bound(index):
+                done.append(replace(index, depth))
+            case Abs(body):
+                stack += (None, node, depth), (body, depth + 1)
+            case Apply(func, arg):
+                stack += (None, node, depth), (arg, depth), (func, depth)
+            case LetIn(defn, body):
+                stack += (None, node, depth), (body, depth + 1), (defn, depth)
+    return done.pop()
+
+
+def shift(t: Term, by: int) -> Term:
+    """t moved under `by` more binders: its loose indices are increased by `by`."""
+    if not by:
+        return t
+    return _replace_loose(t, lambda index, depth: make_node(Bound, index + by))
+
+
+def instantiate(body: Term, arg: Term) -> Term:
+    """The body of a binder, with its variable replaced by arg (and the indices that refer
+    to enclosing binders decreased, since the binder is removed)."""
+    shifted: dict[int, Term] = {}
+
+    def replace(index: int, depth: int) -> Term:
+        if index > depth:
+            return make_node(Bound, index - 1)
+        if depth not in shifted:
+            shifted[depth] = shift(arg, depth)
+        return shifted[depth]
+
+    return _replace_loose(body, replace)
+
+
+def contract(redex: Term) -> Term:
+    """Performs one beta (or let) reduction at the root of redex."""
+    match redex:
+        case Apply(Abs(body), arg) | LetIn(arg, body):
+            return instantiate(body, arg)
+        case _:
+            raise ValueError(f"Not a redex: {redex}")
+
+
+def find_redex(
+    t: Term, normal: dict[int, Term] | None = None
+) -> list[tuple[Term, int]] | None:
+    """The path to the leftmost-outermost redex of t, as reduction.find_redex()."""
+    if normal is None:
+        normal = {}
+    path: list[tuple[Term, int]] = []
+    # Items are (node, depth, index in its parent), or (None, node) once its subterms are
+    # searched, to mark it normal
+    stack: list[tuple] = [(t, 0, -1)]
+    while stack:
+        node, *args = stack.pop()
+        if node is None:
+            (done,) = args
+            normal[id(done)] = done
+            continue
+        depth, index = args
+        if id(node) in normal:
+            continue
+        del path[depth:]
+        if path:
+            path[-1] = (path[-1][0], index)
+        match node:
+            case Apply(Abs(), _) | LetIn():
+                path.append((node, -1))
+                return path
+            case Apply(func, arg):
+                path.append((node, 0))
+                stack += (None, node), (arg, depth + 1, 1), (func, depth + 1, 0)
+            case Abs(body):
+                path.append((node, 0))
+                stack += (None, node), (body, depth + 1, 0)
+            case _:
+                normal[id(node)] = node
+    return None
+
+
+def _replace_child(node: Term, index: int, child: Term) -> Term:
+    match node, index:
+        case Apply(_, arg), 0:
+            return make_node(Apply, child, arg)
+        case Apply(func, _), 1:
+            return make_node(Apply, func, child)
+        case Abs(), 0:
+            return make_node(Abs, child)
+        case _:
+            raise ValueError(f"No child {index} in {node}")
+
+
+def step(t: Term, normal: dict[int, Term] | None = None) -> Term | None:
+    """Performs one normal-order reduction step, or returns None if t is in normal form."""
+    path = find_redex(t, normal)
+    if path is None:
+        return None
+    redex, _ = path.pop()
+    result = contract(redex)
+    for node, index in reversed(path):
+        result = _replace_child(node, index, result)
+    return result
+
+
+def normalize(t: Term, fuel: int = 100_000) -> Term:
+    """Reduces t to normal form in at most `fuel` steps, or raises OutOfFuelError.
+    The steps are those of reduction.normalize() on the named term, which also detects
+    cycles (raising DivergenceError) in the same way."""
+    normal: dict[int, Term] = {}
+    cycles = _CycleDetector()
+    cycles.seen(t)
+    steps = 0
+    while (reduced := step(t, normal)) is not None:
+        if steps == fuel:
+            raise OutOfFuelError(f"No normal form after {fuel} steps")
+        steps += 1
+        t = reduced
+        if cycles.seen(t):
+            raise DivergenceError(f"The term after {steps} steps occurred before")
+        if len(normal) > _MEMO_LIMIT:
+            normal.clear()
+    return t
@@ -0,0 +1,318 @@
+"""
+A strong Krivine machine: normal-order reduction of lambda_pure terms with environments
+and closures instead of substitution.
+
+The machine evaluates a closure (term, environment) to weak head normal form, taking
+arguments from a stack, and reads the result back: under a lambda, the bound variable is
+bound to a fresh variable (a neutral term), and the arguments of a neutral head are read
+back from left to right. This contracts the same redexes as the substitution engine in
+reduction.py, in the same order, so a step (beta or let) costs constant time.
+
+With strategy="need", closures are thunks: the first time one is evaluated, it is updated
+with its weak head normal form (Sestoft's lazy machine), so an argument used several times
+is reduced once. The normal form is the same, in fewer steps.
+
+Fresh variables are named "x#1", "x#2", ..., which cannot clash with program names; once
+the normal form is built, they are given back their original names, renamed only where a
+name would capture a different variable. The substitution engine renames binders as it
+goes instead, so the two normal forms are alpha-equivalent but may name bound variables
+differently.
+"""
+
+import itertools
+from typing import Sequence
+
+from syntax.lambda_pure import App, Id, Int, Lambda, LambdaExpr, Let
+from syntax.utils import make_node
+
+from primitives import PRIMITIVES
+from reduction import DivergenceError, OutOfFuelError, fresh_name, free_vars
+
+# Environments are linked lists (name, closure, parent) | None. Closures are mutable
+# [term, env, spine] cells: spine is None until the closure is known to be in weak head
+# normal form; then it holds the arguments of a neutral head (first argument last), if any.
+# A fresh variable is bound to [Id("x#n"), None, ()].
+type Env = tuple[str, Closure, Env] | None
+type Closure = list
+
+
+def _lookup(env: Env, name: str) -> Closure | None:
+    while env is not None:
+        bound, closure, env = env
+        if bound == name:
+            return closure
+    return None
+
+
+def _closure(term: LambdaExpr, env: Env) -> Closure:
+    """The closure of term in env. A variable's own closure is reused, so that chains of
+    variables bound to variables do not build up (and thunks are shared)."""
+    if type(term) is Id:
+        return _lookup(env, term.name) or [term, None, ()]
+    return [term, env, () if type(term) is Lambda else None]
+
+
+def _same_state(
+    env_a: Env, args_a: Sequence[Closure], env_b: Env, args_b: Sequence[Closure]
+) -> bool:
+    """Whether two environments and argument stacks are the same up to copies of closures:
+    they hold closures of the same (interned) terms, in environments that are the same in
+    this sense, and with the same spines."""
+    if len(args_a) != len(args_b):
+        return False
+    envs = [(env_a, env_b)]
+    closures = list(zip(args_a, args_b))
+    compared = set()
+    while envs or closures:
+        if not closures:
+            a, b = envs.pop()
+            while a is not b:
+                if a is None or b is None:
+                    return False
+                (x, closure_a, a), (y, closure_b, b) = a, b
+                if x != y:
+                    return False
+                closures.append((closure_a, closure_b))
+            continue
+        a, b = closures.pop()
+        if a is b or (id(a), id(b)) in compared:
+            continue
+        compared.add((id(a), id(b)))
+        (term_a, env_a, spine_a), (term_b, env_b, spine_b) = a, b
+        if term_a is not term_b or (spine_a is None) != (spine_b is None):
+            return False
+        if spine_a is not None:
+            if len(spine_a) != len(spine_b):
+                return False
+            closures += zip(spine_a, spine_b)
+        envs.append((env_a, env_b))
+    return True
+
+
+class KrivineMachine:
+    """Normalizes terms in at most `fuel` beta/let steps. `steps` counts the steps taken,
+    and `forcings` the thunks evaluated (and updated) with strategy="need".
+    Raises DivergenceError when evaluation to weak head normal form comes back to a state
+    (term, environment, arguments) that it has been in, up to copies of closures.
+    strategy is "name" (call-by-name: arguments are reduced wherever they are used) or
+    "need" (call-by-need: each argument is reduced to weak head normal form at most once).
+    With primitives=True, the free variables in primitives.PRIMITIVES are operators on Int
+    literals, whose delta rules count as steps.
+    """
+
+    def __init__(
+        self, fuel: int = 100_000, strategy: str = "name", primitives: bool = False
+    ):
+        if strategy not in ("name", "need"):
+            raise ValueError(f"Unknown evaluation strategy: {strategy!r}")
+        self.fuel = fuel
+        self.lazy = strategy == "need"
+        self.primitives = primitives
+        self.steps = 0
+        self.forcings = 0
+        self._fresh = itertools.count(1)
+        self._reset_cycle_detection()
+
+    def _reset_cycle_detection(self) -> None:
+        # Brent's algorithm, as in reduction._CycleDetector: the state saved at the last
+        # power of two steps
+        self._saved = (None, None, ())
+        self._power = self._length = 1
+
+    def _tick(self, term: LambdaExpr, env: Env, args: list[Closure]) -> None:
+        """Counts a step, which leads to the state (term, env, args)."""
+        if self.steps == self.fuel:
+            raise OutOfFuelError(
+                f"No normal form after {self.fuel} steps ({self.forcings} thunks forced)"
+            )
+        self.steps += 1
+        saved_term, saved_env, saved_args = self._saved
+        if term is saved_term and _same_state(env, args, saved_env, saved_args):
+            raise DivergenceError(f"The state after {self.steps} steps occurred before")
+        if self._length == self._power:
+            self._saved = term, env, tuple(args)
+            self._power *= 2
+            self._length = 0
+        self._length += 1
+
+    def _enter(
+        self, closure: Closure, args: list[Closure], updates: list[tuple[Closure, int]]
+    ) -> tuple[LambdaExpr, Env]:
+        """Starts evaluating a closure: the arguments of its spine, if any, are pushed on
+        args, and in call-by-need, an unevaluated closure is marked for update."""
+        term, env, spine = closure
+        if spine:
+            args += spine
+        elif spine is None and self.lazy:
+            self.forcings += 1
+            updates.append((closure, len(args)))
+        return term, env
+
+    def whnf(
+        self, term: LambdaExpr, env: Env, thunk: Closure | None = None
+    ) -> tuple[LambdaExpr, Env, list[Closure]]:
+        """Evaluates term in env (or the closure `thunk` of term in env, if given, which is
+        then updated in call-by-need) to weak head normal form:
+        (lambda, env, []) or (head, None, arguments), where head is a free variable or an
+        Int and the first argument is last."""
+        self._reset_cycle_detection()
+        args: list[Closure] = []
+        # Thunks being evaluated, with the number of arguments below their own
+        updates: list[tuple[Closure, int]] = []
+        # Primitives whose arguments are being evaluated: (name, arguments (first first),
+        # values of the evaluated ones, args and updates to go back to)
+        frames: list[tuple] = []
+        if thunk is not None:
+            term, env = self._enter(thunk, args, updates)
+        while True:
+            match term:
+                case App(func, arg):
+                    args.append(_closure(arg, env))
+                    term = func
+                    continue
+                case Lambda(var, body):
+                    while updates and updates[-1][1] == len(args):
+                        thunk, _ = updates.pop()
+                        thunk[:] = term, env, ()
+                    if args:
+                        env = (var.name, args.pop(), env)
+                        term = body
+                        self._tick(term, env, args)
+                        continue
+                case Let(decl, defn, body):
+                    env = (decl.name, _closure(defn, env), env)
+                    term = body
+                    self._tick(term, env, args)
+                    continue
+                case Id(name):
+                    closure = _lookup(env, name)
+                    if closure is not None:
+                        term, env, spine = closure
+                        if spine:
+                            args += spine
+                        elif spine is None and self.lazy:
+                            self.forcings += 1
+                            updates.append((closure, len(args)))
+                        continue
+                    arity = PRIMITIVES[name][0] if name in PRIMITIVES else None
+                    if self.primitives and arity is not None and len(args) >= arity:
+                        operands = args[len(args) - arity :][::-1]
+                        del args[len(args) - arity :]
+                        frames.append((name, operands, [], args, updates))
+                        # The continuation is part of the state
+                        self._reset_cycle_detection()
+                        args, updates = [], []
+                        term, env = self._enter(operands[0], args, updates)
+                        continue
+                case Int():
+                    pass
+                case _:
+                    raise ValueError(f"Unknown expression: {term!r}")
+            while True:
+                # Weak head normal form. If it is neutral, each thunk is the head applied
+                # to the arguments above its own
+                if type(term) is not Lambda:
+                    for thunk, depth in updates:
+                        thunk[:] = term, None, tuple(args[depth:])
+                    env = None
+                if not frames:
+                    return term, env, args
+                name, operands, values, outer_args, outer_updates = frames[-1]
+                if type(term) is Int and not args:
+                    values.append(term.n)
+                    if len(values) < len(operands):
+                        args, updates = [], []
+                        term, env = self._enter(operands[len(values)], args, updates)
+                        break
+                    frames.pop()
+                    self._reset_cycle_detection()
+                    args, updates = outer_args, outer_updates
+                    term, env = PRIMITIVES[name][1](*values), None
+                    self._tick(term, env, args)
+                    break
+                # An argument is not an Int: the primitive is applied like a free variable
+                frames.pop()
+                self._reset_cycle_detection()
+                args, updates = outer_args, outer_updates
+                args += reversed(operands)
+                term = make_node(Id, name)
+
+    def normalize(self, e: LambdaExpr) -> LambdaExpr:
+        # Items are (term, env, thunk) to read back (see whnf()), or (None, build, ...) to
+        # build a node from the results of its children, which are then on top of `done`
+        stack: list[tuple] = [(e, None, None)]
+        done: list[LambdaExpr] = []
+        while stack:
+            term, *args = stack.pop()
+            if term is None:
+                build, *args = args
+                done.append(build(done, *args))
+                continue
+            term, env, spine = self.whnf(term, *args)
+            if type(term) is Lambda:
+                var = make_node(Id, f"{term.var.name}#{next(self._fresh)}")
+                stack += (
+                    (None, _build_lambda, var),
+                    (term.body, (term.var.name, [var, None, ()], env), None),
+                )
+            else:
+                stack.append((None, _build_spine, term, len(spine)))
+                stack += ((arg[0], arg[1], arg) for arg in spine)
+        return _restore_names(done.pop())
+
+
+def _build_lambda(done: list[LambdaExpr], var: Id) -> LambdaExpr:
+    return make_node(Lambda, var, done.pop())
+
+
+def _build_spine(done: list[LambdaExpr], head: LambdaExpr, n: int) -> LambdaExpr:
+    args = done[len(done) - n :]
+    del done[len(done) - n :]
+    for arg in args:
+        head = make_node(App, head, arg)
+    return head
+
+
+def _restore_names(e: LambdaExpr) -> LambdaExpr:
+    """Renames the fresh variables "x#n" of a normal form back to x, or to x1, x2, ... if x
+    would capture another variable free in the binder's body."""
+    names: dict[str, str] = {}  # fresh variable -> its new name, for binders in scope
+    renamed: dict[int, tuple[LambdaExpr, LambdaExpr]] = {}
+    # Items are (node, False) on the way down, (node, True) on the way up
+    stack = [(e, False)]
+    done: list[LambdaExpr] = []
+    while stack:
+        node, up = stack.pop()
+        if id(node) in renamed:
+            done.append(renamed[id(node)][1])
+            continue
+        match node, up:
+            case Id(name), _:
+                result = make_node(Id, names.get(name, name))
+            case Int(), _:
+                result = node
+            case App(func, arg), False:
+                stack += (node, True), (arg, False), (func, False)
+                continue
+            case App(), True:
+                arg = done.pop()
+                result = make_node(App, done.pop(), arg)
+            case Lambda(var, body), False:
+                original = var.name.partition("#")[0]
+                taken = {names.get(v, v) for v in free_vars(body) if v != var.name}
+                names[var.name] = (
+                    original if original not in taken else fresh_name(original, taken)
+                )
+                stack += (node, True), (body, False)
+                continue
+            case Lambda(var), True:
+                result = make_node(
+                    Lambda, make_node(Id, names.pop(var.name)), done.pop()
+                )
+            case _:
+                raise ValueError(f"Unexpected node in a normal form: {node!r}")
+        # A subterm always gets the same names, since its free fresh variables are bound
+        # by the same binders wherever it occurs
+        renamed[id(node)] = (node, result)
+        done.append(result)
+    return done.pop()
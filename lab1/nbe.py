@@ -0,0 +1,250 @@
+"""
+Normalization by evaluation of lambda_pure terms.
+
+A term is compiled once into nested Python closures, with each variable resolved to a slot
+of its closure's environment (a tuple holding the free variables that the lambda captures,
+then its parameter). Evaluation runs them, passing arguments as memoized thunks
+(call-by-need), so a term evaluates to a function or to a neutral value: a free variable
+or an Int applied to thunks. With primitives=True, a primitive operator (see
+primitives.py) evaluates to a partial application until it has all its arguments.
+Quoting reads a value back into a normal form, by applying functions to fresh variables,
+which are named as by the Krivine machine (see machine.py): the normal form is that of
+reduction.normalize up to the names of bound variables.
+
+Evaluation uses the Python stack, so normalize() raises the recursion limit while it runs;
+if evaluation goes deeper still, it falls back to the Krivine machine, as it does when
+the fuel runs out.
+"""
+
+import itertools
+import operator
+from typing import Callable
+
+from syntax.lambda_pure import App, Id, Int, Lambda, LambdaExpr, Let
+from syntax.utils import deep_recursion, make_node
+
+from machine import KrivineMachine, _build_lambda, _build_spine, _restore_names
+from primitives import PRIMITIVES
+from reduction import free_vars
+
+# Evaluation nests Python calls (about two per enclosing application or forced thunk)
+_RECURSION_LIMIT = 100_000
+
+
+class _Exhausted(Exception):
+    pass
+
+
+class Thunk:
+    __slots__ = ("code", "env", "value")
+
+    def __init__(self, code: Callable | None, env: tuple, value=None):
+        self.code = code
+        self.env = env
+        self.value = value
+
+    def force(self):
+        if self.code is not None:
+            self.value = self.code(self.env)
+            self.code = self.env = None
+        return self.value
+
+
+class Function:
+    """The value of a lambda: its body's code, with the environment it captured (to be
+    extended with the argument). param is the name of the variable, for quoting."""
+
+    __slots__ = ("param", "body", "env")
+
+    def __init__(self, param: str, body: "Code", env: tuple):
+        self.param = param
+        self.body = body
+        self.env = env
+
+
+class Neutral:
+    """A head (a free variable or an Int) applied to zero or more arguments:
+    func is None or the Neutral it is applied to."""
+
+    __slots__ = ("head", "func", "arg")
+
+    def __init__(self, head: LambdaExpr, func: "Neutral | None" = None, arg=None):
+        self.head = head
+        self.func = func
+        self.arg = arg
+
+
+class Primitive:
+    """A primitive operator applied to fewer arguments than its arity (first first)."""
+
+    __slots__ = ("name", "args")
+
+    def __init__(self, name: str, args: tuple[Thunk, ...] = ()):
+        self.name = name
+        self.args = args
+
+
+type Code = Callable[[tuple], Function | Neutral]
+
+
+class Evaluator:
+    """Compiles, evaluates and quotes terms. At most `fuel` beta/let (and delta, with
+    primitives=True) steps are performed (counted in `steps`); then _Exhausted is raised.
+    """
+
+    def __init__(self, fuel: int, primitives: bool = False):
+        self.fuel = fuel
+        self.primitives = primitives
+        self.steps = 0
+        self._fresh = itertools.count(1)
+
+    def _tick(self) -> None:
+        if self.steps == self.fuel:
+            raise _Exhausted
+        self.steps += 1
+
+    def compile(self, e: LambdaExpr, scope: list[str]) -> Code:
+        """Code evaluating e in an environment whose slots hold the variables in scope."""
+        match e:
+            case Id(name) if name in scope:
+                i = _slot(scope, name)
+
+                def var(env):
+                    thunk = env[i]
+                    return thunk.value if thunk.code is None else thunk.force()
+
+                return var
+            case Id(name) if self.primitives and name in PRIMITIVES:
+                primitive = Primitive(name)
+                return lambda env: primitive
+            case Id() | Int():
+                value = Neutral(e)
+                return lambda env: value
+            case Lambda(var, body):
+                captured = [v for v in sorted(free_vars(e)) if v in scope]
+                body_code = self.compile(body, captured + [var.name])
+                param = var.name
+                if not captured:
+                    function = Function(param, body_code, ())
+                    return lambda env: function
+                slots = [_slot(scope, v) for v in captured]
+                if len(slots) == 1:
+                    (i,) = slots
+                    return lambda env: Function(param, body_code, (env[i],))
+                capture = operator.itemgetter(*slots)
+                return lambda env: Function(param, body_code, capture(env))
+            case App(func, arg):
+                func_code = self.compile(func, scope)
+                arg_thunk = self._thunk_code(arg, scope)
+                tick = self._tick
+                apply_primitive = self._apply_primitive
+
+                def app(env):
+                    func = func_code(env)
+                    if type(func) is Neutral:
+                        return Neutral(func.head, func, arg_thunk(env))
+                    if type(func) is Primitive:
+                        return apply_primitive(func, arg_thunk(env))
+                    tick()
+                    return func.body(func.env + (arg_thunk(env),))
+
+                return app
+            case Let(decl, defn, body):
+                defn_thunk = self._thunk_code(defn, scope)
+                body_code = self.compile(body, scope + [decl.name])
+                tick = self._tick
+
+                def let(env):
+                    tick()
+                    return body_code(env + (defn_thunk(env),))
+
+                return let
+            case _:
+                raise ValueError(f"Unknown expression: {e!r}")
+
+    def _apply_primitive(self, func: Primitive, arg: Thunk) -> Function | Neutral:
+        """func applied to arg: the result of its delta rule, once it has all its
+        arguments and they evaluate to Ints (in order), or else a neutral value."""
+        args = func.args + (arg,)
+        arity, delta = PRIMITIVES[func.name]
+        if len(args) < arity:
+            return Primitive(func.name, args)
+        values = []
+        for thunk in args:
+            value = thunk.force()
+            if (
+                type(value) is not Neutral
+                or value.func is not None
+                or type(value.head) is not Int
+            ):
+                break
+            values.append(value.head.n)
+        else:
+            self._tick()
+            result = delta(*values)
+            return (
+                Neutral(result) if type(result) is Int else self.compile(result, [])(())
+            )
+        value = Neutral(make_node(Id, func.name))
+        for thunk in args:
+            value = Neutral(value.head, value, thunk)
+        return value
+
+    def _thunk_code(self, e: LambdaExpr, scope: list[str]) -> Callable[[tuple], Thunk]:
+        """Code making a thunk for e; a variable's own thunk is shared."""
+        if type(e) is Id and e.name in scope:
+            i = _slot(scope, e.name)
+            return lambda env: env[i]
+        code = self.compile(e, scope)
+        return lambda env: Thunk(code, env)
+
+    def quote(self, value: Function | Neutral) -> LambdaExpr:
+        """The normal form of a value, with fresh variables "x#n" (see machine.py)."""
+        # Items are (value,) to quote, or (None, build, ...) as in KrivineMachine.normalize
+        stack: list[tuple] = [(value,)]
+        done: list[LambdaExpr] = []
+        while stack:
+            value, *args = stack.pop()
+            if value is None:
+                build, *args = args
+                done.append(build(done, *args))
+            elif type(value) is Primitive:
+                head = make_node(Id, value.name)
+                stack.append((None, _build_spine, head, len(value.args)))
+                stack += ((arg.force(),) for arg in reversed(value.args))
+            elif type(value) is Function:
+                var = make_node(Id, f"{value.param}#{next(self._fresh)}")
+                body = value.body(value.env + (Thunk(None, (), Neutral(var)),))
+                stack += (None, _build_lambda, var), (body,)
+            else:
+                spine = []
+                while value.func is not None:
+                    spine.append(value.arg)
+                    value = value.func
+                # The first argument is last, as in KrivineMachine.whnf()
+                stack.append((None, _build_spine, value.head, len(spine)))
+                stack += ((arg.force(),) for arg in spine)
+        return done.pop()
+
+
+def _slot(scope: list[str], name: str) -> int:
+    """The slot of the innermost variable called name."""
+    return len(scope) - 1 - scope[::-1].index(name)
+
+
+def normalize(
+    e: LambdaExpr, fuel: int = 100_000, strategy: str = "name", primitives: bool = False
+) -> LambdaExpr:
+    """The normal form of e, by evaluation; if that takes more than `fuel` steps or more
+    than _RECURSION_LIMIT nested calls, by the Krivine machine (with the given strategy),
+    which reduces in at most `fuel` steps or raises OutOfFuelError. With primitives=True,
+    both apply the delta rules in primitives.py.
+    NbE evaluates by need, so it may find the normal form of a term that the machine does
+    not normalize within `fuel` steps by name."""
+    machine = KrivineMachine(fuel, strategy, primitives)
+    evaluator = Evaluator(fuel, primitives)
+    try:
+        with deep_recursion(_RECURSION_LIMIT):
+            return _restore_names(evaluator.quote(evaluator.compile(e, [])(())))
+    except (_Exhausted, RecursionError):
+        return machine.normalize(e)
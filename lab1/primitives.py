@@ -0,0 +1,108 @@
+"""
+Primitive operators on Int literals, for interpret(..., primitives=True), and conversions
+between Church numerals and Int literals.
+
+A primitive is a free variable (add, sub, mul, eq or ifz) applied to as many arguments as
+its arity. The arguments are evaluated, and if they are all Int literals, the application
+is replaced by its result in a single step (a delta rule). eq and ifz return Church
+booleans, so `ifz n a b` reduces to a if n is 0, else to b. Otherwise, the application is
+left as it is, like any application of a free variable.
+"""
+
+from typing import Callable
+
+from syntax.lambda_pure import App, Id, Int, Lambda, LambdaExpr, Let
+from syntax.utils import make_node
+
+from reduction import _subterms
+
+
+def _church_boolean(value: bool) -> LambdaExpr:
+    t, f = make_node(Id, "t"), make_node(Id, "f")
+    return make_node(Lambda, t, make_node(Lambda, f, t if value else f))
+
+
+TRUE = _church_boolean(True)
+FALSE = _church_boolean(False)
+
+# name -> (arity, the result of the delta rule on the values of the arguments)
+PRIMITIVES: dict[str, tuple[int, Callable[..., LambdaExpr]]] = {
+    "add": (2, lambda m, n: make_node(Int, m + n)),
+    "sub": (2, lambda m, n: make_node(Int, m - n)),
+    "mul": (2, lambda m, n: make_node(Int, m * n)),
+    "eq": (2, lambda m, n: TRUE if m == n else FALSE),
+    "ifz": (1, lambda n: TRUE if n == 0 else FALSE),
+}
+
+
+def to_church(n: int) -> LambdaExpr:
+    """The Church numeral \\f. \\x. f (... (f x)) for n >= 0."""
+    if n < 0:
+        raise ValueError(f"No Church numeral for {n}")
+    f, x = make_node(Id, "f"), make_node(Id, "x")
+    body = x
+    for _ in range(n):
+        body = make_node(App, f, body)
+    return make_node(Lambda, f, make_node(Lambda, x, body))
+
+
+def from_church(e: LambdaExpr) -> int | None:
+    """n if e is the Church numeral for n (with any names for its variables), else None."""
+    match e:
+        case Lambda(f, Lambda(x, body)) if f != x:
+            n = 0
+            while type(body) is App and body.func == f:
+                body = body.arg
+                n += 1
+            return n if body == x else None
+        case _:
+            return None
+
+
+def church_to_int(e: LambdaExpr) -> LambdaExpr:
+    """e with its Church numerals replaced by Int literals (e.g., to read a result)."""
+    return _map_numerals(e, from_church, lambda n: make_node(Int, n))
+
+
+def int_to_church(e: LambdaExpr) -> LambdaExpr:
+    """e with its (non-negative) Int literals replaced by Church numerals."""
+    return _map_numerals(
+        e, lambda node: node.n if type(node) is Int and node.n >= 0 else None, to_church
+    )
+
+
+def _map_numerals(
+    e: LambdaExpr,
+    recognize: Callable[[LambdaExpr], int | None],
+    build: Callable[[int], LambdaExpr],
+) -> LambdaExpr:
+    """e with the subterms for which recognize() returns a number n replaced by build(n).
+    Subterms are searched from the root, and shared subterms are converted once."""
+    memo: dict[int, tuple[LambdaExpr, LambdaExpr]] = {}
+    stack = [e]
+    while stack:
+        node = stack[-1]
+        if id(node) in memo:
+            stack.pop()
+            continue
+        if (n := recognize(node)) is not None:
+            memo[id(node)] = (node, build(n))
+            stack.pop()
+            continue
+        children = _subterms(node)
+        pending = [child for child in children if id(child) not in memo]
+        if pending:
+            stack += pending
+            continue
+        stack.pop()
+        match node:
+            case Lambda(var, body):
+                result = make_node(Lambda, var, memo[id(body)][1])
+            case App(func, arg):
+                result = make_node(App, memo[id(func)][1], memo[id(arg)][1])
+            case Let(decl, defn, body):
+                result = make_node(Let, decl, memo[id(defn)][1], memo[id(body)][1])
+            case _:
+                result = node
+        memo[id(node)] = (node, result)
+    return memo[id(e)][1]
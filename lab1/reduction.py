@@ -0,0 +1,297 @@
+"""
+Normal-order reduction of lambda_pure terms by capture-avoiding substitution.
+
+Each step contracts the leftmost-outermost redex, i.e. (\\x. b) a or let x = a in b,
+by substituting a for x in b, and rebuilds the path from the root to the redex.
+All traversals use explicit stacks, so deep terms do not hit the recursion limit.
+"""
+
+import time
+from typing import Iterator, NamedTuple
+
+from syntax.lambda_pure import App, Id, Int, Lambda, LambdaExpr, Let, free_vars
+from syntax.utils import make_node
+
+
+class OutOfFuelError(RuntimeError):
+    """The term did not reach a normal form within the allowed number of steps."""
+
+
+class DivergenceError(OutOfFuelError):
+    """The reduction came back to a state it had already been in, so it never ends."""
+
+
+# Memos keyed by id(node), holding (node, value) so that the node (and its id) stays alive.
+# They are cleared when they grow beyond this many entries.
+_MEMO_LIMIT = 1 << 20
+
+
+def _subterms(e: LambdaExpr) -> tuple[LambdaExpr, ...]:
+    match e:
+        case Lambda(_, body):
+            return (body,)
+        case App(func, arg):
+            return func, arg
+        case Let(_, defn, body):
+            return defn, body
+        case _:
+            return ()
+
+
+def fresh_name(name: str, taken: set[str] | frozenset[str]) -> str:
+    """name1, name2, ...: the first one that is not taken."""
+    i = 1
+    while f"{name}{i}" in taken:
+        i += 1
+    return f"{name}{i}"
+
+
+def substitute(e: LambdaExpr, substitution: dict[str, LambdaExpr]) -> LambdaExpr:
+    """e with the free occurrences of the names in `substitution` replaced, simultaneously.
+    Binders that would capture a free variable of a replacement are renamed.
+    Subterms in which no replaced name is free are returned as they are (free variables
+    are cached on the nodes, see free_vars())."""
+    # Items are (node, substitution) to substitute in, or (None, build, ...) to build a node
+    # from the results of its children, which are then on top of `done`
+    stack: list[tuple] = [(e, substitution)]
+    done: list[LambdaExpr] = []
+    while stack:
+        node, *args = stack.pop()
+        if node is None:
+            build, *args = args
+            done.append(build(done, *args))
+            continue
+        (substitution,) = args
+        free = free_vars(node)
+        substitution = {x: s for x, s in substitution.items() if x in free}
+        if not substitution:
+            done.append(node)
+            continue
+        match node:
+            case Id(name):
+                done.append(substitution[name])
+            case App(func, arg):
+                stack += (
+                    (None, _build_app),
+                    (arg, substitution),
+                    (func, substitution),
+                )
+            case Lambda(var, body):
+                var, inner = _under_binder(var, body, substitution)
+                stack += (None, _build_lambda, var), (body, inner)
+            case Let(decl, defn, body):
+                # The let binds decl in its body only, so decl itself may be free in defn
+                outer = {x: s for x, s in substitution.items() if x != decl.name}
+                var, inner = _under_binder(decl, body, outer)
+                stack += (
+                    (None, _build_let, var),
+                    (body, inner),
+                    (defn, substitution),
+                )
+    return done.pop()
+
+
+def _under_binder(
+    var: Id, body: LambdaExpr, substitution: dict[str, LambdaExpr]
+) -> tuple[Id, dict[str, LambdaExpr]]:
+    """The binder to use for var, and the substitution to apply to its body.
+    `substitution` must not have var itself, which the binder shadows.
+    """
+    replacing = frozenset().union(*(free_vars(s) for s in substitution.values()))
+    if var.name not in replacing:
+        return var, substitution
+    renamed = make_node(Id, fresh_name(var.name, replacing | free_vars(body)))
+    return renamed, substitution | {var.name: renamed}
+
+
+def _build_app(done: list[LambdaExpr]) -> LambdaExpr:
+    arg = done.pop()
+    return make_node(App, done.pop(), arg)
+
+
+def _build_lambda(done: list[LambdaExpr], var: Id) -> LambdaExpr:
+    return make_node(Lambda, var, done.pop())
+
+
+def _build_let(done: list[LambdaExpr], var: Id) -> LambdaExpr:
+    body = done.pop()
+    return make_node(Let, var, done.pop(), body)
+
+
+def contract(redex: LambdaExpr) -> LambdaExpr:
+    """Performs one beta (or let) reduction at the root of redex."""
+    match redex:
+        case App(Lambda(var, body), arg) | Let(var, arg, body):
+            return substitute(body, {var.name: arg})
+        case _:
+            raise ValueError(f"Not a redex: {redex}")
+
+
+def find_redex(
+    e: LambdaExpr, normal: dict[int, LambdaExpr] | None = None
+) -> list[tuple[LambdaExpr, int]] | None:
+    """The path to the leftmost-outermost redex of e, as (node, child index) pairs from the
+    root down; the redex itself comes last, with index -1. None if e is in normal form.
+    Subterms found to be in normal form are added to `normal` (keyed by id) and skipped.
+    """
+    if normal is None:
+        normal = {}
+    path: list[tuple[LambdaExpr, int]] = []
+    # Items are (node, depth, index in its parent), or (None, node) once its subterms are
+    # searched, to mark it normal
+    stack: list[tuple] = [(e, 0, -1)]
+    while stack:
+        node, *args = stack.pop()
+        if node is None:
+            (done,) = args
+            normal[id(done)] = done
+            continue
+        depth, index = args
+        if id(node) in normal:
+            continue
+        del path[depth:]
+        if path:
+            path[-1] = (path[-1][0], index)
+        match node:
+            case App(Lambda(), _) | Let():
+                path.append((node, -1))
+                return path
+            case App(func, arg):
+                path.append((node, 0))
+                stack += (None, node), (arg, depth + 1, 1), (func, depth + 1, 0)
+            case Lambda(_, body):
+                path.append((node, 0))
+                stack += (None, node), (body, depth + 1, 0)
+            case _:
+                normal[id(node)] = node
+    return None
+
+
+def _replace_child(node: LambdaExpr, index: int, child: LambdaExpr) -> LambdaExpr:
+    match node, index:
+        case App(_, arg), 0:
+            return make_node(App, child, arg)
+        case App(func, _), 1:
+            return make_node(App, func, child)
+        case Lambda(var, _), 0:
+            return make_node(Lambda, var, child)
+        case _:
+            raise ValueError(f"No child {index} in {node}")
+
+
+def step(
+    e: LambdaExpr, normal: dict[int, LambdaExpr] | None = None
+) -> LambdaExpr | None:
+    """Performs one normal-order reduction step, or returns None if e is in normal form."""
+    path = find_redex(e, normal)
+    if path is None:
+        return None
+    return _contract_at(path)
+
+
+def _contract_at(path: list[tuple[LambdaExpr, int]]) -> LambdaExpr:
+    """Contracts the redex at the end of a path from find_redex(), and rebuilds the path."""
+    redex, _ = path[-1]
+    result = contract(redex)
+    for node, index in reversed(path[:-1]):
+        result = _replace_child(node, index, result)
+    return result
+
+
+def size(e: LambdaExpr, memo: dict[int, tuple[LambdaExpr, int]] | None = None) -> int:
+    """The number of nodes in e, not counting binders, and counting a shared subterm at
+    each of its occurrences (as printed). Pass the same memo to calls on related terms.
+    """
+    if memo is None:
+        memo = {}
+    stack = [e]
+    while stack:
+        node = stack[-1]
+        if id(node) in memo:
+            stack.pop()
+            continue
+        children = _subterms(node)
+        pending = [child for child in children if id(child) not in memo]
+        if pending:
+            stack += pending
+            continue
+        stack.pop()
+        memo[id(node)] = (node, 1 + sum(memo[id(child)][1] for child in children))
+    return memo[id(e)][1]
+
+
+class TraceStep(NamedTuple):
+    number: int  # from 1
+    term: LambdaExpr  # after the step
+    redex: LambdaExpr  # the contracted redex
+    position: tuple[
+        int, ...
+    ]  # of the redex: child indices from the root, as in find_redex()
+    seconds: float  # spent finding and contracting the redex, and rebuilding the term
+    size: int  # of term, see size()
+
+
+def trace(e: LambdaExpr) -> Iterator[TraceStep]:
+    """Reduces e in normal order, yielding each step as it is performed, until a normal
+    form is reached. Only the current term is kept (with memos of bounded size), so a
+    trace can be sampled, filtered or written out as it goes; it does not end if e has no
+    normal form, so bound it with, e.g., itertools.islice()."""
+    normal: dict[int, LambdaExpr] = {}
+    sizes: dict[int, tuple[LambdaExpr, int]] = {}
+    number = 0
+    while True:
+        start = time.perf_counter()
+        path = find_redex(e, normal)
+        if path is None:
+            return
+        e = _contract_at(path)
+        seconds = time.perf_counter() - start
+        number += 1
+        redex, _ = path.pop()
+        position = tuple(index for _, index in path)
+        yield TraceStep(number, e, redex, position, seconds, size(e, sizes))
+        if len(normal) + len(sizes) > _MEMO_LIMIT:
+            normal.clear()
+            sizes.clear()
+
+
+class _CycleDetector:
+    """Brent's cycle detection on a sequence of interned terms, which are equal only if
+    they are the same object. It keeps one term (the one at the last power of two), so
+    it uses constant memory, and finds a cycle of length l starting after m terms
+    within 2 max(m, l) + l terms."""
+
+    def __init__(self):
+        self._saved = None
+        self._power = self._length = 1
+
+    def seen(self, e) -> bool:
+        """Whether e is the saved term; each term of the sequence is passed in order."""
+        if e is self._saved:
+            return True
+        if self._length == self._power:
+            self._saved = e
+            self._power *= 2
+            self._length = 0
+        self._length += 1
+        return False
+
+
+def normalize(e: LambdaExpr, fuel: int = 100_000) -> LambdaExpr:
+    """Reduces e to normal form in at most `fuel` steps, or raises OutOfFuelError.
+    Raises DivergenceError if a term comes back, which is noticed within a few more steps
+    than the length of the cycle (see _CycleDetector)."""
+    normal: dict[int, LambdaExpr] = {}
+    cycles = _CycleDetector()
+    cycles.seen(e)
+    steps = 0
+    while (reduced := step(e, normal)) is not None:
+        if steps == fuel:
+            raise OutOfFuelError(f"No normal form after {fuel} steps")
+        steps += 1
+        e = reduced
+        if cycles.seen(e):
+            raise DivergenceError(f"The term after {steps} steps occurred before")
+        if len(normal) > _MEMO_LIMIT:
+            normal.clear()
+    return e
@@ -1,11 +1,39 @@
 from syntax.lambda_pure import LambdaExpr
 
+from debruijn import to_debruijn
+from machine import KrivineMachine
+import nbe
+from reduction import DivergenceError, OutOfFuelError, TraceStep, trace
+
 
 def alpha_equivalent(e1: LambdaExpr, e2: LambdaExpr) -> bool:
     """Check if two lambda expressions differ only in the names of their bound variables."""
-    raise NotImplementedError
+    # Locally nameless forms are interned, and do not name bound variables (see debruijn.py)
+    return to_debruijn(e1) is to_debruijn(e2)
 
 
-def interpret(e: LambdaExpr, fuel: int = 100_000) -> LambdaExpr:
-    """Keep performing normal-order reduction steps until you reach normal form, detect divergence or run out of fuel."""
-    raise NotImplementedError
+def interpret(
+    e: LambdaExpr,
+    fuel: int = 100_000,
+    strategy: str = "name",
+    backend: str = "machine",
+    primitives: bool = False,
+) -> LambdaExpr:
+    """Keep performing normal-order reduction steps until you reach normal form, detect divergence or run out of fuel.
+    Runs on a Krivine machine (see machine.py), which performs the same steps as substitution
+    (reduction.normalize) without copying terms; the normal form is the same up to the
+    names of bound variables (see alpha_equivalent()). Raises OutOfFuelError after `fuel` steps,
+    or DivergenceError as soon as the machine finds itself in a state it has been in.
+    trace() yields the steps of normal-order reduction one at a time, with their redexes.
+    With strategy="need", arguments are reduced at most once (call-by-need), which gives
+    the same normal form in fewer steps.
+    With backend="nbe", the term is evaluated into Python closures and read back (see
+    nbe.py), falling back to the machine if that takes more than `fuel` steps.
+    With primitives=True, add, sub, mul, eq and ifz applied to Int literals reduce in one
+    step each (see primitives.py, which also converts Church numerals to Ints and back).
+    """
+    if backend == "machine":
+        return KrivineMachine(fuel, strategy, primitives).normalize(e)
+    if backend == "nbe":
+        return nbe.normalize(e, fuel, strategy, primitives)
+    raise ValueError(f"Unknown backend: {backend!r}")
@@ -0,0 +1,84 @@
+import pytest
+
+from syntax.lambda_pure import parse
+
+from debruijn import (
+    Abs,
+    Apply,
+    Bound,
+    from_debruijn,
+    instantiate,
+    normalize,
+    to_debruijn,
+)
+import reduction
+from reduction import OutOfFuelError
+from test_machine import PROGRAMS, and_chain, church
+
+
+@pytest.mark.parametrize("program", PROGRAMS + [and_chain(3)])
+def test_round_trip(program: str) -> None:
+    expr = parse(program)
+    term = to_debruijn(expr)
+    assert to_debruijn(from_debruijn(term)) is term
+
+
+def test_conversion() -> None:
+    assert to_debruijn(parse(r"\x. \y. x y z")) == Abs(
+        Abs(Apply(Apply(Bound(1), Bound(0)), parse("z")))
+    )
+    assert str(from_debruijn(to_debruijn(parse(r"\y. \z. y z")))) == r"\x. \x1. (x x1)"
+    # Binders are renamed only to avoid capture
+    assert str(from_debruijn(to_debruijn(parse(r"\y. x y")))) == r"\x1. (x x1)"
+    assert (
+        str(from_debruijn(to_debruijn(parse(r"\y. (\z. z) y")))) == r"\x. ((\x. x) x)"
+    )
+    assert str(from_debruijn(to_debruijn(parse(r"let y = a in \z. y z")))) == (
+        r"let x = a in \x1. (x x1)"
+    )
+    with pytest.raises(ValueError):
+        from_debruijn(Abs(Bound(1)))
+
+
+def test_alpha_equivalence_is_identity() -> None:
+    assert to_debruijn(parse(r"\x. \y. x y")) is to_debruijn(parse(r"\a. \b. a b"))
+    assert to_debruijn(parse(r"\x. \y. x y")) is not to_debruijn(parse(r"\a. \a. a a"))
+    assert to_debruijn(parse(r"let x = y in \z. x z")) is to_debruijn(
+        parse(r"let w = y in \x. w x")
+    )
+    # The same (interned) subterm x y converts differently under different binders
+    assert to_debruijn(parse(r"\x. \y. x y")) is not to_debruijn(parse(r"\y. \x. x y"))
+    assert to_debruijn(parse(r"(\x. x y) (\y. x y)")) is to_debruijn(
+        parse(r"(\z. z y) (\z. x z)")
+    )
+
+
+def test_instantiate() -> None:
+    # (\x. \y. x) y: the free y is not captured, and no binder is renamed
+    body = to_debruijn(parse(r"\x. \y. x")).body
+    assert instantiate(body, parse("y")) is to_debruijn(parse(r"\z. y"))
+    # Indices of the argument are shifted under binders
+    outer = to_debruijn(parse(r"\w. (\x. \y. x) w")).body
+    assert normalize(Abs(outer)) is to_debruijn(parse(r"\w. \y. w"))
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_same_as_substitution(program: str) -> None:
+    expr = parse(program)
+    steps = 0
+    while (reduced := reduction.step(expr)) is not None:
+        expr, steps = reduced, steps + 1
+    term = to_debruijn(parse(program))
+    assert normalize(term, fuel=steps) is to_debruijn(expr)
+    if steps:
+        with pytest.raises(OutOfFuelError):
+            normalize(term, fuel=steps - 1)
+
+
+def test_deep() -> None:
+    n = 5_000
+    expr = parse(church(n), backend="fast")
+    term = to_debruijn(expr)
+    assert from_debruijn(term) is parse(r"\x. \x1. " + "x (" * n + "x1" + ")" * n)
+    applied = to_debruijn(parse(rf"(\n. n) {church(n)}", backend="fast"))
+    assert normalize(applied) is term
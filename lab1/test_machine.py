@@ -0,0 +1,162 @@
+import random
+
+import pytest
+
+from syntax.lambda_pure import parse
+
+from machine import KrivineMachine
+from reduction import DivergenceError, OutOfFuelError, _CycleDetector, normalize
+import solution
+
+
+def church(n: int) -> str:
+    return r"(\f. \x. " + "f (" * n + "x" + ")" * n + ")"
+
+
+PLUS = r"(\m. \n. \f. \x. m f (n f x))"
+MULT = r"(\m. \n. \f. m (n f))"
+EXP = r"(\m. \n. n m)"
+
+PROGRAMS = [
+    r"(\x. \y. x) y",  # capture
+    r"(\x. \y. \y1. x y y1) y",
+    r"let y = a in (\x. \y. x y) y",
+    r"(\x. x x) (\x. \y. x y)",
+    r"(\x. a) ((\x. x x) (\x. x x))",
+    r"\x. (\x. x) ((\y. y) x) 1",
+    r"(\x. let x = x y in x) a",  # a let shadowing a substituted name
+    f"{PLUS} {church(3)} {church(4)}",
+    f"{MULT} {church(6)} {church(7)}",
+    f"{EXP} {church(2)} {church(5)}",
+]
+
+
+def and_chain(n: int) -> str:
+    """b_n, where b_0 = True and b_i = b_(i-1) and b_(i-1), on Church booleans."""
+    lets = "".join(f"let b{i} = and b{i - 1} b{i - 1} in " for i in range(1, n + 1))
+    return rf"let and = \p. \q. p q p in let b0 = \t. \f. t in {lets}b{n}"
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_same_as_substitution(program: str) -> None:
+    expr = parse(program)
+    machine = KrivineMachine()
+    result = machine.normalize(expr)
+    assert result == normalize(expr)
+    assert solution.interpret(expr) is result
+    # The machine counts the same steps as the substitution engine
+    normalize(expr, fuel=machine.steps)
+    if machine.steps:
+        with pytest.raises(OutOfFuelError):
+            normalize(expr, fuel=machine.steps - 1)
+        with pytest.raises(OutOfFuelError):
+            KrivineMachine(fuel=machine.steps - 1).normalize(expr)
+
+
+def random_program(rng: random.Random, depth: int = 0) -> str:
+    match rng.randrange(4) if depth < 6 else 0:
+        case 0:
+            return rng.choice(["x", "y", "z", "a", "b"])
+        case 1:
+            return rf"\{rng.choice("xyz")}. {random_program(rng, depth + 1)}"
+        case 2:
+            defn, body = random_program(rng, depth + 1), random_program(rng, depth + 1)
+            return f"let {rng.choice("xyz")} = {defn} in {body}"
+        case _:
+            func, arg = random_program(rng, depth + 1), random_program(rng, depth + 1)
+            return f"({func}) ({arg})"
+
+
+@pytest.mark.parametrize("backend", ["machine", "nbe"])
+def test_random_programs(backend: str) -> None:
+    # Substitution renames binders as it goes, and the machine only where it has to, so
+    # bound variables may be named differently
+    rng = random.Random(0)
+    for _ in range(2000):
+        expr = parse(random_program(rng))
+        try:
+            expected = normalize(expr, fuel=1000)
+        except OutOfFuelError:
+            continue
+        result = solution.interpret(expr, fuel=1000, backend=backend)
+        assert solution.alpha_equivalent(result, expected), expr
+
+
+def test_church_arithmetic() -> None:
+    assert solution.interpret(
+        parse(f"{MULT} ({PLUS} {church(20)} {church(30)}) {church(40)}")
+    ) == parse(church(2000))
+
+
+def test_out_of_fuel() -> None:
+    with pytest.raises(OutOfFuelError):
+        solution.interpret(parse(r"(\x. x x) (\x. x x)"), fuel=1000)
+
+
+@pytest.mark.parametrize(
+    "program, steps",
+    [
+        (r"(\x. x x) (\x. x x)", 2),
+        (r"let w = \x. x x in \y. w w", 4),
+        (r"(\f. (\x. f (x x)) (\x. f (x x))) (\l. l)", 5),
+        (r"(\f. (\x. f (x x)) (\x. f (x x))) (\l. \a. l a)", 13),
+    ],
+)
+def test_divergence(program: str, steps: int) -> None:
+    expr = parse(program)
+    for strategy in ["name", "need"]:
+        machine = KrivineMachine(strategy=strategy)
+        with pytest.raises(DivergenceError):
+            machine.normalize(expr)
+        assert machine.steps <= steps
+        with pytest.raises(DivergenceError):
+            solution.interpret(expr, strategy=strategy, backend="nbe")
+    with pytest.raises(DivergenceError):
+        normalize(expr)
+
+
+def test_no_divergence_without_cycle() -> None:
+    # The term grows at each step, so it never repeats
+    with pytest.raises(OutOfFuelError) as error:
+        solution.interpret(parse(r"(\x. x x x) (\x. x x x)"), fuel=10_000)
+    assert type(error.value) is OutOfFuelError
+
+
+def test_cycle_detector() -> None:
+    for start, length in [(0, 1), (0, 7), (5, 3), (100, 100), (1000, 1)]:
+        # Terms 0, 1, ..., start + length - 1, then start, start + 1, ... again
+        terms = [object() for _ in range(start + length)]
+        cycles = _CycleDetector()
+        i = 0
+        while not cycles.seen(terms[i if i < start else start + (i - start) % length]):
+            i += 1
+        assert start + length <= i <= 2 * max(start, length) + length
+
+
+def test_alpha_equivalent() -> None:
+    assert solution.alpha_equivalent(parse(r"\x. \y. x y"), parse(r"\a. \b. a b"))
+    assert not solution.alpha_equivalent(parse(r"\x. \y. x y"), parse(r"\a. \a. a a"))
+    assert not solution.alpha_equivalent(parse(r"\x. y"), parse(r"\x. z"))
+    assert solution.alpha_equivalent(
+        parse(r"let x = y in \z. x z"), parse(r"let w = y in \x. w x")
+    )
+    assert not solution.alpha_equivalent(parse(r"\x. x"), parse(r"x"))
+
+
+@pytest.mark.parametrize("program", PROGRAMS + [and_chain(5)])
+def test_call_by_need(program: str) -> None:
+    expr = parse(program)
+    by_name, by_need = KrivineMachine(), KrivineMachine(strategy="need")
+    result = by_need.normalize(expr)
+    assert result is by_name.normalize(expr)
+    assert result is solution.interpret(expr, strategy="need")
+    assert by_need.steps <= by_name.steps
+
+
+def test_call_by_need_shares_arguments() -> None:
+    expr = parse(and_chain(30))
+    machine = KrivineMachine(strategy="need")
+    assert machine.normalize(expr) == parse(r"\t. \f. t")
+    assert machine.steps < 200 and machine.forcings < 100
+    with pytest.raises(OutOfFuelError):
+        solution.interpret(expr)
@@ -0,0 +1,55 @@
+import pytest
+
+from syntax.lambda_pure import parse
+
+from machine import KrivineMachine
+import nbe
+from reduction import OutOfFuelError
+import solution
+from test_machine import EXP, MULT, PLUS, PROGRAMS, and_chain, church
+
+
+def evaluate(expr):
+    evaluator = nbe.Evaluator(fuel=100_000)
+    return evaluator.quote(evaluator.compile(expr, [])(()))
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_same_as_machine(program: str) -> None:
+    expr = parse(program)
+    result = solution.interpret(expr, backend="nbe")
+    assert result is KrivineMachine().normalize(expr)
+    assert nbe._restore_names(evaluate(expr)) is result
+
+
+def test_church_arithmetic() -> None:
+    expr = parse(
+        f"{EXP} ({PLUS} {church(1)} {church(2)}) ({MULT} {church(2)} {church(3)})"
+    )
+    # NbE evaluates by need: the machine takes more steps by name
+    with pytest.raises(OutOfFuelError):
+        solution.interpret(expr, fuel=2_000)
+    result = solution.interpret(expr, fuel=2_000, backend="nbe")
+    assert result is solution.interpret(expr, fuel=3_000)
+    assert solution.alpha_equivalent(result, parse(church(3**6)))
+
+
+def test_out_of_fuel() -> None:
+    with pytest.raises(OutOfFuelError):
+        solution.interpret(parse(r"(\x. x x) (\x. x x)"), fuel=1000, backend="nbe")
+    with pytest.raises(ValueError):
+        solution.interpret(parse("x"), backend="tree")
+
+
+def test_evaluates_by_need() -> None:
+    # Too many steps for the machine by name, but not for NbE
+    expr = parse(and_chain(30))
+    assert solution.interpret(expr, backend="nbe") == parse(r"\t. \f. t")
+
+
+def test_falls_back_when_too_deep(monkeypatch) -> None:
+    monkeypatch.setattr(nbe, "_RECURSION_LIMIT", 0)  # keep the current limit
+    expr = parse(rf"(\x. x) {church(5_000)}")
+    with pytest.raises(RecursionError):
+        evaluate(expr)
+    assert nbe.normalize(expr) is parse(church(5_000))
@@ -0,0 +1,89 @@
+import pytest
+
+from syntax.lambda_pure import Int, parse
+from syntax.utils import make_node
+
+from machine import KrivineMachine
+import nbe
+from primitives import church_to_int, from_church, int_to_church, to_church
+import solution
+from test_machine import MULT, church
+
+Y = r"(\f. (\x. f (x x)) (\x. f (x x)))"
+PRED = r"(\n. \f. \x. n (\g. \h. h (g f)) (\u. x) (\u. u))"
+IS_ZERO = r"(\n. n (\x. \t. \f. f) (\t. \f. t))"
+FACT = rf"({Y} (\fact. \n. ifz n 1 (mul n (fact (sub n 1)))))"
+CHURCH_FACT = (
+    rf"({Y} (\fact. \n. {IS_ZERO} n {church(1)} ({MULT} n (fact ({PRED} n)))))"
+)
+
+
+def interpret(program: str, **kwargs):
+    return solution.interpret(parse(program), primitives=True, **kwargs)
+
+
+@pytest.mark.parametrize("backend", ["machine", "nbe"])
+@pytest.mark.parametrize(
+    "program, expected",
+    [
+        ("add 1 2", "3"),
+        ("mul (add 2 3) (sub 10 4)", "30"),
+        ("sub 5 (sub 1 3)", "7"),
+        ("eq 3 3 a b", "a"),
+        ("eq 1 2 a b", "b"),
+        ("ifz (sub 2 2) a b", "a"),
+        ("ifz 1 a b", "b"),
+        (r"let f = \x. add x x in f (f 3)", "12"),
+        (f"{FACT} 6", "720"),
+        # Stuck applications are left as they are, with their arguments normalized
+        (r"\x. add x 1", r"\x. add x 1"),
+        (r"add ((\y. y) x) 2", "add x 2"),
+        (r"add (\x. x) 2", r"add (\x. x) 2"),
+        ("add (1 2) 3", "add (1 2) 3"),
+        ("add 1", "add 1"),
+        # Bound variables are not primitives
+        (r"\add. add 1 2", r"\add. add 1 2"),
+    ],
+)
+def test_delta_rules(program: str, expected: str, backend: str) -> None:
+    for strategy in ["name", "need"]:
+        result = interpret(program, strategy=strategy, backend=backend)
+        assert result is parse(expected)
+
+
+def test_delta_steps() -> None:
+    machine = KrivineMachine(primitives=True)
+    assert machine.normalize(parse("mul (add 2 3) (sub 10 4)")) is make_node(Int, 30)
+    assert machine.steps == 3
+    evaluator = nbe.Evaluator(fuel=100_000, primitives=True)
+    evaluator.compile(parse("mul (add 2 3) (sub 10 4)"), [])(())
+    assert evaluator.steps == 3
+
+
+def test_off_by_default() -> None:
+    assert solution.interpret(parse("add 1 2")) is parse("add 1 2")
+    assert solution.interpret(parse("add 1 2"), backend="nbe") is parse("add 1 2")
+
+
+def test_same_as_church_numerals() -> None:
+    native = KrivineMachine(strategy="need", primitives=True)
+    church_fact = KrivineMachine(strategy="need")
+    assert native.normalize(parse(f"{FACT} 4")) is church_to_int(
+        church_fact.normalize(parse(f"{CHURCH_FACT} {church(4)}"))
+    )
+    assert native.steps < church_fact.steps
+
+
+def test_church_conversions() -> None:
+    assert from_church(parse(church(5))) == 5
+    assert from_church(parse(r"\a. \b. b")) == 0
+    assert from_church(parse(r"\f. \f. f f")) is None
+    assert from_church(parse(r"\f. \x. f (f y)")) is None
+    assert to_church(3) == parse(church(3))
+    with pytest.raises(ValueError):
+        to_church(-1)
+    expr = parse(rf"add 2 ({church(3)} g 7)")
+    assert int_to_church(church_to_int(expr)) == parse(
+        rf"add {church(2)} ({church(3)} g {church(7)})"
+    )
+    assert church_to_int(parse(rf"\y. add {church(2)} y")) is parse(r"\y. add 2 y")
@@ -0,0 +1,69 @@
+import itertools
+import json
+
+from syntax.lambda_pure import parse
+
+from reduction import normalize, size, substitute, trace
+import solution
+from test_machine import MULT, church
+
+
+def test_substitute_keeps_untouched_subterms() -> None:
+    expr = parse(r"(\y. y y) (x (\x. x z))")
+    assert substitute(expr, {"z": parse("a")}) is parse(r"(\y. y y) (x (\x. x a))")
+    result = substitute(expr, {"x": parse("a")})
+    assert result.func is expr.func and result.arg.arg is expr.arg.arg
+    assert substitute(expr, {"w": parse("a")}) is expr
+
+
+def test_substitute_under_let() -> None:
+    # A let binds its variable in its body, not in its definition
+    a = parse("a")
+    assert substitute(parse("let x = x in x"), {"x": a}) is parse("let x = a in x")
+    assert substitute(parse("let y = x in y x"), {"x": parse("y")}) is parse(
+        "let y1 = y in y1 y"
+    )
+    assert normalize(parse(r"(\x. let x = x y in x) a")) is parse("a y")
+
+
+def test_trace() -> None:
+    expr = parse(r"(\x. \y. (\z. z) x) a")
+    steps = list(solution.trace(expr))
+    assert [str(s.term) for s in steps] == [r"\y. ((\z. z) a)", r"\y. a"]
+    assert [s.number for s in steps] == [1, 2]
+    assert [str(s.redex) for s in steps] == [
+        r"((\x. \y. ((\z. z) x)) a)",
+        r"((\z. z) a)",
+    ]
+    assert [s.position for s in steps] == [(), (0,)]
+    assert [s.size for s in steps] == [5, 2]
+    assert all(s.seconds >= 0 for s in steps)
+    assert list(trace(steps[-1].term)) == []
+
+
+def test_trace_agrees_with_normalize() -> None:
+    expr = parse(f"{MULT} {church(3)} {church(4)}")
+    *_, last = trace(expr)
+    assert last.term is normalize(expr)
+    assert last.size == size(parse(church(12)))
+
+
+def test_trace_is_lazy() -> None:
+    # No normal form: the trace goes on, and can be sampled
+    steps = trace(parse(r"(\x. x x x) (\x. x x x)"))
+    sample = list(itertools.islice(steps, 0, 1000, 100))
+    assert [s.number for s in sample] == list(range(1, 1000, 100))
+    assert sample[-1].size > sample[0].size
+
+
+def test_trace_to_file(tmp_path) -> None:
+    path = tmp_path / "trace.jsonl"
+    with open(path, "w") as out:
+        for s in trace(parse(f"{MULT} {church(2)} {church(2)}")):
+            out.write(
+                json.dumps([s.number, list(s.position), s.size, str(s.term)]) + "\n"
+            )
+    lines = path.read_text().splitlines()
+    assert json.loads(lines[-1])[3] == str(
+        normalize(parse(f"{MULT} {church(2)} {church(2)}"))
+    )
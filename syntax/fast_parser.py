@@ -0,0 +1,244 @@
+"""Hand-written parsers for the lambda_pure.lark and lambda_typed.lark languages.
+
+They accept the same programs and build the same nodes as the Lark parsers, but avoid
+the per-token overhead of Lark's generic LALR engine and Transformer.
+Parsing is done with an explicit stack, so deeply nested terms do not hit the recursion limit.
+Use them through lambda_pure.parse(..., backend="fast") / lambda_typed.parse(..., backend="fast").
+"""
+
+import itertools
+import re
+import string
+
+from syntax import lambda_pure as pure, lambda_typed as typed
+from syntax.utils import make_node, ParseError
+
+# Mirrors the terminals of the grammars: CNAME, INT, and the punctuation. Whitespace is
+# skipped by findall(); any other character becomes a token of its own and is rejected.
+_TOKENS = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+|->|[^ \t\f\r\n]")
+_ID_START = frozenset(string.ascii_letters + "_")
+_DIGITS = frozenset(string.digits)
+_END = ""
+
+# Stack frames
+_PAREN, _LAMBDA, _LET, _LET_BODY = range(4)
+
+
+def _tokenize(program_text: str) -> list[str]:
+    tokens = _TOKENS.findall(program_text)
+    tokens.append(_END)
+    return tokens
+
+
+def _unexpected(token: str) -> ParseError:
+    return ParseError(f"Unexpected {repr(token) if token else 'end of input'}")
+
+
+def _expect(tokens: list[str], i: int, expected: str) -> int:
+    if tokens[i] != expected:
+        raise _unexpected(tokens[i])
+    return i + 1
+
+
+def _name(tokens: list[str], i: int) -> str:
+    token = tokens[i]
+    if token[:1] not in _ID_START:
+        raise _unexpected(token)
+    return token
+
+
+class _PureNodes:
+    """Node construction for lambda_pure, identical to lambda_pure.NodeFactory."""
+
+    @staticmethod
+    def var(name: str):
+        return make_node(pure.Id, name)
+
+    @staticmethod
+    def num(n: int):
+        return make_node(pure.Int, n)
+
+    @staticmethod
+    def lam(decl, body):
+        return make_node(pure.Lambda, decl, body)
+
+    @staticmethod
+    def app(func, arg):
+        return make_node(pure.App, func, arg)
+
+    @staticmethod
+    def let(decl, defn, body):
+        return make_node(pure.Let, decl, defn, body)
+
+    @staticmethod
+    def decl(tokens: list[str], i: int):
+        """_paren{decl}, where decl: ID"""
+        if tokens[i] == "(":
+            decl = make_node(pure.Id, _name(tokens, i + 1))
+            return decl, _expect(tokens, i + 2, ")")
+        return make_node(pure.Id, _name(tokens, i)), i + 1
+
+
+class _TypedNodes:
+    """Node construction for lambda_typed, identical to lambda_typed.NodeFactory.
+    Nodes are built in the same order, so internal type variables are numbered the same.
+    """
+
+    def __init__(self):
+        self._placeholders = itertools.count(start=-1, step=-1)
+
+    def _placeholder(self) -> typed.TypeVar:
+        return make_node(typed.TypeVar, next(self._placeholders))
+
+    def var(self, name: str):
+        if name == "True":
+            return typed.TypedExpr(typed.Bool(True), self._placeholder())
+        if name == "False":
+            return typed.TypedExpr(typed.Bool(False), self._placeholder())
+        return typed.TypedExpr(typed.Id(name), self._placeholder())
+
+    def num(self, n: int):
+        return typed.TypedExpr(typed.Int(n), self._placeholder())
+
+    def lam(self, decl, body):
+        lam = typed.Lambda(decl, body, ret=self._placeholder())
+        return typed.TypedExpr(lam, type=self._placeholder())
+
+    def app(self, func, arg):
+        return typed.TypedExpr(typed.App(func, arg), type=self._placeholder())
+
+    def let(self, decl, defn, body):
+        return typed.TypedExpr(typed.Let(decl, defn, body), type=self._placeholder())
+
+    def decl(self, tokens: list[str], i: int):
+        """_paren{decl}, where decl: ID [":" type]"""
+        if tokens[i] == "(":
+            decl, i = self._decl(tokens, i + 1)
+            return decl, _expect(tokens, i, ")")
+        return self._decl(tokens, i)
+
+    def _decl(self, tokens: list[str], i: int):
+        name = _name(tokens, i)
+        if tokens[i + 1] == ":":
+            typ, i = _parse_type(tokens, i + 2)
+        else:
+            typ, i = self._placeholder(), i + 1
+        return typed.VarDecl(typed.Id(name), typ), i
+
+
+def _typename(name: str):
+    match name:
+        case "int":
+            return typed.Primitive.INT
+        case "bool":
+            return typed.Primitive.BOOL
+        case _:
+            return make_node(typed.TypeName, name)
+
+
+def _parse_type(tokens: list[str], i: int):
+    """type: typename "->" type | typename | "(" type ")" """
+    domains = []
+    while True:
+        if tokens[i] == "(":
+            typ, i = _parse_type(tokens, i + 1)
+            i = _expect(tokens, i, ")")
+            break
+        typ = _typename(_name(tokens, i))
+        i += 1
+        if tokens[i] != "->":
+            break
+        domains.append(typ)
+        i += 1
+    for domain in reversed(domains):
+        typ = make_node(typed.Arrow, domain, typ)
+    return typ, i
+
+
+def _parse(program_text: str, nodes):
+    """Shift-reduce parser for `start: expr`. Application is left-associative;
+    the bodies of `let` and `\\` extend as far to the right as possible."""
+    var, num, lam, app, let, decl = (
+        nodes.var,
+        nodes.num,
+        nodes.lam,
+        nodes.app,
+        nodes.let,
+        nodes.decl,
+    )
+    tokens = _tokenize(program_text)
+    stack = []
+    acc = None  # the application spine parsed so far in the innermost expression
+    i = 0
+    while True:
+        token = tokens[i]
+        i += 1
+        first = token[:1]
+        if first in _ID_START and token != "let" and (token != "in" or acc is None):
+            # Like Lark's contextual lexer, `in` is a keyword only after a complete expression
+            e = var(token)
+        elif first in _DIGITS:
+            e = num(int(token))
+        elif token == "(":
+            stack.append((_PAREN, acc))
+            acc = None
+            continue
+        elif token == "\\":
+            decls = []
+            while True:
+                d, i = decl(tokens, i)
+                decls.append(d)
+                if tokens[i] == ".":
+                    break
+            stack.append((_LAMBDA, acc, decls))
+            acc = None
+            i += 1
+            continue
+        elif token == "let":
+            d, i = decl(tokens, i)
+            i = _expect(tokens, i, "=")
+            stack.append((_LET, acc, d))
+            acc = None
+            continue
+        else:
+            # The innermost expression ends here, and so do the enclosing
+            # lambda and let bodies.
+            if acc is None:
+                raise _unexpected(token)
+            e = acc
+            while stack and (stack[-1][0] == _LAMBDA or stack[-1][0] == _LET_BODY):
+                frame = stack.pop()
+                if frame[0] == _LAMBDA:
+                    for d in reversed(frame[2]):
+                        e = lam(d, e)
+                else:
+                    e = let(frame[2], frame[3], e)
+                if frame[1] is not None:
+                    e = app(frame[1], e)
+            if token == "in":
+                if not stack or stack[-1][0] != _LET:
+                    raise _unexpected(token)
+                _, outer, d = stack.pop()
+                stack.append((_LET_BODY, outer, d, e))
+                acc = None
+                continue
+            if token == ")":
+                if not stack or stack[-1][0] != _PAREN:
+                    raise _unexpected(token)
+                acc = stack.pop()[1]
+            elif token == _END and not stack:
+                return e
+            else:
+                raise _unexpected(token)
+        acc = e if acc is None else app(acc, e)
+
+
+def parse_pure(program_text: str) -> pure.LambdaExpr:
+    """Parses a lambda_pure program, like lambda_pure.parse()."""
+    return _parse(program_text, _PureNodes)
+
+
+def parse_typed(program_text: str) -> typed.TypedExpr:
+    """Parses a lambda_typed program, like lambda_typed.parse(). Missing types become
+    internal type variables, numbered from -1 in each call."""
+    return _parse(program_text, _TypedNodes())
@@ -1,40 +1,70 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import partial
+import itertools
+from typing import Iterable, TextIO
 
 from lark import Transformer, v_args, UnexpectedInput
 
-from syntax.utils import make_node, ParseError, _read_grammar, _install_str_hook
+from syntax.utils import (
+    make_node,
+    parse_cache,
+    ParseError,
+    _backend_grammar,
+    _parse_many,
+    _read_grammar,
+    _render,
+    _install_str_hook,
+)
 
 
 type LambdaExpr = Id | Int | Let | Lambda | App
 
 
-@dataclass(frozen=True, slots=True)
+# Every node caches the set of its free variables, computed on demand by free_vars()
+
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class Id:
     name: str
+    _free_vars: frozenset[str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class Int:
     n: int
+    _free_vars: frozenset[str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class Let:
     decl: Id
     defn: LambdaExpr
     body: LambdaExpr
+    _free_vars: frozenset[str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class Lambda:
     var: Id
     body: LambdaExpr
+    _free_vars: frozenset[str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class App:
     func: LambdaExpr
     arg: LambdaExpr
+    _free_vars: frozenset[str] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
 
 @v_args(inline=True)
@@ -64,8 +94,30 @@ class NodeFactory(Transformer):
 _factory = NodeFactory()
 
 
-def parse(program_text: str) -> LambdaExpr:
-    """Parses a lambda calculus program and returns the corresponding expression."""
+def parse(program_text: str, backend: str = "lark") -> LambdaExpr:
+    """Parses a lambda calculus program and returns the corresponding expression.
+    backend="fast" uses the hand-written parser in syntax.fast_parser instead of Lark.
+    Results are memoized in syntax.utils.parse_cache, if it is enabled.
+    """
+    grammar = _backend_grammar("lambda_pure.lark", backend)
+    return parse_cache(
+        grammar, "start", program_text, lambda text: _parse(text, backend)
+    )
+
+
+def parse_many(
+    texts: Iterable[str], workers: int | None = None, backend: str = "lark"
+) -> list[LambdaExpr | ParseError]:
+    """Parses many programs, spread over `workers` processes (default: one per CPU).
+    Results are in input order; a program that fails to parse yields its ParseError."""
+    return _parse_many(partial(parse, backend=backend), texts, workers)
+
+
+def _parse(program_text: str, backend: str) -> LambdaExpr:
+    if backend == "fast":
+        from syntax.fast_parser import parse_pure
+
+        return parse_pure(program_text)
     parser = _read_grammar("lambda_pure.lark", _factory)
     try:
         return parser.parse(program_text)
@@ -74,20 +126,254 @@ def parse(program_text: str) -> LambdaExpr:
 
 
 @_install_str_hook(Id, Int, Let, Lambda, App)
-def pretty(expr: LambdaExpr) -> str:
-    """Formats an expression for pretty printing."""
+def pretty(
+    expr: LambdaExpr, out: TextIO | None = None, sharing: str = "expand"
+) -> str | None:
+    """Formats an expression for pretty printing.
+    If `out` is given, the text is written to it instead of being returned.
+    `sharing` controls subterms that occur more than once in the (hash-consed) expression:
+     * "expand" prints each occurrence in full.
+     * "memo" gives the same text, but renders each shared subterm only once.
+     * "let" prints each shared subterm once, as a let-binding just inside the innermost
+       binder of its free variables (or around the expression), so the output stays
+       proportional to the size of the DAG.
+    """
+    match sharing:
+        case "expand":
+            return _render((_pretty_parts, expr), out)
+        case "memo":
+            return _render((_pretty_parts, expr), out, shared=_shared_subterms(expr))
+        case "let":
+            return _render((_let_parts, expr), out)
+        case _:
+            raise ValueError(f"Unknown sharing mode: {sharing!r}")
+
+
+def _pretty_parts(stack: list, expr: LambdaExpr) -> None:
+    # Parts are pushed in reverse order, see _render()
     match expr:
         case Id(n):
-            return n
+            stack.append(n)
         case Int(num):
-            return str(num)
+            stack.append(str(num))
         case Let(var, defn, body):
-            return f"let {var.name} = {pretty(defn)} in {pretty(body)}"
+            stack += (
+                (_pretty_parts, body),
+                " in ",
+                (_pretty_parts, defn),
+                f"let {var.name} = ",
+            )
         case Lambda(var, body):
-            return f"\\{var.name}. {pretty(body)}"
+            stack += (_pretty_parts, body), f"\\{var.name}. "
         case App(func, arg):
             if isinstance(func, (Lambda, Let)):
-                return f"(({pretty(func)}) {pretty(arg)})"
-            return f"({pretty(func)} {pretty(arg)})"
+                stack += ")", (_pretty_parts, arg), ") ", (_pretty_parts, func), "(("
+            else:
+                stack += ")", (_pretty_parts, arg), " ", (_pretty_parts, func), "("
         case _:
             raise ValueError(f"Unknown expression type: {type(expr)}")
+
+
+def _subterms(expr: LambdaExpr) -> tuple[LambdaExpr, ...]:
+    match expr:
+        case Let(_, defn, body):
+            return defn, body
+        case Lambda(_, body):
+            return (body,)
+        case App(func, arg):
+            return func, arg
+        case _:
+            return ()
+
+
+def free_vars(expr: LambdaExpr) -> frozenset[str]:
+    """The names that occur free in expr. They are computed once per node and cached on it,
+    so they are shared by all the terms that contain an (interned) node."""
+    stack = [expr]
+    while stack:
+        node = stack[-1]
+        if node._free_vars is not None:
+            stack.pop()
+            continue
+        children = _subterms(node)
+        pending = [child for child in children if child._free_vars is None]
+        if pending:
+            stack += pending
+            continue
+        stack.pop()
+        match node:
+            case Id(name):
+                fv = frozenset((name,))
+            case Int():
+                fv = frozenset()
+            case Lambda(var, body):
+                fv = _without(body._free_vars, var.name)
+            case App(func, arg):
+                fv = _union(func._free_vars, arg._free_vars)
+            case Let(decl, defn, body):
+                fv = _union(defn._free_vars, _without(body._free_vars, decl.name))
+            case _:
+                raise ValueError(f"Unknown expression type: {type(node)}")
+        object.__setattr__(node, "_free_vars", fv)
+    return expr._free_vars
+
+
+# Sets are reused where possible, so that nodes share them
+
+
+def _without(names: frozenset[str], name: str) -> frozenset[str]:
+    return names - {name} if name in names else names
+
+
+def _union(a: frozenset[str], b: frozenset[str]) -> frozenset[str]:
+    if a is b or not b:
+        return a
+    return a | b if a else b
+
+
+def _occurrences(expr: LambdaExpr) -> dict[int, tuple[LambdaExpr, int]]:
+    """Maps id() of every distinct subterm to (subterm, number of parent edges), children first."""
+    counts = {id(expr): [expr, 0]}
+    order = []
+    expanded = set()
+    stack = [(expr, False)]
+    while stack:
+        e, done = stack.pop()
+        if done:
+            order.append(e)
+            continue
+        if id(e) in expanded:
+            continue
+        expanded.add(id(e))
+        stack.append((e, True))
+        for sub in _subterms(e):
+            if id(sub) in counts:
+                counts[id(sub)][1] += 1
+            else:
+                counts[id(sub)] = [sub, 1]
+            if id(sub) not in expanded:
+                stack.append((sub, False))
+    return {id(e): tuple(counts[id(e)]) for e in order}
+
+
+def _shared_subterms(expr: LambdaExpr) -> set[int]:
+    return {
+        key
+        for key, (e, count) in _occurrences(expr).items()
+        if count > 1 and not isinstance(e, (Id, Int))
+    }
+
+
+def _let_parts(stack: list, expr: LambdaExpr) -> None:
+    """Prints each shared subterm once, as a `let` binding just inside the innermost binder
+    of one of its free variables, or around expr if none of them is bound. The binders in
+    between bind none of them, so the subterm means the same thing at the `let`."""
+    sharing = _let_bindings(expr)
+    stack.append((_let_named_parts, expr, frozenset(), sharing))
+    _push_lets(stack, None, sharing)
+
+
+def _let_key(expr: LambdaExpr, scope: dict[str, int]) -> tuple[int, frozenset]:
+    """Occurrences of an (interned) subterm are the same term if they are in the same
+    context: the binder of each of its free variables that is bound."""
+    return id(expr), frozenset((v, scope[v]) for v in free_vars(expr) if v in scope)
+
+
+def _let_bindings(expr: LambdaExpr) -> tuple[dict, dict, dict]:
+    """Numbers the binders of expr by their key, and finds its shared subterms.
+    Returns (binders, names, lets): the names of the shared subterms by key, and the
+    (key, subterm) bound just inside each binder (None for the top level), children first.
+    """
+    root = _let_key(expr, {})
+    nodes = {root: [expr, 0]}
+    binders: dict[tuple, int] = {}
+    depth = {}  # of each binder, below the binders in its context
+    order = []
+    expanded = set()
+    stack = [(root, False)]
+    while stack:
+        key, done = stack.pop()
+        if done:
+            order.append(key)
+            continue
+        if key in expanded:
+            continue
+        expanded.add(key)
+        stack.append((key, True))
+        e, scope = nodes[key][0], dict(key[1])
+        match e:
+            case Lambda(var, body):
+                binder = binders[key] = len(binders)
+                subterms = [(body, scope | {var.name: binder})]
+            case Let(decl, defn, body):
+                binder = binders[key] = len(binders)
+                subterms = [(defn, scope), (body, scope | {decl.name: binder})]
+            case _:
+                subterms = [(sub, scope) for sub in _subterms(e)]
+        if key in binders:
+            depth[binders[key]] = 1 + max(map(depth.get, scope.values()), default=0)
+        for sub, sub_scope in subterms:
+            sub_key = _let_key(sub, sub_scope)
+            if sub_key in nodes:
+                nodes[sub_key][1] += 1
+            else:
+                nodes[sub_key] = [sub, 1]
+            if sub_key not in expanded:
+                stack.append((sub_key, False))
+
+    used = set()
+    for e, _ in nodes.values():
+        match e:
+            case Id(name) | Lambda(Id(name)) | Let(Id(name)):
+                used.add(name)
+    fresh = (name for name in (f"_{i}" for i in itertools.count()) if name not in used)
+    names = {}
+    lets = {}
+    for key in order:
+        e, count = nodes[key]
+        if count > 1 and not isinstance(e, (Id, Int)):
+            # Every binder in the context encloses the deepest one
+            binder = max((b for _, b in key[1]), key=depth.get, default=None)
+            names[key] = next(fresh)
+            lets.setdefault(binder, []).append((key, e))
+    return binders, names, lets
+
+
+def _push_lets(stack: list, binder: int | None, sharing: tuple) -> None:
+    _, names, lets = sharing
+    for key, e in reversed(lets.get(binder, ())):
+        stack += " in ", (_let_named_parts, e, key[1], sharing), f"let {names[key]} = "
+
+
+def _let_named_parts(
+    stack: list, expr: LambdaExpr, context: frozenset, sharing: tuple
+) -> None:
+    """Like _pretty_parts, but prints the shared subterms of expr as their names, after
+    the lets that bind them."""
+    binders, names, _ = sharing
+    scope = dict(context)
+
+    def part(sub: LambdaExpr, scope: dict[str, int]):
+        key = _let_key(sub, scope)
+        return names.get(key) or (_let_named_parts, sub, key[1], sharing)
+
+    match expr:
+        case Lambda(var, body):
+            binder = binders[id(expr), context]
+            stack.append(part(body, scope | {var.name: binder}))
+            _push_lets(stack, binder, sharing)
+            stack.append(f"\\{var.name}. ")
+        case Let(decl, defn, body):
+            binder = binders[id(expr), context]
+            stack.append(part(body, scope | {decl.name: binder}))
+            _push_lets(stack, binder, sharing)
+            stack += " in ", part(defn, scope), f"let {decl.name} = "
+        case App(func, arg):
+            func_part = part(func, scope)
+            # A name needs no parentheses, unlike the lambda or let it stands for
+            if isinstance(func, (Lambda, Let)) and not isinstance(func_part, str):
+                stack += ")", part(arg, scope), ") ", func_part, "(("
+            else:
+                stack += ")", part(arg, scope), " ", func_part, "("
+        case _:
+            _pretty_parts(stack, expr)
@@ -1,19 +1,52 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
 import enum
-from dataclasses import dataclass
-from functools import lru_cache
+from dataclasses import dataclass, field
+from functools import partial
 import itertools
+import threading
+from typing import Iterable, Iterator, TextIO
 
 from lark import Transformer, v_args, UnexpectedInput
 
-from syntax.utils import _install_str_hook, ParseError, _read_grammar
+from syntax.utils import (
+    _install_str_hook,
+    make_node,
+    parse_cache,
+    ParseError,
+    _backend_grammar,
+    _node,
+    _parse_many,
+    _read_grammar,
+    _render,
+)
 
 type LambdaType = Arrow | Primitive | TypeName | TypeVar
 
+# What a type or a typed expression contains, as computed when the node is built,
+# so that is_grounded_type()/is_grounded_expr() take constant time.
+_HAS_TYPEVAR = 1
+_HAS_NONINTERNAL_TYPEVAR = 2
+_HAS_NONE = 4  # a missing type
 
-@dataclass(frozen=True, slots=True)
+
+# Types are interned through make_node(), so equal types are usually the same object.
+# Arrow caches its hash, and compares hashes before comparing its fields (see _node() in
+# syntax.utils), so equality and hashing take constant time, also for types built directly.
+
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class Arrow:
     arg: LambdaType
     ret: LambdaType
+    _flags: int = field(init=False, repr=False, compare=False)
+    _hash: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(
+            self, "_flags", _type_flags(self.arg) | _type_flags(self.ret)
+        )
 
 
 class Primitive(enum.Enum):
@@ -21,14 +54,14 @@ class Primitive(enum.Enum):
     INT = "int"
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class TypeName:
     """Represents a named type, e.g., int, bool, etc."""
 
     name: str
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class TypeVar:
     """Represents a placeholder for a yet-unknown type.
     This is used when parsing an expression without an explicit type, and for type inference.
@@ -41,36 +74,78 @@ class TypeVar:
         return self.id < 0
 
 
-_next_typevar_id = itertools.count()
+class InferenceContext:
+    """Allocates the ids of non-internal type variables for one inference, starting from 0,
+    so that the ids do not depend on what ran before. Safe to share between threads."""
+
+    def __init__(self):
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def fresh_typevar(self) -> TypeVar:
+        with self._lock:
+            id = next(self._ids)
+        return make_node(TypeVar, id)
+
+
+# Used by fresh_typevar() outside of any inference_context()
+_global_context = InferenceContext()
+_current_context: ContextVar[InferenceContext] = ContextVar(
+    "_current_context", default=_global_context
+)
+
+
+@contextmanager
+def inference_context(context: InferenceContext | None = None):
+    """Makes fresh_typevar() draw from `context` (by default, a new InferenceContext) in this
+    block. Each thread has its own current context, so concurrent inferences get the same,
+    deterministic ids for the same input."""
+    context = context or InferenceContext()
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
 
 
 def fresh_typevar() -> TypeVar:
-    """Returns a brand new TypeVar, ensuring uniqueness. The typevar is not internal."""
-    return TypeVar(next(_next_typevar_id))
+    """Returns a brand new TypeVar, unique within the current inference_context().
+    The typevar is not internal."""
+    return _current_context.get().fresh_typevar()
 
 
-@lru_cache(maxsize=None)
-def is_grounded_type(t: LambdaType, require_fully_annotated: bool) -> bool:
+def _type_flags(t: LambdaType) -> int:
     match t:
-        case None:
-            # We probably forgot to freshen the type variable after parsing
-            assert (
-                False
-            ), f"Type variable is None for {t}. Did you forget to call _instantiate_placeholders()?"
-        case TypeName() | Primitive():
-            return True
-        case Arrow(a, b):
-            return is_grounded_type(a, require_fully_annotated) and is_grounded_type(
-                b, require_fully_annotated
-            )
+        case Arrow():
+            return t._flags
         case TypeVar():
-            if require_fully_annotated:
-                return False
-            return t.is_internal()
+            return (
+                _HAS_TYPEVAR
+                if t.is_internal()
+                else _HAS_TYPEVAR | _HAS_NONINTERNAL_TYPEVAR
+            )
+        case TypeName() | Primitive():
+            return 0
+        case None:
+            return _HAS_NONE
         case _:
             raise ValueError(f"Unknown type: {type(t)}")
 
 
+def _is_grounded(flags: int, require_fully_annotated: bool) -> bool:
+    # We probably forgot to freshen the type variables after parsing
+    assert (
+        not flags & _HAS_NONE
+    ), "Type variable is None. Did you forget to call _instantiate_placeholders()?"
+    if require_fully_annotated:
+        return not flags & _HAS_TYPEVAR
+    return not flags & _HAS_NONINTERNAL_TYPEVAR
+
+
+def is_grounded_type(t: LambdaType, require_fully_annotated: bool) -> bool:
+    return _is_grounded(_type_flags(t), require_fully_annotated)
+
+
 type Expr = Id | Int | Bool | Let | Lambda | App
 
 
@@ -78,6 +153,18 @@ type Expr = Id | Int | Bool | Let | Lambda | App
 class TypedExpr:
     expr: Expr
     type: LambdaType
+    _flags: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        flags = _type_flags(self.type)
+        match self.expr:
+            case Let(decl, defn, body):
+                flags |= _type_flags(decl.type) | defn._flags | body._flags
+            case Lambda(decl, body):
+                flags |= _type_flags(decl.type) | body._flags
+            case App(func, arg):
+                flags |= func._flags | arg._flags
+        object.__setattr__(self, "_flags", flags)
 
 
 @dataclass(frozen=True, slots=True)
@@ -121,90 +208,79 @@ class App:
     arg: TypedExpr
 
 
-@lru_cache(maxsize=None)
 def is_grounded_expr(e: TypedExpr, require_fully_annotated: bool) -> bool:
-    if not is_grounded_type(e.type, require_fully_annotated):
-        return False
-    match e.expr:
-        case Id() | Int() | Bool():
-            return True
-        case Let(decl, defn, body):
-            return (
-                is_grounded_expr(defn, require_fully_annotated)
-                and is_grounded_expr(body, require_fully_annotated)
-                and is_grounded_type(decl.type, require_fully_annotated)
-            )
-        case Lambda(decl, body):
-            return is_grounded_expr(body, require_fully_annotated) and is_grounded_type(
-                decl.type, require_fully_annotated
-            )
-        case App(func, arg):
-            return is_grounded_expr(func, require_fully_annotated) and is_grounded_expr(
-                arg, require_fully_annotated
-            )
-        case _:
-            raise ValueError(f"Unknown expression: {e.expr!r}")
+    if not isinstance(e.expr, (Id, Int, Bool, Let, Lambda, App)):
+        raise ValueError(f"Unknown expression: {e.expr!r}")
+    return _is_grounded(e._flags, require_fully_annotated)
 
 
 def _instantiate_placeholders(expr: TypedExpr) -> TypedExpr:
     """Replaces all internal type variables (None) with fresh ones.
-    Used only for parsing/testing, to ensure that internal type variables are all unique.
+    Used only for testing, to ensure that internal type variables are all unique.
+    parse() numbers them the same way, while building the tree.
+    The tree is walked with an explicit stack, so it may be arbitrarily deep.
     """
     internal_counter = itertools.count(start=-1, step=-1)
 
     def fresh_typevars_type(t: LambdaType) -> LambdaType:
+        flags = _type_flags(t)
+        if flags & _HAS_TYPEVAR:
+            raise TypeError(f"Unexpected type variable in {t}")
+        if not flags & _HAS_NONE:
+            return t
         match t:
             case None:
-                return TypeVar(next(internal_counter))
+                return make_node(TypeVar, next(internal_counter))
             case Arrow(arg, ret):
-                return Arrow(fresh_typevars_type(arg), fresh_typevars_type(ret))
-            case Primitive() | TypeName():
-                return t
-            case _:
-                raise TypeError(f"Unexpected type node: {t}")
-
-    def fresh_typevars_expr(e: TypedExpr) -> TypedExpr:
-        match e.expr:
-            case Id(name):
-                return TypedExpr(Id(name), fresh_typevars_type(e.type))
-            case Int(n):
-                return TypedExpr(Int(n), fresh_typevars_type(e.type))
-            case Bool() as b:
-                return TypedExpr(b, fresh_typevars_type(e.type))
-            case Let(decl, defn, body):
-                return TypedExpr(
-                    Let(
-                        VarDecl(decl.var, fresh_typevars_type(decl.type)),
-                        fresh_typevars_expr(defn),
-                        fresh_typevars_expr(body),
-                    ),
-                    fresh_typevars_type(e.type),
+                return make_node(
+                    Arrow, fresh_typevars_type(arg), fresh_typevars_type(ret)
                 )
-            case Lambda(decl, body, ret):
-                return TypedExpr(
-                    Lambda(
-                        VarDecl(decl.var, fresh_typevars_type(decl.type)),
-                        fresh_typevars_expr(body),
-                        fresh_typevars_type(ret),
-                    ),
-                    fresh_typevars_type(e.type),
-                )
-            case App(func, arg):
-                return TypedExpr(
-                    App(
-                        fresh_typevars_expr(func),
-                        fresh_typevars_expr(arg),
-                    ),
-                    fresh_typevars_type(e.type),
-                )
-            case _:
-                raise TypeError(f"Unexpected expression node: {e.expr!r}")
 
-    return fresh_typevars_expr(expr)
+    # A node is pushed again (expanded, with its new declaration if any) under its
+    # children, and builds its copy from theirs, which are on top of `done` by then.
+    stack: list[tuple[TypedExpr, bool, VarDecl | None]] = [(expr, False, None)]
+    done: list[TypedExpr] = []
+    while stack:
+        e, expanded, decl = stack.pop()
+        if not expanded:
+            match e.expr:
+                case Id() | Int() | Bool():
+                    done.append(TypedExpr(e.expr, fresh_typevars_type(e.type)))
+                case Let(decl, defn, body):
+                    decl = VarDecl(decl.var, fresh_typevars_type(decl.type))
+                    stack += (e, True, decl), (body, False, None), (defn, False, None)
+                case Lambda(decl, body):
+                    decl = VarDecl(decl.var, fresh_typevars_type(decl.type))
+                    stack += (e, True, decl), (body, False, None)
+                case App(func, arg):
+                    stack += (e, True, None), (arg, False, None), (func, False, None)
+                case _:
+                    raise TypeError(f"Unexpected expression node: {e.expr!r}")
+            continue
+        match e.expr:
+            case Let():
+                body = done.pop()
+                new = Let(decl, done.pop(), body)
+            case Lambda(ret=ret):
+                new = Lambda(decl, done.pop(), fresh_typevars_type(ret))
+            case App():
+                arg = done.pop()
+                new = App(done.pop(), arg)
+        done.append(TypedExpr(new, fresh_typevars_type(e.type)))
+    return done.pop()
 
 
 @v_args(inline=True)
 class NodeFactory(Transformer):
+    """Builds the tree bottom-up, giving every missing type a fresh internal type variable
+    (-1, -2, ...) as it goes. Nodes are built in the same order as _instantiate_placeholders
+    visits them, so the numbering is the same.
+    The numbering is that of the parse in progress (see _parse()), so one factory serves
+    concurrent parses."""
+
+    def _placeholder(self) -> TypeVar:
+        return make_node(TypeVar, next(_placeholders.get()))
+
     def typename(self, token):
         match token.value:
             case "int":
@@ -212,56 +288,90 @@ class NodeFactory(Transformer):
             case "bool":
                 return Primitive.BOOL
             case _:
-                return TypeName(token.value)
+                return make_node(TypeName, token.value)
 
     def arrow(self, arg, ret):
-        return Arrow(arg, ret)
+        return make_node(Arrow, arg, ret)
 
     def decl(self, id, typ=None):
-        return VarDecl(Id(id.value), typ)  # typ may be None
+        return VarDecl(Id(id.value), typ if typ is not None else self._placeholder())
 
     def var(self, token):
         if token.value == "True":
-            return TypedExpr(Bool(True), None)  # type: ignore[param]
+            return TypedExpr(Bool(True), self._placeholder())
         if token.value == "False":
-            return TypedExpr(Bool(False), None)  # type: ignore[param]
-        return TypedExpr(Id(token.value), None)  # type: ignore[param]
+            return TypedExpr(Bool(False), self._placeholder())
+        return TypedExpr(Id(token.value), self._placeholder())
 
     def num(self, token):
-        return TypedExpr(Int(int(token.value)), None)  # type: ignore[param]
+        return TypedExpr(Int(int(token.value)), self._placeholder())
 
     def abs(self, *args):
         *decls, body = args
         for decl in reversed(decls):
-            body = TypedExpr(Lambda(decl, body, ret=None), type=None)  # type: ignore[param]
+            body = TypedExpr(
+                Lambda(decl, body, ret=self._placeholder()), type=self._placeholder()
+            )
         return body
 
     def abs_typed(self, decl, ret_type, body):
-        return TypedExpr(Lambda(decl, body, ret=ret_type), type=None)  # type: ignore[param]
+        return TypedExpr(Lambda(decl, body, ret=ret_type), type=self._placeholder())
 
     def app(self, func, arg):
-        return TypedExpr(App(func, arg), type=None)  # type: ignore[param]
+        return TypedExpr(App(func, arg), type=self._placeholder())
 
     def let(self, decl, defn, body):
-        return TypedExpr(Let(decl, defn, body), type=None)  # type: ignore[param]
+        return TypedExpr(Let(decl, defn, body), type=self._placeholder())
 
 
 _factory = NodeFactory()
+# The numbering of internal type variables in the parse in progress, in this thread
+_placeholders: ContextVar[Iterator[int]] = ContextVar("_placeholders")
 
 
-def parse(program_text: str) -> TypedExpr:
+def parse(program_text: str, backend: str = "lark") -> TypedExpr:
     """Parses a typed lambda calculus program and returns the corresponding expression.
     All types are either ground types or fresh type variables for which .is_internal() is True.
+    backend="fast" uses the hand-written parser in syntax.fast_parser instead of Lark.
+    Internal type variables are numbered -1, -2, ... afresh in every call, so parsing
+    the same text twice gives equal trees.
+    Results are memoized in syntax.utils.parse_cache, if it is enabled.
     """
+    grammar = _backend_grammar("lambda_typed.lark", backend)
+    return parse_cache(
+        grammar, "start", program_text, lambda text: _parse(text, backend)
+    )
+
+
+def parse_many(
+    texts: Iterable[str], workers: int | None = None, backend: str = "lark"
+) -> list[TypedExpr | ParseError]:
+    """Parses many programs, spread over `workers` processes (default: one per CPU).
+    Results are in input order; a program that fails to parse yields its ParseError."""
+    return _parse_many(partial(parse, backend=backend), texts, workers)
+
+
+def _parse(program_text: str, backend: str) -> TypedExpr:
+    if backend == "fast":
+        from syntax.fast_parser import parse_typed
+
+        return parse_typed(program_text)
     grammar = _read_grammar("lambda_typed.lark", _factory)
+    token = _placeholders.set(itertools.count(start=-1, step=-1))
     try:
-        return _instantiate_placeholders(grammar.parse(program_text))
+        return grammar.parse(program_text)
     except UnexpectedInput as e:
         raise ParseError(program_text) from e
+    finally:
+        _placeholders.reset(token)
 
 
 def parse_type(program_text: str) -> TypedExpr:
     """Parses string representing a type and returns the corresponding type."""
+    return parse_cache("lambda_typed.lark", "type", program_text, _parse_type)
+
+
+def _parse_type(program_text: str) -> TypedExpr:
     grammar = _read_grammar("lambda_typed.lark", _factory, start="type")
     try:
         return grammar.parse(program_text)
@@ -270,62 +380,97 @@ def parse_type(program_text: str) -> TypedExpr:
 
 
 @_install_str_hook(Arrow, TypeName, TypeVar, Primitive)
-def pretty_type(expr: LambdaType) -> str:
+def pretty_type(expr: LambdaType, out: TextIO | None = None) -> str | None:
+    return _render((_type_parts, expr), out)
+
+
+@_install_str_hook(VarDecl)
+def pretty_decl(
+    decl: VarDecl, omit_parens=False, out: TextIO | None = None
+) -> str | None:
+    """Formats a variable declaration for pretty printing."""
+    return _render((_decl_parts, decl, omit_parens), out)
+
+
+@_install_str_hook(Id, Int, Bool, Let, Lambda, App)
+def pretty(expr: Expr, out: TextIO | None = None) -> str | None:
+    """Formats an expression for pretty printing.
+    If `out` is given, the text is written to it instead of being returned."""
+    return _render((_expr_parts, expr), out)
+
+
+@_install_str_hook(TypedExpr)
+def pretty_typed(
+    expr: TypedExpr, omit_parens=False, out: TextIO | None = None
+) -> str | None:
+    """Formats a typed expression for pretty printing."""
+    return _render((_typed_parts, expr, omit_parens), out)
+
+
+# Parts are pushed in reverse order, see _render()
+
+
+def _type_parts(stack: list, expr: LambdaType) -> None:
     match expr:
         case TypeVar(id):
-            if id < 0:
-                return ""
-            return f"${id}"
+            if id >= 0:
+                stack.append(f"${id}")
         case Primitive() as prim:
-            return prim.value
+            stack.append(prim.value)
         case TypeName(name):
-            return name
+            stack.append(name)
         case Arrow(arg, ret):
-            return f"{pretty_type(arg)} -> {pretty_type(ret)}"
+            stack += (_type_parts, ret), " -> ", (_type_parts, arg)
         case _:
             raise ValueError(f"Unknown type: {type(expr)}")
 
 
-@_install_str_hook(VarDecl)
-def pretty_decl(decl: VarDecl, omit_parens=False) -> str:
-    """Formats a variable declaration for pretty printing."""
-    type_str = pretty_type(decl.type)
-    if not type_str:
-        return decl.var.name
-    type_str = f"{decl.var.name} : {type_str}"
-    if omit_parens:
-        return type_str
-    return f"({type_str})"
+def _is_hidden(t: LambdaType) -> bool:
+    """Internal type variables are not printed."""
+    return isinstance(t, TypeVar) and t.is_internal()
 
 
-@_install_str_hook(Id, Int, Bool, Let, Lambda, App)
-def pretty(expr: Expr) -> str:
-    """Formats an expression for pretty printing."""
+def _decl_parts(stack: list, decl: VarDecl, omit_parens: bool) -> None:
+    if _is_hidden(decl.type):
+        stack.append(decl.var.name)
+    elif omit_parens:
+        stack += (_type_parts, decl.type), f"{decl.var.name} : "
+    else:
+        stack += ")", (_type_parts, decl.type), f"({decl.var.name} : "
+
+
+def _expr_parts(stack: list, expr: Expr) -> None:
     match expr:
         case Id(name):
-            return name
+            stack.append(name)
         case Int(n):
-            return str(n)
+            stack.append(str(n))
         case Bool(b):
-            return "True" if b else "False"
-        case Let() as let:
-            return f"let {pretty_decl(let.decl, omit_parens=True)} = {pretty_typed(let.defn, omit_parens=True)} in {pretty_typed(let.body)}"
+            stack.append("True" if b else "False")
+        case Let(decl, defn, body):
+            stack += (
+                (_typed_parts, body, False),
+                " in ",
+                (_typed_parts, defn, True),
+                " = ",
+                (_decl_parts, decl, True),
+                "let ",
+            )
         case Lambda(decl, body, ret):
-            if isinstance(ret, TypeVar) and ret.is_internal():
-                return rf"\{pretty_decl(decl)}. {pretty_typed(body)}"
-            return rf"\{pretty_decl(decl)} : {pretty_type(ret)}. {pretty_typed(body)}"
+            stack += (_typed_parts, body, False), ". "
+            if not _is_hidden(ret):
+                stack += (_type_parts, ret), " : "
+            stack += (_decl_parts, decl, False), "\\"
         case App(func, arg):
-            return f"{pretty_typed(func)} {pretty_typed(arg)}"
+            stack += (_typed_parts, arg, False), " ", (_typed_parts, func, False)
         case _:
             raise ValueError(f"Unknown expression type: {expr!r}")
 
 
-@_install_str_hook(TypedExpr)
-def pretty_typed(expr: TypedExpr, omit_parens=False) -> str:
-    """Formats a typed expression for pretty printing."""
-    if isinstance(expr.type, TypeVar) and expr.type.is_internal():
-        return pretty(expr.expr)
-    res = f"{pretty(expr.expr)} : {pretty_type(expr.type)}"
-    if omit_parens:
-        return res
-    return f"({res})"
+def _typed_parts(stack: list, expr: TypedExpr, omit_parens: bool) -> None:
+    if _is_hidden(expr.type):
+        stack.append((_expr_parts, expr.expr))
+    elif omit_parens:
+        stack += (_type_parts, expr.type), " : ", (_expr_parts, expr.expr)
+    else:
+        stack += ")", (_type_parts, expr.type), " : ", (_expr_parts, expr.expr), "("
@@ -0,0 +1,331 @@
+"""A compact, versioned binary format for syntax trees (lambda_pure, lambda_typed, while_lang).
+
+A file holds a sequence of root nodes. Every distinct node is written once, children first,
+and referred to by its index, so sharing within a tree and between trees is preserved
+(equal nodes are written once too, and are shared when loaded).
+Files can be memory-mapped, and are decoded lazily: indexing an AstFile decodes only the
+nodes reachable from that root. Pooled nodes are interned again through make_node().
+
+Layout (integers are little-endian; u32 arrays hold end offsets or indices):
+    header   b"SYNTXAST", u16 version, u16 reserved, u32 #strings, #classes, #nodes, #roots
+    strings  u32[#strings] end offsets, then the UTF-8 text
+    classes  u32[#classes] string index of each "module:qualname"
+    nodes    u32[#nodes] end offsets, then per node: varint class index, a varint per field
+    roots    u32[#roots] node index of each root
+
+A field is a varint whose low 3 bits tag its type: a node index, an int (zigzag-encoded),
+a string index, None, False, True, or an enum member (a class index, followed by a varint
+string index of the member's name).
+"""
+
+from collections.abc import Sequence
+import dataclasses
+import enum
+import importlib
+import mmap
+import struct
+from typing import BinaryIO, Iterable
+
+from syntax.utils import _encode_dag, make_node
+
+MAGIC = b"SYNTXAST"
+VERSION = 1
+
+_HEADER = struct.Struct("<8sHHIIII")
+_U32 = struct.Struct("<I")
+_NODE, _INT, _STR, _NONE, _FALSE, _TRUE, _ENUM = range(7)
+
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buffer, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _u32_array(values: list[int]) -> bytes:
+    try:
+        return struct.pack(f"<{len(values)}I", *values)
+    except struct.error:
+        raise ValueError("Too much data for the AST file format") from None
+
+
+def _merge_equal(table: list[tuple], roots: list[int]) -> tuple[list[tuple], list[int]]:
+    """Stores equal nodes once, even if they are distinct objects (e.g. lambda_typed nodes,
+    which are not interned)."""
+    merged: list[tuple] = []
+    canonical: dict[tuple, int] = {}
+    remap = []
+    for cls, refmask, *values in table:
+        key = [cls, refmask]
+        for bit, value in enumerate(values):
+            if refmask >> bit & 1:
+                values[bit] = remap[value]
+            key.append((type(value), values[bit]))
+        i = canonical.setdefault(tuple(key), len(merged))
+        if i == len(merged):
+            merged.append((cls, refmask, *values))
+        remap.append(i)
+    return merged, [remap[root] for root in roots]
+
+
+def dumps(nodes: Iterable) -> bytes:
+    """Serializes a sequence of syntax trees; nodes shared between them are stored once."""
+    table: list[tuple] = []
+    index: dict[int, int] = {}
+    roots = []
+    for node in nodes:
+        _encode_dag(node, table, index)
+        roots.append(index[id(node)])
+    table, roots = _merge_equal(table, roots)
+
+    strings: dict[str, int] = {}
+    classes: dict[type, int] = {}
+    class_names = []
+
+    def string(s: str) -> int:
+        return strings.setdefault(s, len(strings))
+
+    def class_index(cls: type) -> int:
+        i = classes.get(cls)
+        if i is None:
+            i = classes[cls] = len(classes)
+            class_names.append(string(f"{cls.__module__}:{cls.__qualname__}"))
+        return i
+
+    data = bytearray()
+    node_ends = []
+    for cls, refmask, *values in table:
+        _write_varint(data, class_index(cls))
+        for bit, value in enumerate(values):
+            if refmask >> bit & 1:
+                _write_varint(data, value << 3 | _NODE)
+            elif value is None:
+                data.append(_NONE)
+            elif value is False:
+                data.append(_FALSE)
+            elif value is True:
+                data.append(_TRUE)
+            elif isinstance(value, enum.Enum):
+                _write_varint(data, class_index(type(value)) << 3 | _ENUM)
+                _write_varint(data, string(value.name))
+            elif isinstance(value, int):
+                _write_varint(
+                    data, (value << 1 if value >= 0 else ~value << 1 | 1) << 3 | _INT
+                )
+            elif isinstance(value, str):
+                _write_varint(data, string(value) << 3 | _STR)
+            else:
+                raise TypeError(
+                    f"Cannot serialize {type(value).__name__} value in {cls.__name__}: {value!r}"
+                )
+        node_ends.append(len(data))
+
+    text = bytearray()
+    string_ends = []
+    for s in strings:
+        text += s.encode()
+        string_ends.append(len(text))
+    header = _HEADER.pack(
+        MAGIC, VERSION, 0, len(strings), len(class_names), len(table), len(roots)
+    )
+    return b"".join(
+        [
+            header,
+            _u32_array(string_ends),
+            text,
+            _u32_array(class_names),
+            _u32_array(node_ends),
+            data,
+            _u32_array(roots),
+        ]
+    )
+
+
+def dump(nodes: Iterable, file: BinaryIO) -> None:
+    """Writes dumps(nodes) to a binary file."""
+    file.write(dumps(nodes))
+
+
+def loads(data: bytes) -> "AstFile":
+    """Opens serialized trees held in memory."""
+    return AstFile(data)
+
+
+def load(path: str) -> "AstFile":
+    """Opens a file written by dump(), memory-mapped, so only the parts that are
+    decoded are read. Close it (or use it as a context manager) when done."""
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return AstFile(buffer)
+
+
+def _resolve_class(qualified_name: str) -> type:
+    """Looks up a node class by name. Only dataclasses and enums of the syntax package are
+    accepted, so loading a file cannot run arbitrary constructors."""
+    module_name, _, qualname = qualified_name.partition(":")
+    if module_name.split(".")[0] != "syntax":
+        raise ValueError(f"Not a syntax class: {qualified_name}")
+    cls = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        cls = getattr(cls, attr)
+    if not (
+        isinstance(cls, type)
+        and (dataclasses.is_dataclass(cls) or issubclass(cls, enum.Enum))
+    ):
+        raise ValueError(f"Not a syntax class: {qualified_name}")
+    return cls
+
+
+class AstFile(Sequence):
+    """The trees in a serialized buffer, decoded on access. Decoded nodes are kept, so
+    trees that share nodes in the file share them in memory too."""
+
+    def __init__(self, buffer):
+        if len(buffer) < _HEADER.size:
+            raise ValueError("Not an AST file")
+        magic, version, _, n_strings, n_classes, n_nodes, n_roots = _HEADER.unpack_from(
+            buffer, 0
+        )
+        if magic != MAGIC:
+            raise ValueError("Not an AST file")
+        if version != VERSION:
+            raise ValueError(f"Unsupported AST file version {version}")
+        self._buffer = buffer
+        pos = _HEADER.size
+        self._string_ends = pos
+        pos += 4 * n_strings
+        self._string_start = pos
+        pos += self._end(self._string_ends, n_strings)
+        self._class_table = pos
+        pos += 4 * n_classes
+        self._node_ends = pos
+        pos += 4 * n_nodes
+        self._node_start = pos
+        pos += self._end(self._node_ends, n_nodes)
+        self._roots = pos
+        if pos + 4 * n_roots != len(buffer):
+            raise ValueError("Truncated or corrupt AST file")
+        self._len = n_roots
+        self._strings: list[str | None] = [None] * n_strings
+        self._classes: list[type | None] = [None] * n_classes
+        self._nodes: dict[int, object] = {}
+
+    def _end(self, ends: int, count: int) -> int:
+        """The size of the data described by the `count` end offsets at `ends`."""
+        return _U32.unpack_from(self._buffer, ends + 4 * (count - 1))[0] if count else 0
+
+    def _span(self, ends: int, i: int) -> tuple[int, int]:
+        end = _U32.unpack_from(self._buffer, ends + 4 * i)[0]
+        start = _U32.unpack_from(self._buffer, ends + 4 * (i - 1))[0] if i else 0
+        return start, end
+
+    def _string(self, i: int) -> str:
+        s = self._strings[i]
+        if s is None:
+            start, end = self._span(self._string_ends, i)
+            base = self._string_start
+            s = self._strings[i] = bytes(
+                self._buffer[base + start : base + end]
+            ).decode()
+        return s
+
+    def _class(self, i: int) -> type:
+        cls = self._classes[i]
+        if cls is None:
+            name = _U32.unpack_from(self._buffer, self._class_table + 4 * i)[0]
+            cls = self._classes[i] = _resolve_class(self._string(name))
+        return cls
+
+    def _read_node(self, i: int) -> tuple[type, list, list[int]]:
+        """Decodes the fields of node i; node references are left as indices,
+        and their positions are returned in the last component."""
+        buffer = self._buffer
+        start, end = self._span(self._node_ends, i)
+        pos, end = self._node_start + start, self._node_start + end
+        cls_index, pos = _read_varint(buffer, pos)
+        values = []
+        refs = []
+        while pos < end:
+            n, pos = _read_varint(buffer, pos)
+            tag, n = n & 7, n >> 3
+            if tag == _NODE:
+                if n >= i:
+                    raise ValueError("Corrupt AST file: forward node reference")
+                refs.append(len(values))
+                values.append(n)
+            elif tag == _INT:
+                values.append(~(n >> 1) if n & 1 else n >> 1)
+            elif tag == _STR:
+                values.append(self._string(n))
+            elif tag == _NONE:
+                values.append(None)
+            elif tag == _FALSE:
+                values.append(False)
+            elif tag == _TRUE:
+                values.append(True)
+            elif tag == _ENUM:
+                name, pos = _read_varint(buffer, pos)
+                values.append(self._class(n)[self._string(name)])
+            else:
+                raise ValueError(f"Corrupt AST file: unknown field tag {tag}")
+        return self._class(cls_index), values, refs
+
+    def _node(self, root: int):
+        nodes = self._nodes
+        if root in nodes:
+            return nodes[root]
+        pending: dict[int, tuple] = {}
+        stack = [root]
+        while stack:
+            i = stack.pop()
+            if i in nodes or i in pending:
+                continue
+            pending[i] = entry = self._read_node(i)
+            _, values, refs = entry
+            stack.extend(values[r] for r in refs)
+        # Children precede their parents in the file
+        for i in sorted(pending):
+            cls, values, refs = pending[i]
+            for r in refs:
+                values[r] = nodes[values[r]]
+            if hasattr(cls, "__weakref__"):
+                nodes[i] = make_node(cls, *values)
+            else:
+                nodes[i] = cls(*values)
+        return nodes[root]
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("AstFile index out of range")
+        root = _U32.unpack_from(self._buffer, self._roots + 4 * i)[0]
+        return self._node(root)
+
+    def close(self) -> None:
+        """Releases the memory map, if any. Nodes already decoded remain valid."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __enter__(self) -> "AstFile":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,136 @@
+import random
+
+import pytest
+
+from syntax import lambda_pure, lambda_typed
+from syntax.utils import ParseError
+
+LANGUAGES = [lambda_pure, lambda_typed]
+
+PURE_TOKENS = ["x", "y", "f", "in", "let", "0", "42", "\\", ".", "=", "(", ")"]
+TYPED_TOKENS = PURE_TOKENS + ["True", "int", "bool", "T", ":", "->"]
+
+
+def parse_both(language, program: str):
+    """Parses with both backends, returning the AST or the exception type."""
+    results = []
+    for backend in ["lark", "fast"]:
+        try:
+            results.append(language.parse(program, backend=backend))
+        except ParseError:
+            results.append(ParseError)
+    return results
+
+
+def random_expr(rng: random.Random, typed: bool, depth: int = 0) -> str:
+    def decl() -> str:
+        name = rng.choice(["x", "y", "in", "let"])
+        if typed and rng.random() < 0.5:
+            name = f"{name} : {random_type()}"
+        return f"({name})" if rng.random() < 0.3 else name
+
+    def random_type(depth: int = 0) -> str:
+        match rng.randrange(3) if depth < 3 else 0:
+            case 0:
+                return rng.choice(["int", "bool", "T"])
+            case 1:
+                return f"{rng.choice(["int", "T"])} -> {random_type(depth + 1)}"
+            case _:
+                return f"({random_type(depth + 1)})"
+
+    match rng.randrange(6) if depth < 6 else rng.randrange(2):
+        case 0:
+            return rng.choice(["x", "y", "f", "in", "True"])
+        case 1:
+            return str(rng.randrange(100))
+        case 2:
+            return f"({random_expr(rng, typed, depth + 1)})"
+        case 3:
+            decls = " ".join(decl() for _ in range(rng.randrange(1, 3)))
+            return f"\\{decls}. {random_expr(rng, typed, depth + 1)}"
+        case 4:
+            return f"let {decl()} = {random_expr(rng, typed, depth + 1)} in {random_expr(rng, typed, depth + 1)}"
+        case _:
+            return f"{random_expr(rng, typed, depth + 1)} {random_expr(rng, typed, depth + 1)}"
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+@pytest.mark.parametrize(
+    "program",
+    [
+        r"\x. x",
+        r"\x y. x",
+        r"\(x) y (z). x",
+        r"(\x. \y. x) a b",
+        "let x = a in b c",
+        r"let x = \y. y in z",
+        "a let x = 1 in x b",
+        r"f \x. x y",
+        "x1 _y 0x 007",
+        "in",
+        "in x",
+        "let in = a in in",
+        r"\let. x",
+        r"\(x : int) (y : Bool). x",
+        r"let x : (int -> int) = (\y : int. y) in x",
+        r"\f : int -> T -> (bool). f",
+    ],
+)
+def test_same_as_lark(language, program):
+    lark_result, fast_result = parse_both(language, program)
+    assert fast_result == lark_result
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+@pytest.mark.parametrize(
+    "program",
+    [
+        "",
+        "let",
+        "\\",
+        "let x = in y",
+        "x in",
+        "(a in)",
+        "()",
+        r"\x.",
+        r"\((x)). x",
+        "x -- y",
+    ],
+)
+def test_invalid(language, program):
+    with pytest.raises(ParseError):
+        language.parse(program, backend="fast")
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+def test_random_programs(language):
+    rng = random.Random(236347)
+    for _ in range(300):
+        program = random_expr(rng, typed=language is lambda_typed)
+        lark_result, fast_result = parse_both(language, program)
+        assert fast_result == lark_result, program
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+def test_random_token_soup(language):
+    rng = random.Random(236347)
+    tokens = TYPED_TOKENS if language is lambda_typed else PURE_TOKENS
+    for _ in range(1000):
+        program = " ".join(rng.choices(tokens, k=rng.randrange(1, 8)))
+        lark_result, fast_result = parse_both(language, program)
+        assert fast_result == lark_result, program
+
+
+def test_fast_builds_shared_nodes():
+    assert lambda_pure.parse(r"\x. x x", backend="fast") is lambda_pure.parse(
+        r"\x. x x"
+    )
+
+
+def test_deep_nesting():
+    depth = 100_000
+    program = "\\x. " * depth + "(" * depth + "x" + ")" * depth
+    expr = lambda_pure.parse(program, backend="fast")
+    for _ in range(depth):
+        expr = expr.body
+    assert expr == lambda_pure.Id("x")
@@ -1,9 +1,23 @@
+import io
+
 import pytest
-from syntax.lambda_pure import parse, Id, Int, App, Lambda, Let, LambdaExpr
+from syntax.lambda_pure import (
+    parse,
+    pretty,
+    free_vars,
+    Id,
+    Int,
+    App,
+    Lambda,
+    Let,
+    LambdaExpr,
+)
 from syntax.utils import make_node
 import syntax
+
 print(syntax.utils.__file__)
 
+
 def id(name: str) -> Id:
     return make_node(Id, name)
 
@@ -60,3 +74,95 @@ def let(v: str, defn: LambdaExpr, body: LambdaExpr) -> Let:
 )
 def test_parse_valid(program, expected):
     assert parse(program) == expected
+
+
+def test_pretty_deep_terms():
+    depth = 100_000
+    spine = id("x")
+    nested = id("x")
+    for _ in range(depth):
+        spine = app(spine, id("y"))
+        nested = lam("x", nested)
+    assert pretty(spine) == "(" * depth + "x" + " y)" * depth
+    out = io.StringIO()
+    assert pretty(nested, out=out) is None
+    assert out.getvalue() == "\\x. " * depth + "x"
+
+
+def test_free_vars():
+    assert free_vars(parse(r"\x. x y (let z = x w in z v) 1")) == {"y", "w", "v"}
+    # Cached on each node, and shared with subterms where possible
+    expr = parse(r"\x. y z")
+    assert free_vars(expr) is expr._free_vars is expr.body._free_vars
+    assert free_vars(doubling(200)) == {"y"}
+    depth = 10_000
+    nested = id("x")
+    for i in range(depth):
+        nested = lam(f"x{i}", app(nested, id(f"x{i}")))
+    assert free_vars(nested) == {"x"}
+
+
+def doubling(n: int) -> LambdaExpr:
+    """A term whose printed form is exponentially larger than its DAG"""
+    expr = lam("z", app(id("z"), id("y")))
+    for _ in range(n):
+        expr = app(expr, expr)
+    return expr
+
+
+def inline_lets(expr: LambdaExpr) -> LambdaExpr:
+    """Undoes pretty(..., sharing="let"), by inlining the lets it adds (named _<n>)"""
+    return substitute(expr, {})
+
+
+def substitute(expr: LambdaExpr, env: dict) -> LambdaExpr:
+    match expr:
+        case Id(name):
+            return env.get(name, expr)
+        case Let(decl, defn, body) if decl.name.startswith("_"):
+            return substitute(body, env | {decl.name: substitute(defn, env)})
+        case Let(decl, defn, body):
+            return make_node(Let, decl, substitute(defn, env), substitute(body, env))
+        case Lambda(var, body):
+            return lam(var.name, substitute(body, env))
+        case App(func, arg):
+            return app(substitute(func, env), substitute(arg, env))
+        case _:
+            return expr
+
+
+def test_pretty_memo():
+    expr = lam("y", app(doubling(5), lam("x", app(id("x"), id("x")))))
+    assert pretty(expr, sharing="memo") == pretty(expr)
+
+
+def test_pretty_let():
+    expr = doubling(20)
+    text = pretty(expr, sharing="let")
+    assert len(text) < 500
+    assert inline_lets(parse(text)) is expr
+
+
+def test_pretty_let_avoids_capture():
+    shared = app(id("x"), id("y"))
+    expr = app(lam("x", shared), app(lam("x", shared), shared))
+    text = pretty(expr, sharing="let")
+    assert text == r"let _0 = \x. (x y) in (_0 (_0 (x y)))"
+    assert inline_lets(parse(text)) is expr
+
+
+@pytest.mark.parametrize(
+    "program, text",
+    [
+        (r"\x. (x x) (x x)", r"\x. let _0 = (x x) in (_0 _0)"),
+        (r"\f. \x. f (f x) (f (f x))", r"\f. \x. let _0 = (f (f x)) in (_0 _0)"),
+        (
+            r"\y. let z = y y in \x. (z x) (z x) (y y)",
+            r"\y. let _0 = (y y) in let z = _0 in \x. let _1 = (z x) in ((_1 _1) _0)",
+        ),
+    ],
+)
+def test_pretty_let_under_binders(program, text):
+    expr = parse(program)
+    assert pretty(expr, sharing="let") == text
+    assert inline_lets(parse(text)) is expr
@@ -1,6 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+
 import pytest
 from syntax.lambda_typed import (
     parse,
+    parse_type,
     Id,
     Int,
     Bool,
@@ -14,8 +18,13 @@ from syntax.lambda_typed import (
     LambdaType,
     _instantiate_placeholders,
     Primitive,
+    TypeVar,
+    fresh_typevar,
+    inference_context,
+    is_grounded_expr,
+    is_grounded_type,
 )
-from syntax.utils import ParseError
+from syntax.utils import ParseError, _encode_dag
 
 
 def tid(name: str) -> TypeName:
@@ -133,3 +142,82 @@ def test_parse_valid(program, expected):
 def test_parse_invalid(program):
     with pytest.raises(ParseError):
         parse(program)
+
+
+def test_grounded():
+    expr = parse(r"\(x : int). let y = x in y")
+    assert is_grounded_expr(expr, require_fully_annotated=False)
+    assert not is_grounded_expr(expr, require_fully_annotated=True)
+
+    typ = arrow(Primitive.INT, tid("T"))
+    assert is_grounded_type(typ, require_fully_annotated=True)
+    assert is_grounded_type(arrow(typ, TypeVar(-1)), require_fully_annotated=False)
+    assert not is_grounded_type(
+        arrow(fresh_typevar(), typ), require_fully_annotated=False
+    )
+
+    annotated = TypedExpr(
+        App(TypedExpr(Id("f"), typ), TypedExpr(Int(1), Primitive.INT)), tid("T")
+    )
+    assert is_grounded_expr(annotated, require_fully_annotated=True)
+    lax = TypedExpr(Lambda(decl("x", fresh_typevar()), annotated, ret=None), typ)
+    assert not is_grounded_expr(lax, require_fully_annotated=False)
+
+
+def test_grounded_missing_type():
+    with pytest.raises(AssertionError):
+        is_grounded_expr(lam(decl("x"), id_("x")), require_fully_annotated=False)
+
+
+def test_types_interned():
+    typ = parse_type("int -> T -> bool")
+    assert parse_type("int -> (T -> bool)") is typ
+    built = arrow(Primitive.INT, arrow(tid("T"), Primitive.BOOL))
+    assert built == typ and hash(built) == hash(typ)
+    assert built != arrow(Primitive.INT, tid("T"))
+    assert {typ: 1}[built] == 1
+    copy = pickle.loads(pickle.dumps(typ))
+    assert copy == typ and hash(copy) == hash(typ)
+    assert parse(r"\x : int -> T. x").expr.decl.type is parse_type("int -> T")
+
+
+def test_inference_context():
+    with inference_context() as context:
+        assert fresh_typevar() == TypeVar(0)
+        with inference_context():
+            assert fresh_typevar() == TypeVar(0)
+        assert fresh_typevar() == TypeVar(1)
+        assert context.fresh_typevar() == TypeVar(2)
+
+    def allocate(_):
+        with inference_context():
+            return [fresh_typevar() for _ in range(1000)]
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(allocate, range(8)))
+    assert all(result == results[0] for result in results)
+
+
+def test_parse_threads():
+    # Each parse numbers its internal type variables from -1, also when they run at once
+    program = r"let f = \x. \y. x in " + " ".join(["f"] * 50)
+    expected = parse(program)
+
+    def parse_many_times(_):
+        return [parse(program) for _ in range(20)]
+
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(parse_many_times, range(8)))
+    assert all(result == expected for batch in results for result in batch)
+
+
+def test_instantiate_placeholders_deep():
+    n = 5_000
+    expected = num(0)
+    for i in range(n):
+        expected = let(decl(f"x{i}"), num(i), expected)
+    program = "".join(f"let x{i} = {i} in " for i in reversed(range(n))) + "0"
+    # == on nodes recurses, so compare the flattened trees
+    assert _encode_dag(parse(program, backend="fast")) == _encode_dag(
+        _instantiate_placeholders(expected)
+    )
@@ -0,0 +1,64 @@
+import pytest
+
+from syntax import lambda_pure, lambda_typed, while_lang
+from syntax.serialize import dump, dumps, load, loads, MAGIC
+from syntax.utils import make_node
+
+
+def test_round_trip():
+    pure = lambda_pure.parse(r"let f = \x. x 42 in f (f f)")
+    typed = lambda_typed.parse(r"\(x : int -> T) (b : bool). x 0 True")
+    stmt = while_lang.parse("while x > -1 do (x := x - 1; skip)")
+    trees = loads(dumps([pure, typed, stmt]))
+    assert len(trees) == 3
+    assert trees[0] is pure
+    assert trees[1] == typed
+    assert trees[-1] is stmt
+    assert trees[1:] == [trees[1], stmt]
+
+
+def test_sharing():
+    x = lambda_pure.parse("x")
+    expr = lambda_pure.App(x, x)
+    for _ in range(10_000):
+        expr = lambda_pure.App(expr, expr)
+    data = dumps([expr])
+    assert len(data) < 200_000
+    (decoded,) = loads(data)
+    for _ in range(10_000):
+        assert decoded.func is decoded.arg
+        decoded = decoded.func
+    assert decoded.func is decoded.arg == x
+
+
+def test_shared_between_roots():
+    stmt = while_lang.parse("x := 1")
+    data = dumps([stmt, make_node(while_lang.Seq, stmt, stmt)])
+    assert data.count(b"Assign") == 1
+    trees = loads(data)
+    assert trees[1].first is trees[1].second is trees[0]
+
+
+def test_lazy(tmp_path):
+    texts = [f"x := {i}" for i in range(100)]
+    path = tmp_path / "corpus.ast"
+    with open(path, "wb") as f:
+        dump([while_lang.parse(text) for text in texts], f)
+    with load(path) as trees:
+        assert trees[57] is while_lang.parse(texts[57])
+        assert len(trees._nodes) == 3  # Assign, Id and Int
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"", b"not an AST file at all", MAGIC + b"\x02\x00" + bytes(20)],
+)
+def test_invalid(data):
+    with pytest.raises(ValueError):
+        loads(data)
+
+
+def test_truncated():
+    data = dumps([lambda_pure.parse(r"\x. x")])
+    with pytest.raises(ValueError):
+        loads(data[:-1])
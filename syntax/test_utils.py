@@ -0,0 +1,180 @@
+import gc
+import pickle
+import sys
+
+from importlib_resources import files
+import pytest
+
+from syntax import lambda_pure, lambda_typed, while_lang
+from syntax.lambda_pure import parse, Id, App, Lambda
+from syntax.utils import (
+    _decode_dag,
+    _encode_dag,
+    NodePool,
+    make_node,
+    parse_cache,
+    ParseError,
+    _compile_grammar,
+    deep_recursion,
+)
+
+
+def test_make_node_interns():
+    x = make_node(Id, "x")
+    assert make_node(Id, "x") is x
+    assert make_node(App, x, make_node(Id, "y")) is make_node(
+        App, make_node(Id, "x"), make_node(Id, "y")
+    )
+    assert parse(r"\x. x y") is parse(r"\x. x y")
+
+
+def test_pool_frees_unused_nodes():
+    pool = NodePool()
+    x = pool.make(Id, "x")
+    pool.make(Lambda, x, pool.make(App, x, x))
+    gc.collect()
+    assert pool.info().live == 1
+    del x
+    gc.collect()
+    assert pool.info().live == 0
+
+
+def test_pool_statistics():
+    pool = NodePool()
+    x = pool.make(Id, "x")
+    y = pool.make(Id, "x")
+    assert x is y
+    info = pool.info()
+    assert (info.hits, info.misses, info.live) == (1, 1, 1)
+    pool.clear()
+    assert pool.info() == (0, 0, 1, 0, 0)
+    assert pool.make(Id, "x") is x
+
+
+def test_pool_maxsize_evicts_least_recently_used():
+    pool = NodePool(maxsize=2)
+    pool.make(Id, "a")
+    pool.make(Id, "b")
+    pool.make(Id, "a")
+    pool.make(Id, "c")
+    gc.collect()
+    info = pool.info()
+    assert (info.live, info.pinned) == (2, 2)
+    pool.make(Id, "a")
+    assert pool.info().hits == 2
+    pool.make(Id, "b")
+    assert pool.info().misses == 4
+
+
+def test_parser_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("SYNTAX_CACHE_DIR", str(tmp_path))
+    grammar = files("syntax").joinpath("lambda_pure.lark").read_text()
+    _compile_grammar(grammar, lambda_pure._factory)
+    [cached] = tmp_path.iterdir()
+    mtime = cached.stat().st_mtime_ns
+
+    parser = _compile_grammar(grammar, lambda_pure._factory)
+    assert parser.parse(r"\x. x y") is parse(r"\x. x y")
+    assert list(tmp_path.iterdir()) == [cached]
+    assert cached.stat().st_mtime_ns == mtime
+
+    # A modified grammar gets a cache entry of its own
+    _compile_grammar(grammar + "\n// modified\n", lambda_pure._factory)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+@pytest.mark.parametrize("cache_dir", [None, "", "not-a-directory/cache"])
+def test_parser_cache_disabled(cache_dir, tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "not-a-directory").write_text("")
+    if cache_dir is None:
+        monkeypatch.delenv("SYNTAX_CACHE_DIR", raising=False)
+    else:
+        monkeypatch.setenv("SYNTAX_CACHE_DIR", cache_dir)
+    grammar = files("syntax").joinpath("lambda_pure.lark").read_text()
+    assert _compile_grammar(grammar, lambda_pure._factory).parse("x") is parse("x")
+    assert [p.name for p in tmp_path.iterdir()] == ["not-a-directory"]
+
+
+@pytest.fixture
+def enabled_parse_cache():
+    parse_cache.clear()
+    parse_cache.resize(2)
+    yield parse_cache
+    parse_cache.resize(0)
+    parse_cache.clear()
+
+
+def test_parse_cache(enabled_parse_cache):
+    first = parse(r"\x. x")
+    assert parse(r"\x. x") is first
+    while_lang.parse("x := 1")
+    assert enabled_parse_cache.info() == (1, 2, 2, 2)
+    parse("y")  # evicts \x. x
+    parse(r"\x. x")
+    assert enabled_parse_cache.info() == (1, 4, 2, 2)
+
+
+def test_parse_cache_typed(enabled_parse_cache):
+    first = lambda_typed.parse(r"\x. x")
+    second = lambda_typed.parse(r"\x. x")
+    assert enabled_parse_cache.info().hits == 1
+    assert first is second
+    assert first.expr.decl.type == lambda_typed.TypeVar(-1)
+    assert lambda_typed.parse_type("int -> T") == lambda_typed.parse_type("int -> T")
+    assert enabled_parse_cache.info().hits == 2
+
+
+@pytest.mark.parametrize("language", [lambda_pure, lambda_typed])
+def test_parse_cache_backends(language, enabled_parse_cache):
+    first = language.parse("x y")
+    # A miss: the fast backend runs, rather than reusing Lark's result
+    assert language.parse("x y", backend="fast") == first
+    assert language.parse("x y", backend="fast") == first
+    assert enabled_parse_cache.info()[:2] == (1, 2)
+    with pytest.raises(ValueError):
+        language.parse("x y", backend="bogus")
+
+
+def test_parse_cache_skips_errors(enabled_parse_cache):
+    for _ in range(2):
+        with pytest.raises(ParseError):
+            parse("let")
+    assert enabled_parse_cache.info() == (0, 2, 2, 0)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parse_many(workers):
+    texts = ["x := 1", "while x < 3 do x := x + 1", "x :=", "x := 1; x := 1"]
+    results = while_lang.parse_many(texts, workers=workers)
+    assert results[0] is while_lang.parse(texts[0])
+    assert results[1] is while_lang.parse(texts[1])
+    assert isinstance(results[2], ParseError)
+    assert results[3].first is results[3].second is results[0]
+
+    texts = [r"\x. x", "let", r"\x: int. x"]
+    pure, bad, _ = lambda_pure.parse_many(texts, workers=workers, backend="fast")
+    assert pure is parse(r"\x. x") and isinstance(bad, ParseError)
+    assert lambda_typed.parse_many(texts, workers=workers)[2] == lambda_typed.parse(
+        texts[2]
+    )
+
+
+def test_encode_dag_deep_and_shared():
+    x = make_node(Id, "x")
+    expr = make_node(App, x, x)
+    for _ in range(100_000):
+        expr = make_node(Lambda, x, expr)
+    table = _encode_dag(expr)
+    assert len(table) == 100_002
+    assert _decode_dag(pickle.loads(pickle.dumps(table))) is expr
+
+
+def test_deep_recursion():
+    limit = sys.getrecursionlimit()
+    with deep_recursion(limit + 1000):
+        assert sys.getrecursionlimit() == limit + 1000
+        with deep_recursion(10):  # never lowered
+            assert sys.getrecursionlimit() == limit + 1000
+    assert sys.getrecursionlimit() == limit
@@ -1,3 +1,5 @@
+import io
+
 import pytest
 from syntax.while_lang import (
     parse,
@@ -168,3 +170,31 @@ def skip() -> Skip:
 def test_parse_valid(program, expected):
     parsed = parse(program)
     assert parsed == expected
+
+
+def test_parse_shares_subtrees():
+    program = parse("x := y + 1; while x < 10 do x := y + 1")
+    assert program.first is program.second.body
+    assert program.first.expr.lhs is program.second.body.expr.lhs
+    assert parse("x := 1; skip") is seq(assign(id("x"), num(1)), skip())
+
+
+def test_equality_without_pool():
+    # Nodes built directly are not interned, but still equal to interned ones
+    assert Id("x") == Id("x") and Id("x") != Id("y")
+    assert Assign(Id("x"), Int(1)) == parse("x := 1")
+    assert hash(Assign(Id("x"), Int(1))) == hash(parse("x := 1"))
+    assert Seq(SKIP, Skip()) == parse("skip; skip")
+    assert parse("x := 1") != parse("x := 2")
+
+
+def test_pretty_long_sequence():
+    stmt = assign(id("x"), num(1))
+    program = stmt
+    for _ in range(100_000):
+        program = seq(stmt, program)
+    out = io.StringIO()
+    pretty(whil(id("x"), program), out=out)
+    lines = out.getvalue().split("\n")
+    assert lines[0] == "while x do"
+    assert lines[1:] == ["  x := 1;"] * 100_000 + ["  x := 1"]
@@ -1,4 +1,26 @@
-from functools import lru_cache
+"""
+Shared machinery of the parsers and pretty printers: node interning (NodePool,
+make_node), the parse result cache, parallel parsing and iterative rendering; and
+deep_recursion(), for the evaluators that walk terms on the Python stack.
+
+The compiled LALR parsers can also be cached on disk, to save building them in every new
+process. This is opt-in: set $SYNTAX_CACHE_DIR to a directory to keep them in. If it
+cannot be created or written to, parsers are silently built from scratch instead.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import dataclasses
+from functools import cache, lru_cache, partial
+import hashlib
+from multiprocessing import get_all_start_methods, get_context
+import os
+import sys
+from typing import Callable, Container, Iterable, NamedTuple, TextIO
+import weakref
+
+import lark
 from lark import Lark, Transformer
 from importlib_resources import files
 
@@ -7,12 +29,323 @@ class ParseError(Exception):
     pass
 
 
-@lru_cache(maxsize=None)
+class PoolInfo(NamedTuple):
+    hits: int
+    misses: int
+    live: int  # interned nodes that are still alive
+    pinned: int  # nodes kept alive by the pool itself
+    maxsize: int | None
+
+
+class NodePool:
+    """Interns recursively-immutable objects (frozen dataclasses), so equal nodes are
+    the same object and equality tests are fast.
+
+    Nodes are held through weak references: once nothing else refers to a node, it is
+    freed and dropped from the pool. As long as a node is alive, building an equal node
+    returns that very object. In addition, the pool keeps up to `maxsize` recently used
+    nodes alive by itself, evicting the least recently used ones
+    (`maxsize=None` never evicts, i.e. nothing is ever freed).
+    """
+
+    def __init__(self, maxsize: int | None = 0):
+        self.maxsize = maxsize
+        self._table: dict[tuple, weakref.KeyedRef] = {}
+        self._pinned = OrderedDict()
+        self._node_types: set[type] = set()
+        self.hits = 0
+        self.misses = 0
+
+        def remove(ref: weakref.KeyedRef, table=self._table) -> None:
+            if table.get(ref.key) is ref:
+                del table[ref.key]
+
+        self._remove = remove
+
+    def make[T](self, cls: type[T], *args, **kwargs) -> T:
+        # Interned children are identified by id(), so lookups do not hash whole subtrees.
+        # This is safe since a pool entry only exists while its node, which references
+        # all of its children, is alive.
+        node_types = self._node_types
+        key = (cls, *[id(a) if type(a) in node_types else a for a in args])
+        if kwargs:
+            key += tuple(
+                (k, id(v) if type(v) in node_types else v)
+                for k, v in sorted(kwargs.items())
+            )
+        ref = self._table.get(key)
+        node = ref() if ref is not None else None
+        if node is None:
+            self.misses += 1
+            assert cls.__dataclass_params__.frozen
+            if not hasattr(cls, "__weakref__"):
+                raise TypeError(
+                    f"{cls.__name__} cannot be pooled; declare it with weakref_slot=True"
+                )
+            node = cls(*args, **kwargs)
+            node_types.add(cls)
+            self._table[key] = weakref.KeyedRef(node, self._remove, key)
+        else:
+            self.hits += 1
+        if self.maxsize != 0:
+            self._pin(key, node)
+        return node
+
+    def _pin(self, key: tuple, node) -> None:
+        self._pinned[key] = node
+        self._pinned.move_to_end(key)
+        if self.maxsize is not None and len(self._pinned) > self.maxsize:
+            self._pinned.popitem(last=False)
+
+    def info(self) -> PoolInfo:
+        return PoolInfo(
+            self.hits, self.misses, len(self._table), len(self._pinned), self.maxsize
+        )
+
+    def clear(self) -> None:
+        """Releases the pinned nodes and resets the statistics, e.g. between independent jobs.
+        Nodes that are still referenced elsewhere stay interned, so equal nodes remain identical.
+        """
+        self._pinned.clear()
+        self.hits = self.misses = 0
+
+
+node_pool = NodePool()
+
+
 def make_node[T](cls: type[T], *args, **kwargs) -> T:
     """Maintains a pool of allocated object, so equality tests are fast.
     cls(*args, **kwargs) must be recursively-immutable for correctness."""
-    assert cls.__dataclass_params__.frozen
-    return cls(*args, **kwargs)
+    return node_pool.make(cls, *args, **kwargs)
+
+
+def _node[T](cls: type[T]) -> type[T]:
+    """Gives a node class, before it is made a frozen dataclass with a `_hash` field,
+    its cached hash and fast equality (which @dataclass then keeps): nodes compare by
+    identity first, then by hash, and only then by their fields. Fields whose names start
+    with "_" are computed from the others, in the class's own __post_init__, if any."""
+    names = [name for name in cls.__annotations__ if not name.startswith("_")]
+    post_init = cls.__dict__.get("__post_init__")
+
+    def __post_init__(self) -> None:
+        if post_init is not None:
+            post_init(self)
+        values = (getattr(self, name) for name in names)
+        object.__setattr__(self, "_hash", hash((type(self), *values)))
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if type(other) is not type(self) or self._hash != other._hash:
+            return False
+        return all(getattr(self, name) == getattr(other, name) for name in names)
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __reduce__(self):
+        # The cached hash is only valid in this process
+        return make_node, (type(self), *(getattr(self, name) for name in names))
+
+    cls.__post_init__ = __post_init__
+    cls.__eq__ = __eq__
+    cls.__hash__ = __hash__
+    cls.__reduce__ = __reduce__
+    return cls
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class ParseCache:
+    """A bounded LRU memo of parse results, keyed by grammar, start symbol and program text.
+    It is off (maxsize=0) until enabled with resize(); parse errors are never cached.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__[T](
+        self, grammar: str, start: str, program_text: str, parse: Callable[[str], T]
+    ) -> T:
+        """Returns the cached result for program_text, or parse(program_text)."""
+        if not self.maxsize:
+            return parse(program_text)
+        key = (grammar, start, program_text)
+        entries = self._entries
+        if key in entries:
+            self.hits += 1
+            entries.move_to_end(key)
+            return entries[key]
+        self.misses += 1
+        result = entries[key] = parse(program_text)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return result
+
+    def resize(self, maxsize: int) -> None:
+        """Sets the maximal number of cached results; 0 disables the cache."""
+        self.maxsize = maxsize
+        while len(self._entries) > maxsize:
+            self._entries.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+
+# Shared by lambda_pure.parse, lambda_typed.parse/parse_type and while_lang.parse
+parse_cache = ParseCache()
+
+
+def _backend_grammar(grammar: str, backend: str) -> str:
+    """The grammar to key parse_cache with for a parser backend ("lark" or "fast"), so that
+    each backend is run and cached on its own. Raises ValueError for other backends."""
+    if backend not in ("lark", "fast"):
+        raise ValueError(f"Unknown parser backend: {backend!r}")
+    return grammar if backend == "lark" else f"{grammar} (fast)"
+
+
+@cache
+def _field_names(cls: type) -> tuple[str, ...]:
+    """The constructor fields of a node class; fields computed in __post_init__ are left out."""
+    return tuple(f.name for f in dataclasses.fields(cls) if f.init)
+
+
+def _encode_dag(
+    root, table: list[tuple] | None = None, index: dict[int, int] | None = None
+) -> list[tuple]:
+    """Flattens a tree of dataclass nodes into a list of (cls, refmask, *field_values) entries,
+    children first, with each distinct node stored once. Fields that hold nodes are replaced
+    by the index of their entry, and flagged in the bits of refmask. The root comes last.
+    Unlike the nodes themselves, the table can be pickled no matter how deep the tree is.
+    To encode several roots into one table, pass the same `table` and `index` (which maps
+    id(node) to its entry) on each call; nodes shared between roots are then stored once.
+    """
+    if table is None:
+        table = []
+    if index is None:
+        index = {}
+    stack = [root]
+    while stack:
+        node = stack[-1]
+        if id(node) in index:
+            stack.pop()
+            continue
+        values = [getattr(node, name) for name in _field_names(type(node))]
+        pending = False
+        for value in values:
+            if hasattr(value, "__dataclass_fields__") and id(value) not in index:
+                stack.append(value)
+                pending = True
+        if pending:
+            continue
+        stack.pop()
+        refmask = 0
+        for bit, value in enumerate(values):
+            if hasattr(value, "__dataclass_fields__"):
+                refmask |= 1 << bit
+                values[bit] = index[id(value)]
+        index[id(node)] = len(table)
+        table.append((type(node), refmask, *values))
+    return table
+
+
+def _decode_dag(table: list[tuple]):
+    """Rebuilds the nodes encoded by _encode_dag(), interning them through make_node
+    (classes that cannot be pooled are constructed directly)."""
+    nodes = []
+    for cls, refmask, *values in table:
+        bit = 0
+        while refmask:
+            if refmask & 1:
+                values[bit] = nodes[values[bit]]
+            refmask >>= 1
+            bit += 1
+        if hasattr(cls, "__weakref__"):
+            nodes.append(make_node(cls, *values))
+        else:
+            nodes.append(cls(*values))
+    return nodes[-1]
+
+
+def _try_parse(parse: Callable, text: str):
+    try:
+        return parse(text)
+    except ParseError as e:
+        return e
+    except lark.exceptions.LarkError as e:
+        return ParseError(str(e))
+
+
+def _parse_chunk(parse: Callable, texts: list[str]) -> list:
+    results = [_try_parse(parse, text) for text in texts]
+    return [r if isinstance(r, ParseError) else _encode_dag(r) for r in results]
+
+
+def _parse_many[T](
+    parse: Callable[[str], T], texts: Iterable[str], workers: int | None = None
+) -> list[T | ParseError]:
+    """Parses `texts` in up to `workers` processes (default: one per CPU).
+    Returns the results in input order; a text that fails to parse yields its ParseError
+    instead of aborting the batch. The ASTs are sent back as _encode_dag() tables and
+    interned again in this process.
+    """
+    texts = list(texts)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(texts) <= 1:
+        return [_try_parse(parse, text) for text in texts]
+    chunksize = max(1, len(texts) // (workers * 4))
+    chunks = [texts[i : i + chunksize] for i in range(0, len(texts), chunksize)]
+    results = []
+    # fork() is unsafe in multi-threaded parents, so prefer a fork server where there is one
+    method = "forkserver" if "forkserver" in get_all_start_methods() else None
+    with ProcessPoolExecutor(workers, mp_context=get_context(method)) as executor:
+        for chunk in executor.map(partial(_parse_chunk, parse), chunks):
+            results.extend(
+                r if isinstance(r, ParseError) else _decode_dag(r) for r in chunk
+            )
+    return results
+
+
+def _parser_cache_path(grammar: str, start: str) -> str | None:
+    """Where the compiled parser for `grammar` is cached on disk, or None if caching is off
+    (see the module docstring). Files are keyed by the grammar's content hash and the Lark
+    version, so editing a grammar or upgrading Lark never picks up a stale parser.
+    """
+    cache_dir = os.environ.get("SYNTAX_CACHE_DIR")
+    if not cache_dir:
+        return None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return None
+    if not os.access(cache_dir, os.W_OK):
+        return None
+    digest = hashlib.sha256(grammar.encode()).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{digest}-{start}-lark{lark.__version__}.lalr")
+
+
+def _compile_grammar(grammar: str, factory: Transformer, start="start") -> Lark:
+    """Builds an LALR parser, loading the parse tables from the on-disk cache when possible."""
+    cache = _parser_cache_path(grammar, start)
+    return Lark(
+        grammar,
+        parser="lalr",
+        transformer=factory,
+        start=start,
+        cache=cache if cache is not None else False,
+    )
 
 
 @lru_cache(maxsize=None)
@@ -20,7 +353,49 @@ def _read_grammar(filename: str, factory: Transformer, start="start") -> Lark:
     """Reads the grammar from the file."""
 
     grammar = files("syntax").joinpath(filename).read_text()
-    return Lark(grammar, parser="lalr", transformer=factory, start=start)
+    return _compile_grammar(grammar, factory, start)
+
+
+def _render(
+    item: tuple, out: TextIO | None = None, shared: Container[int] = ()
+) -> str | None:
+    """Runs an iterative pretty printer, so deep terms neither hit the recursion limit
+    nor take quadratic time. The stack holds strings, which are printed as they are popped,
+    and (expand, node, *args) items; expand(stack, node, *args) replaces an item by its parts,
+    pushed in reverse order. Returns the text, or writes it to `out` in chunks if given.
+    Nodes whose id() is in `shared` are expanded only once; later occurrences reuse the
+    text printed the first time, so they must print the same wherever they occur.
+    """
+    stack = [item]
+    chunks = []
+    memo: dict[int, str] = {}
+    # Shared nodes being printed; their chunks are kept until they are done
+    recording = 0
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            chunks.append(item)
+            if out is not None and not recording and len(chunks) >= 4096:
+                out.write("".join(chunks))
+                chunks.clear()
+        elif item[0] is None:
+            # end of a shared node
+            _, key, start = item
+            memo[key] = "".join(chunks[start:])
+            recording -= 1
+        elif shared and id(item[1]) in shared:
+            key = id(item[1])
+            if key in memo:
+                chunks.append(memo[key])
+            else:
+                stack.append((None, key, len(chunks)))
+                recording += 1
+                item[0](stack, *item[1:])
+        else:
+            item[0](stack, *item[1:])
+    if out is None:
+        return "".join(chunks)
+    out.write("".join(chunks))
 
 
 # Install a pretty printer for the given classes
@@ -31,3 +406,18 @@ def _install_str_hook(*classes):
         return pretty_func
 
     return decorator
+
+
+@contextmanager
+def deep_recursion(limit: int):
+    """Raises the recursion limit to at least `limit` while the block runs, for code that
+    recurses once or twice per level of a term. Calls between Python functions do not use
+    the C stack (since Python 3.11), so a high limit is safe. The limit is process-wide:
+    this is not thread-safe, as a thread leaving the block restores the old limit for all.
+    """
+    old = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old, limit))
+    try:
+        yield
+    finally:
+        sys.setrecursionlimit(old)
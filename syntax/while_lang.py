@@ -1,65 +1,93 @@
-from dataclasses import dataclass
-from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import Iterable, TextIO
 
-from lark import Lark, Transformer, v_args
-from importlib_resources import files
+from lark import Transformer, v_args
 
-from syntax.utils import _install_str_hook
+from syntax.utils import (
+    make_node,
+    _node,
+    parse_cache,
+    ParseError,
+    _parse_many,
+    _read_grammar,
+    _render,
+    _install_str_hook,
+)
 
 
 type Expr = Id | Int | BinOp
 
 type Stmt = Skip | Assign | Seq | If | While
 
+# All nodes are hash-consed through make_node(), so equal subtrees are shared.
+# Equality is structural, but checks identity first, and then hashes, which are cached
+# when a node is built, so comparing and hashing interned nodes takes constant time
+# (see _node() in syntax.utils).
 
-@dataclass(frozen=True, slots=True)
+
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class Id:
     name: str
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class Int:
     value: int
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class BinOp:
     op: str
     lhs: Expr
     rhs: Expr
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class Skip:
-    pass
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
-SKIP = Skip()
+SKIP = make_node(Skip)
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class Assign:
     var: Id
     expr: Expr
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class Seq:
     first: Stmt
     second: Stmt
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class If:
     cond: Expr
     then_branch: Stmt
     else_branch: Stmt
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
-@dataclass(frozen=True, slots=True)
+@dataclass(frozen=True, slots=True, weakref_slot=True)
+@_node
 class While:
     cond: Expr
     body: Stmt
+    _hash: int = field(init=False, repr=False, compare=False)
 
 
 @v_args(inline=True)
@@ -68,37 +96,37 @@ class NodeFactory(Transformer):
         return SKIP
 
     def assign(self, name_tok, expr) -> Assign:
-        return Assign(var=Id(name=str(name_tok)), expr=expr)
+        return make_node(Assign, make_node(Id, str(name_tok)), expr)
 
     def if_(self, cond, then_branch, else_branch) -> If:
-        return If(cond=cond, then_branch=then_branch, else_branch=else_branch)
+        return make_node(If, cond, then_branch, else_branch)
 
     def while_(self, cond, body) -> While:
-        return While(cond=cond, body=body)
+        return make_node(While, cond, body)
 
     def seq(self, first, second) -> Seq:
-        return Seq(first=first, second=second)
+        return make_node(Seq, first, second)
 
     def addsub(self, lhs, op, rhs) -> BinOp:
-        return BinOp(op=op.value, lhs=lhs, rhs=rhs)
+        return make_node(BinOp, op.value, lhs, rhs)
 
     def muldiv(self, lhs, op, rhs) -> BinOp:
-        return BinOp(op=op.value, lhs=lhs, rhs=rhs)
+        return make_node(BinOp, op.value, lhs, rhs)
 
     def cmp(self, lhs, op, rhs):
-        return BinOp(op=op.value, lhs=lhs, rhs=rhs)
+        return make_node(BinOp, op.value, lhs, rhs)
 
     def var(self, name_tok):
-        return Id(name=str(name_tok))
+        return make_node(Id, str(name_tok))
 
     def neg(self, inner):
         if isinstance(inner, Int):
-            return Int(-inner.value)
+            return make_node(Int, -inner.value)
         else:
-            return BinOp(op="-", lhs=Int(0), rhs=inner)
+            return make_node(BinOp, "-", make_node(Int, 0), inner)
 
     def num(self, value_tok):
-        return Int(value=int(value_tok))
+        return make_node(Int, int(value_tok))
 
     def group_expr(self, inner):
         return inner
@@ -107,56 +135,81 @@ class NodeFactory(Transformer):
         return inner
 
 
-@lru_cache(maxsize=1)
+_factory = NodeFactory()
+
+
 def read_grammar():
     """Reads the grammar from the file."""
-    grammar = (files("syntax") / "while_lang.lark").read_text()
-    return Lark(grammar, parser="lalr", transformer=NodeFactory())
+    return _read_grammar("while_lang.lark", _factory)
 
 
 def parse(program_text: str) -> Stmt:
-    """Parses a While-language program into a structured AST."""
+    """Parses a While-language program into a structured AST.
+    Results are memoized in syntax.utils.parse_cache, if it is enabled."""
+    return parse_cache("while_lang.lark", "start", program_text, _parse)
+
+
+def parse_many(
+    texts: Iterable[str], workers: int | None = None
+) -> list[Stmt | ParseError]:
+    """Parses many programs, spread over `workers` processes (default: one per CPU).
+    Results are in input order; a program that fails to parse yields a ParseError."""
+    return _parse_many(parse, texts, workers)
+
+
+def _parse(program_text: str) -> Stmt:
     parser = read_grammar()
     return parser.parse(program_text)
 
 
 @_install_str_hook(Skip, Assign, Seq, If, While)
-def pretty(stmt: Stmt, indent: int = 0) -> str:
-    """Pretty-prints a statement."""
-    INDENT = "  "
-
-    def p(e: Expr) -> str:
-        match e:
-            case Id(name):
-                return name
-            case Int(n):
-                return str(n)
-            case BinOp(op, lhs, rhs):
-                left = p(lhs)
-                right = p(rhs)
-                return f"({left} {op} {right})"
-            case _:
-                raise ValueError(f"Unknown expr: {e!r} of type {type(e)}")
-
-    def s(s_: Stmt, lvl: int) -> str:
-        pad = INDENT * lvl
-        match s_:
-            case Skip():
-                return f"{pad}skip"
-            case Assign(Id(name), expr):
-                return f"{pad}{name} := {p(expr)}"
-            case Seq(s1, s2):
-                return f"{s(s1, lvl)};\n{s(s2, lvl)}"
-            case If(cond, then_branch, else_branch):
-                cond_str = p(cond)
-                then_str = s(then_branch, lvl + 1)
-                else_str = s(else_branch, lvl + 1)
-                return f"{pad}if {cond_str} then\n{then_str}\n" f"{pad}else\n{else_str}"
-            case While(cond, body):
-                cond_str = p(cond)
-                body_str = s(body, lvl + 1)
-                return f"{pad}while {cond_str} do\n{body_str}"
-            case _:
-                raise ValueError(f"Unknown stmt: {s_!r} of type {type(s_)}")
-
-    return s(stmt, indent)
+def pretty(stmt: Stmt, indent: int = 0, out: TextIO | None = None) -> str | None:
+    """Pretty-prints a statement.
+    If `out` is given, the text is written to it instead of being returned."""
+    return _render((_stmt_parts, stmt, indent), out)
+
+
+_INDENT = "  "
+
+# Parts are pushed in reverse order, see _render()
+
+
+def _expr_parts(stack: list, e: Expr) -> None:
+    match e:
+        case Id(name):
+            stack.append(name)
+        case Int(n):
+            stack.append(str(n))
+        case BinOp(op, lhs, rhs):
+            stack += ")", (_expr_parts, rhs), f" {op} ", (_expr_parts, lhs), "("
+        case _:
+            raise ValueError(f"Unknown expr: {e!r} of type {type(e)}")
+
+
+def _stmt_parts(stack: list, s_: Stmt, lvl: int) -> None:
+    pad = _INDENT * lvl
+    match s_:
+        case Skip():
+            stack.append(f"{pad}skip")
+        case Assign(Id(name), expr):
+            stack += (_expr_parts, expr), f"{pad}{name} := "
+        case Seq(s1, s2):
+            stack += (_stmt_parts, s2, lvl), ";\n", (_stmt_parts, s1, lvl)
+        case If(cond, then_branch, else_branch):
+            stack += (
+                (_stmt_parts, else_branch, lvl + 1),
+                f"\n{pad}else\n",
+                (_stmt_parts, then_branch, lvl + 1),
+                " then\n",
+                (_expr_parts, cond),
+                f"{pad}if ",
+            )
+        case While(cond, body):
+            stack += (
+                (_stmt_parts, body, lvl + 1),
+                " do\n",
+                (_expr_parts, cond),
+                f"{pad}while ",
+            )
+        case _:
+            raise ValueError(f"Unknown stmt: {s_!r} of type {type(s_)}")